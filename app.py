@@ -1,821 +1,1494 @@
-# app.py - BSNL KNOWLEDGE PORTAL MRM (Final — dynamic Settings + drag-and-drop ordering + styled accordions + header control)
-import streamlit as st
-import json
-import os
-import re
-from streamlit_quill import st_quill
-
-# Try to import streamlit-sortables for drag & drop ordering in settings.
-# If not available, the Settings UI will fall back to numeric ordering inputs.
-try:
-    from streamlit_sortables import sort_items
-    SORTABLES_AVAILABLE = True
-except Exception:
-    SORTABLES_AVAILABLE = False
-
-# ------------------ Config / Files ------------------
-st.set_page_config(page_title="BSNL KNOWLEDGE PORTAL MRM", layout="wide", page_icon="📘")
-
-DATA_FILE = "bsnl_data.json"
-USERS_FILE = "users.json"
-NOTICE_FILE = "announcements.json"
-SETTINGS_FILE = "settings.json"
-UPLOAD_DIR = "uploads"
-
-# ensure folders & files exist
-if not os.path.exists(DATA_FILE):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump({}, f, indent=4)
-
-if not os.path.exists(USERS_FILE):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump({"admin": {"password": "admin123", "role": "Admin"}}, f, indent=4)
-
-if not os.path.exists(NOTICE_FILE):
-    with open(NOTICE_FILE, "w", encoding="utf-8") as f:
-        json.dump([], f, indent=4)
-
-DEFAULT_SETTINGS = {
-    "background_color": "#0f172a",
-    "font_color": "#ffffff",
-    "font_family": "Sans",
-    "font_size": 16,
-    "default_icon": "📘",
-    "announcement_bg": "#1f6feb",
-    "theme_mode": "dark",
-    # New dynamic settings (defaults)
-    "header_visible": True,
-    "header_title": "📘 BSNL KNOWLEDGE PORTAL MRM",
-    "header_logo": "",  # path to uploaded logo file under uploads/
-    # finer header controls
-    "show_title": True,
-    "show_logo": True,
-    "hide_header": False,
-    "feature_toggles": {
-        "announcements": True,
-        "editor_tools": True,
-        "user_management": True,
-        "settings_menu": True
-    },
-    "visible_sections": {},     # will be filled lazily with keys from sections
-    "user_privileges": {},      # { username: { "Topic" or "Topic / Subtopic": ["view","edit"], ... } }
-    "topic_order": [],         # list of top-level topic names (order)
-    "subtopic_order": {}       # { "Topic": ["sub1","sub2"] }
-}
-
-if not os.path.exists(SETTINGS_FILE):
-    with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(DEFAULT_SETTINGS, f, indent=4)
-
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
-
-# ------------------ Utility ------------------
-def safe_load_json(path, default):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
-    except Exception:
-        return default
-
-def safe_save_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
-
-sections = safe_load_json(DATA_FILE, {})
-users = safe_load_json(USERS_FILE, {"admin": {"password": "admin123", "role": "Admin"}})
-settings = safe_load_json(SETTINGS_FILE, DEFAULT_SETTINGS.copy())
-notices = safe_load_json(NOTICE_FILE, [])
-
-# Ensure new keys exist in settings (upgrade-safe)
-def ensure_settings_defaults():
-    changed = False
-    for k, v in DEFAULT_SETTINGS.items():
-        if k not in settings:
-            settings[k] = v
-            changed = True
-    # visible_sections defaults: mark every top-level section visible if not present
-    if "visible_sections" not in settings or not isinstance(settings["visible_sections"], dict):
-        settings["visible_sections"] = {}
-        changed = True
-    for top in sections.keys():
-        if top not in settings["visible_sections"]:
-            settings["visible_sections"][top] = True
-            changed = True
-    # topic_order default
-    if not settings.get("topic_order"):
-        settings["topic_order"] = list(sections.keys())
-        changed = True
-    # subtopic_order defaults
-    if "subtopic_order" not in settings or not isinstance(settings["subtopic_order"], dict):
-        settings["subtopic_order"] = {}
-        changed = True
-    for top, val in sections.items():
-        subs = list(val.get("subtopics", {}).keys())
-        if top not in settings["subtopic_order"]:
-            settings["subtopic_order"][top] = subs
-            changed = True
-        else:
-            # ensure all subs present
-            for s in subs:
-                if s not in settings["subtopic_order"].get(top, []):
-                    settings["subtopic_order"][top].append(s)
-                    changed = True
-    if changed:
-        safe_save_json(SETTINGS_FILE, settings)
-
-ensure_settings_defaults()
-
-# ------------------ Session ------------------
-if "logged_in" not in st.session_state:
-    st.session_state.logged_in = False
-if "username" not in st.session_state:
-    st.session_state.username = ""
-if "role" not in st.session_state:
-    st.session_state.role = ""
-if "path" not in st.session_state:
-    st.session_state.path = []
-if "view" not in st.session_state:
-    st.session_state.view = "portal"
-if "search_results" not in st.session_state:
-    st.session_state.search_results = []
-if "live_settings" not in st.session_state:
-    st.session_state.live_settings = settings.copy()
-
-# ------------------ Helpers ------------------
-def save_data(): safe_save_json(DATA_FILE, sections)
-def save_users(): safe_save_json(USERS_FILE, users)
-def save_notices(n): safe_save_json(NOTICE_FILE, n)
-def save_settings(s):
-    safe_save_json(SETTINGS_FILE, s)
-    # apply live settings
-    st.session_state.live_settings = s.copy()
-    # update global settings var too
-    global settings
-    settings = s
-
-def apply_global_styles(st_settings):
-    font_map = {
-        "Sans": "Segoe UI, Tahoma, Geneva, Verdana, sans-serif",
-        "Serif": "Georgia, 'Times New Roman', Times, serif",
-        "Monospace": "Menlo, Monaco, Consolas, 'Courier New', monospace"
-    }
-    font_family_css = font_map.get(st_settings.get("font_family", "Sans"), font_map["Sans"])
-    bg = st_settings.get("background_color", DEFAULT_SETTINGS["background_color"])
-    color = st_settings.get("font_color", DEFAULT_SETTINGS["font_color"])
-    font_size = st_settings.get("font_size", DEFAULT_SETTINGS["font_size"])
-    ann_bg = st_settings.get("announcement_bg", DEFAULT_SETTINGS["announcement_bg"])
-
-    # Additional CSS: style expander to look like card/accordion and small animation
-    css = f"""
-    <style>
-    .stApp {{
-        background-color: {bg};
-        color: {color};
-        font-family: {font_family_css};
-        font-size: {font_size}px;
-    }}
-    h1,h2,h3,h4,h5,h6{{color:{color};}}
-    .announcement-banner{{background-color:{ann_bg};padding:8px 12px;border-radius:6px;margin-bottom:12px;}}
-    .announcement-text{{color:white;font-weight:700;text-align:center;margin:0;font-size:{font_size}px;}}
-    a{{color:#4ea8ff;}}
-
-    /* Accordion/Expander card look */
-    .streamlit-expanderHeader {{
-        background-color: rgba(255,255,255,0.02) !important;
-        border-radius: 10px;
-        padding: 10px 12px !important;
-        margin-bottom: 6px;
-        transition: transform .12s ease, box-shadow .12s ease;
-        box-shadow: 0 1px 0 rgba(0,0,0,0.2);
-    }}
-    .streamlit-expanderHeader:hover {{
-        transform: translateY(-2px);
-        box-shadow: 0 6px 18px rgba(0,0,0,0.25);
-    }}
-    .streamlit-expanderContent {{
-        background-color: rgba(255,255,255,0.01) !important;
-        border-radius: 8px;
-        padding: 12px;
-        margin-bottom: 12px;
-    }}
-    .portal-header {{
-        text-align:center;
-        font-size:28px;
-        font-weight:bold;
-        margin-top:10px;
-        margin-bottom:20px;
-        color:{color};
-    }}
-    .settings-section {{
-        border: 1px solid rgba(255,255,255,0.03);
-        padding: 10px;
-        border-radius: 10px;
-        margin-bottom: 14px;
-        background: rgba(255,255,255,0.01);
-    }}
-    .user-priv-box {{
-        border:1px solid rgba(255,255,255,0.04);
-        padding:8px;
-        border-radius:8px;
-        margin-bottom:8px;
-        background: rgba(0,0,0,0.02);
-    }}
-    </style>
-    """
-    st.markdown(css, unsafe_allow_html=True)
-
-def breadcrumb_label(path): return " / ".join(path) if path else "🏠 Home"
-
-def search_in_data(data, query, path=None):
-    if path is None: path = []
-    results = []
-    for key, value in data.items():
-        if query.lower() in key.lower(): results.append(path + [key])
-        if isinstance(value, dict):
-            content = value.get("content", "")
-            if isinstance(content, str) and query.lower() in content.lower():
-                results.append(path + [key])
-            if "subtopics" in value:
-                results.extend(search_in_data(value["subtopics"], query, path + [key]))
-    return results
-
-def get_all_topic_paths(data, prefix=None):
-    """Return list of strings 'Top' or 'Top / Sub' for all topics recursively."""
-    if prefix is None:
-        prefix = []
-    out = []
-    for k, v in data.items():
-        cur = prefix + [k]
-        out.append(" / ".join(cur))
-        if isinstance(v, dict) and v.get("subtopics"):
-            out.extend(get_all_topic_paths(v["subtopics"], cur))
-    return out
-
-def has_privilege(username, path, action):
-    """
-    path: either list or string like 'Top / Sub'
-    action: 'view' or 'edit'
-    Checks exact path, then parent paths e.g. if user has permission on 'Top' it applies to 'Top / Sub' as well.
-    """
-    if not username:
-        return False
-    if users.get(username, {}).get("role") == "Admin":
-        return True
-    if isinstance(path, list):
-        path_str = " / ".join(path)
-    else:
-        path_str = str(path)
-    priv = settings.get("user_privileges", {})
-    userp = priv.get(username, {})
-    # exact
-    perms = userp.get(path_str, [])
-    if action in perms:
-        return True
-    # check parents
-    parts = path_str.split(" / ")
-    for i in range(len(parts)-1, 0, -1):
-        parent = " / ".join(parts[:i])
-        pperms = userp.get(parent, [])
-        if action in pperms:
-            return True
-    return False
-
-def render_header():
-    # central header shown on each page
-    # respects hide_header, show_logo, show_title
-    if settings.get("hide_header", False):
-        return
-    header_visible = settings.get("header_visible", True)
-    if not header_visible:
-        return
-    logo = settings.get("header_logo", "") or ""
-    title = settings.get("header_title", "📘 BSNL KNOWLEDGE PORTAL MRM")
-    show_logo = settings.get("show_logo", True)
-    show_title = settings.get("show_title", True)
-    cols = st.columns([1, 6, 1])
-    with cols[1]:
-        if show_logo and logo and os.path.exists(logo):
-            try:
-                st.image(logo, width=150)
-            except Exception:
-                if show_title:
-                    st.markdown(f"<div class='portal-header'>{title}</div>", unsafe_allow_html=True)
-                else:
-                    st.markdown("", unsafe_allow_html=True)
-        else:
-            if show_title:
-                st.markdown(f"<div class='portal-header'>{title}</div>", unsafe_allow_html=True)
-            else:
-                st.markdown("", unsafe_allow_html=True)
-
-# ------------------ Auth ------------------
-def login(username, password):
-    if username in users and users[username]["password"] == password:
-        st.session_state.logged_in = True
-        st.session_state.username = username
-        st.session_state.role = users[username]["role"]
-        st.session_state.view = "portal"
-        st.rerun()
-    else:
-        st.error("Invalid username or password.")
-
-def logout():
-    st.session_state.clear()
-    st.session_state.logged_in = False
-    st.session_state.view = "login"
-    st.rerun()
-
-def login_page():
-    render_header()
-    st.title("🔐 Login to BSNL KNOWLEDGE PORTAL")
-    u = st.text_input("Username")
-    p = st.text_input("Password", type="password")
-    if st.button("Login"):
-        login(u, p)
-
-# ------------------ Announcements ------------------
-def render_announcements_on_home():
-    try:
-        local_notices = json.load(open(NOTICE_FILE, "r", encoding="utf-8"))
-    except:
-        local_notices = []
-    if settings.get("feature_toggles", {}).get("announcements", True):
-        st.markdown("<div class='announcement-banner'><p class='announcement-text'>📢 Announcements</p></div>", unsafe_allow_html=True)
-        if local_notices:
-            for i, n in enumerate(local_notices, 1):
-                st.markdown(f"<p class='announcement-text'>{i}. {n}</p>", unsafe_allow_html=True)
-        else:
-            st.markdown("<p style='color:lightgray;text-align:center;'>No active announcements.</p>", unsafe_allow_html=True)
-    if st.session_state.role in ["Admin", "Editor"]:
-        st.divider()
-        st.markdown("### ✏️ Manage Announcements")
-        if not settings.get("feature_toggles", {}).get("announcements", True):
-            st.info("Announcements module is currently disabled via Settings.")
-        new_notice = st_quill(value="")
-        if st.button("📢 Post Announcement"):
-            if new_notice.strip():
-                local_notices.append(new_notice)
-                save_notices(local_notices)
-                st.success("Announcement posted.")
-                st.rerun()
-        if local_notices:
-            sel = st.selectbox("Select announcement to delete", [""] + [f"{i+1}. {n[:60]}..." for i, n in enumerate(local_notices)])
-            if sel and st.button("🗑️ Delete Selected"):
-                local_notices.pop(int(sel.split(".")[0]) - 1)
-                save_notices(local_notices)
-                st.warning("Deleted.")
-                st.rerun()
-
-# ------------------ Settings (Enhanced with styled accordions + header control) ------------------
-def settings_page():
-    render_header()
-    st.title("⚙️ Settings")
-
-    if st.session_state.role != "Admin":
-        st.warning("Only Admins can modify settings (you can still view).")
-
-    # Load live copy from session
-    live = st.session_state.live_settings
-
-    # We will put each section inside a styled expander to look like accordions.
-    # Appearance Section
-    with st.expander("🎨 Appearance", expanded=False):
-        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
-        c1, c2 = st.columns(2)
-        with c1:
-            bg = st.color_picker("Background color", value=live.get("background_color", DEFAULT_SETTINGS["background_color"]))
-            ann_bg = st.color_picker("Announcement banner color", value=live.get("announcement_bg", DEFAULT_SETTINGS["announcement_bg"]))
-            font_color = st.color_picker("Font color", value=live.get("font_color", DEFAULT_SETTINGS["font_color"]))
-        with c2:
-            font_family = st.selectbox("Font family", ["Sans", "Serif", "Monospace"], index=["Sans", "Serif", "Monospace"].index(live.get("font_family", "Sans")))
-            font_size = st.slider("Font size (px)", 12, 24, int(live.get("font_size", 16)))
-            default_icon = st.text_input("Default icon", value=live.get("default_icon", "📘"))
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    # Header Section
-    with st.expander("🧱 Header Options", expanded=False):
-        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
-        colh1, colh2 = st.columns([3,1])
-        with colh1:
-            # new toggles: show_title, show_logo, hide_header
-            header_visible = st.checkbox("Enable header area (title/logo)", value=live.get("header_visible", True))
-            show_title = st.checkbox("Show header title text", value=live.get("show_title", True))
-            show_logo = st.checkbox("Show header logo", value=live.get("show_logo", True))
-            hide_header = st.checkbox("Hide entire header (overrides above)", value=live.get("hide_header", False))
-            header_title = st.text_input("Header title text", value=live.get("header_title", DEFAULT_SETTINGS.get("header_title", "BSNL")))
-            logo_upload = st.file_uploader("Upload header logo (PNG/JPG) — will not be previewed here", type=["png", "jpg", "jpeg"])
-            # show filename if exists (no preview in admin)
-            current_logo = live.get("header_logo", "")
-            if current_logo:
-                st.markdown(f"Current logo file: `{os.path.basename(current_logo)}` (used in header if visible)")
-        with colh2:
-            if logo_upload:
-                os.makedirs(UPLOAD_DIR, exist_ok=True)
-                logo_path = os.path.join(UPLOAD_DIR, f"header_logo_{logo_upload.name}")
-                with open(logo_path, "wb") as f:
-                    f.write(logo_upload.read())
-                st.success("Header logo uploaded and saved.")
-                # update live and persistent settings immediately
-                live["header_logo"] = logo_path
-                save_settings(live)
-                # re-run so header reflects new logo immediately
-                st.rerun()
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    # Feature Toggles Section
-    with st.expander("⚙️ Feature Toggles", expanded=False):
-        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
-        ft = live.get("feature_toggles", DEFAULT_SETTINGS.get("feature_toggles", {}))
-        ft_ann = st.checkbox("Enable Announcements", value=ft.get("announcements", True))
-        ft_editor = st.checkbox("Enable Editor Tools", value=ft.get("editor_tools", True))
-        ft_users = st.checkbox("Enable User Management (sidebar)", value=ft.get("user_management", True))
-        ft_settings_menu = st.checkbox("Enable Settings Menu (visible to Admins)", value=ft.get("settings_menu", True))
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    # Menu Visibility Section
-    with st.expander("📋 Menu Visibility (Top-level sections)", expanded=False):
-        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
-        vs = live.get("visible_sections", {})
-        for t in list(sections.keys()):
-            if t not in vs:
-                vs[t] = True
-        topic_order = live.get("topic_order", list(sections.keys()))
-        ordered_topics = [t for t in topic_order if t in sections] + [t for t in sections if t not in topic_order]
-        new_vs = {}
-        cols = st.columns(2)
-        for i, t in enumerate(ordered_topics):
-            key = f"vis_{t}"
-            val = st.checkbox(f"{t}", value=vs.get(t, True), key=key)
-            new_vs[t] = val
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    # Ordering Section
-    with st.expander("🔀 Topic & Subtopic Ordering", expanded=False):
-        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
-        st.caption("Drag to reorder top-level sections (requires `streamlit-sortables`), fallback to numbered order inputs if not available.")
-        topics_for_order = list(ordered_topics)
-        if SORTABLES_AVAILABLE:
-            new_topic_order = sort_items(items=topics_for_order, key="topic_order")
-        else:
-            st.info("Drag-and-drop not available — pip install streamlit-sortables for DnD. Use numeric order inputs below.")
-            new_topic_order = []
-            for idx, t in enumerate(topics_for_order):
-                num = st.number_input(f"Position for '{t}'", min_value=1, max_value=len(topics_for_order), value=idx+1, key=f"num_{t}")
-                new_topic_order.append((t, num))
-            new_topic_order = [t for t, n in sorted(new_topic_order, key=lambda x: x[1])]
-
-        # Subtopic ordering per topic
-        new_subtopic_order = live.get("subtopic_order", {}).copy()
-        for t in list(sections.keys()):
-            st.markdown(f"**{t} subtopics**")
-            subs = list(sections.get(t, {}).get("subtopics", {}).keys())
-            if not subs:
-                st.markdown("_No subtopics_")
-                continue
-            cur_order = live.get("subtopic_order", {}).get(t, subs)
-            cur_order = [s for s in cur_order if s in subs] + [s for s in subs if s not in cur_order]
-            if SORTABLES_AVAILABLE:
-                res = sort_items(items=cur_order, key=f"sub_order_{t}")
-                new_subtopic_order[t] = res
-            else:
-                arr = []
-                for idx, s in enumerate(cur_order):
-                    num = st.number_input(f"Position for '{s}' in {t}", min_value=1, max_value=len(cur_order), value=idx+1, key=f"num_{t}_{s}")
-                    arr.append((s, num))
-                new_subtopic_order[t] = [s for s, n in sorted(arr, key=lambda x: x[1])]
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    # User Privileges Section - show a top-level expander, but DO NOT nest expanders inside it.
-    with st.expander("👥 User Privileges", expanded=False):
-        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
-        st.caption("Select a user from the list below and edit their privileges. Admins always have full privileges.")
-        all_users = list(users.keys())
-        # For each user, open a container (NOT an inner expander) to avoid nesting expanders.
-        for u in all_users:
-            # container looks like a card/mini-accordion entry
-            st.markdown(f"<div class='user-priv-box'><strong>User: {u}</strong> &nbsp; <span style='opacity:0.7'>({users[u]['role']})</span></div>", unsafe_allow_html=True)
-            # Now show multi-selects for view/edit across all topic+subtopic paths
-            user_privs = settings.get("user_privileges", {}).get(u, {})
-            all_topic_paths = get_all_topic_paths(sections)
-            cur_view = [p for p, perms in user_privs.items() if "view" in perms]
-            cur_edit = [p for p, perms in user_privs.items() if "edit" in perms]
-            colv, cole = st.columns([1,1])
-            with colv:
-                view_sel = st.multiselect(f"Grant VIEW access for {u}:", options=all_topic_paths, default=cur_view, key=f"view_{u}")
-            with cole:
-                edit_sel = st.multiselect(f"Grant EDIT access for {u}:", options=all_topic_paths, default=cur_edit, key=f"edit_{u}")
-            if st.button(f"Save privileges for {u}", key=f"save_priv_{u}"):
-                up = settings.get("user_privileges", {})
-                mapping = {}
-                for p in view_sel:
-                    mapping.setdefault(p, [])
-                    if "view" not in mapping[p]:
-                        mapping[p].append("view")
-                for p in edit_sel:
-                    mapping.setdefault(p, [])
-                    if "edit" not in mapping[p]:
-                        mapping[p].append("edit")
-                up[u] = mapping
-                settings["user_privileges"] = up
-                save_settings(settings)
-                st.success(f"Privileges saved for {u}")
-        st.markdown("</div>", unsafe_allow_html=True)
-
-    # Save / Reset Buttons as a final collapsible control
-    with st.expander("💾 Save / Reset Settings", expanded=False):
-        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
-        if st.button("💾 Save Settings"):
-            # update live dict and persist
-            live.update({
-                "background_color": bg,
-                "announcement_bg": ann_bg,
-                "font_color": font_color,
-                "font_family": font_family,
-                "font_size": font_size,
-                "default_icon": default_icon,
-                "header_visible": header_visible,
-                "header_title": header_title,
-                "show_title": show_title,
-                "show_logo": show_logo,
-                "hide_header": hide_header
-            })
-            live["feature_toggles"] = {
-                "announcements": ft_ann,
-                "editor_tools": ft_editor,
-                "user_management": ft_users,
-                "settings_menu": ft_settings_menu
-            }
-            live["visible_sections"] = new_vs
-            live["topic_order"] = new_topic_order
-            live["subtopic_order"] = new_subtopic_order
-            save_settings(live)
-            st.success("Settings saved and applied.")
-            st.rerun()
-        if st.button("🔄 Reset to Defaults"):
-            safe_save_json(SETTINGS_FILE, DEFAULT_SETTINGS.copy())
-            st.success("Settings reset to defaults. Reloading...")
-            st.rerun()
-        st.markdown("</div>", unsafe_allow_html=True)
-
-# ------------------ User Management ------------------
-def manage_users_page():
-    render_header()
-    st.title("👥 Manage Users")
-    tabs = st.tabs(["📋 View All","➕ Add","✏️ Edit","🗑️ Delete"])
-    with tabs[0]:
-        st.table([{"Username":u,"Role":users[u]["role"]} for u in users])
-    with tabs[1]:
-        u = st.text_input("Username"); p = st.text_input("Password", type="password")
-        r = st.selectbox("Role", ["Admin","Editor","User"])
-        if st.button("Add"): 
-            if u in users: st.error("Exists.")
-            else:
-                users[u] = {"password": p,"role": r}
-                save_users(); st.success("Added."); st.rerun()
-    with tabs[2]:
-        e = st.selectbox("Edit user", [""]+list(users.keys()))
-        if e:
-            r = st.selectbox("Role", ["Admin","Editor","User"], index=["Admin","Editor","User"].index(users[e]["role"]))
-            p = st.text_input("New password", type="password")
-            if st.button("Save"): 
-                if p: users[e]["password"]=p
-                users[e]["role"]=r; save_users(); st.success("Updated."); st.rerun()
-    with tabs[3]:
-        d = st.selectbox("Delete user", [""]+list(users.keys()))
-        if d and d!="admin" and st.button("Delete"):
-            users.pop(d,None); save_users(); st.warning("Deleted."); st.rerun()
-        elif d=="admin": st.info("Cannot delete admin.")
-
-# ------------------ Main Portal Rendering ------------------
-def _rewrite_links_to_new_tab(html_text):
-    # Add target="_blank" to anchor tags to open in new tab
-    # Works if content contains HTML <a href="..."> links
-    return re.sub(r'<a\s+href=', r'<a target="_blank" href=', html_text, flags=re.IGNORECASE)
-
-def render_section(level, node):
-    render_header()
-    if not level:
-        # show announcements only if feature enabled
-        if settings.get("feature_toggles", {}).get("announcements", True):
-            render_announcements_on_home()
-    st.markdown(f"## {breadcrumb_label(level)}")
-    if level and st.button("⬅️ Back"):
-        st.session_state.path = st.session_state.path[:-1]
-        st.rerun()
-
-    q = st.text_input("🔍 Search", key="search_box")
-    if q:
-        st.session_state.search_results = search_in_data(sections, q)
-        for p in st.session_state.search_results:
-            if st.button(" → ".join(p), key=f"s_{'_'.join(p)}"):
-                st.session_state.path = p
-                st.rerun()
-
-    # Show subtopics but filter by visible_sections and use ordering
-    subtopics = node.get("subtopics", {}) if isinstance(node, dict) else {}
-
-    # When listing subtopics in a top-level page, use settings.subtopic_order to order
-    ordered_subs = list(subtopics.keys())
-    if level:
-        parent = level[-1]
-        sorder = settings.get("subtopic_order", {}).get(parent, [])
-        ordered_subs = [s for s in sorder if s in subtopics] + [s for s in subtopics if s not in sorder]
-
-    cols = st.columns(4)
-    for i, topic in enumerate(ordered_subs):
-        data = subtopics.get(topic, {})
-        visible_sections = settings.get("visible_sections", {})
-        if not level:
-            if visible_sections.get(topic, True) is False:
-                continue
-        icon = data.get("icon", st.session_state.live_settings.get("default_icon","📘"))
-        col = cols[i % 4]
-        if col.button(f"{icon} {topic}", key=f"btn_{'_'.join(level+[topic])}"):
-            st.session_state.path.append(topic)
-            st.rerun()
-
-    # content and files
-    if isinstance(node, dict):
-        content = node.get("content","")
-        if content:
-            st.markdown("---")
-            try:
-                safe_html = _rewrite_links_to_new_tab(content)
-                st.markdown(safe_html, unsafe_allow_html=True)
-            except Exception:
-                st.markdown(content, unsafe_allow_html=True)
-
-        # Show uploaded files for everyone (only where uploaded)
-        # ====== IMPORTANT CHANGE: show files ONLY when `level` is truthy (i.e. not home)
-        if level:
-            path_id = "_".join(level)
-            page_dir = os.path.join(UPLOAD_DIR, path_id)
-            if os.path.exists(page_dir):
-                files = sorted(os.listdir(page_dir))
-                if files:
-                    st.markdown("---")
-                    c = st.columns(5)
-                    for i, f in enumerate(files):
-                        fp = os.path.join(page_dir, f)
-                        ext = f.split(".")[-1].lower()
-                        if ext in ["png", "jpg", "jpeg"]:
-                            try:
-                                c[i%5].image(fp, caption=f, width=120)
-                            except Exception:
-                                c[i%5].markdown(f"🖼️ [{f}]({fp})")
-                        else:
-                            c[i%5].markdown(f"📄 [{f}]({fp})")
-
-    # Editor controls governed by feature toggle and user privileges
-    cur_path_str = " / ".join(level) if level else ""
-    if settings.get("feature_toggles", {}).get("editor_tools", True) and (st.session_state.role == "Admin" or has_privilege(st.session_state.username, cur_path_str, "edit")):
-        st.markdown("---")
-        st.subheader("⚙️ Admin/Editor Controls")
-        edited = st_quill(value=node.get("content",""), key=f"edit_{len(level)}")
-        if settings.get("feature_toggles", {}).get("editor_tools", True):
-            if st.button("💾 Save Content"):
-                if isinstance(node, dict):
-                    node["content"] = edited
-                save_data()
-                st.success("Saved.")
-                st.rerun()
-        up = st.file_uploader("📤 Upload File", type=["png","jpg","jpeg","pdf","xlsx","xls","docx"])
-        if up:
-            # Ensure page_dir variable exists (compute only if level present, else use 'home' but do not display home files)
-            if level:
-                page_dir = os.path.join(UPLOAD_DIR, "_".join(level))
-            else:
-                page_dir = os.path.join(UPLOAD_DIR, "home")
-            os.makedirs(page_dir, exist_ok=True)
-            with open(os.path.join(page_dir, up.name),"wb") as f:
-                f.write(up.read())
-            st.success(f"Uploaded {up.name}")
-            st.rerun()
-        # Delete list for current page
-        if level:
-            page_dir = os.path.join(UPLOAD_DIR, "_".join(level))
-            files = sorted(os.listdir(page_dir)) if os.path.exists(page_dir) else []
-        else:
-            files = []
-        if files:
-            sel = st.selectbox("Delete file", [""] + files)
-            if sel and st.button("🗑️ Delete"):
-                os.remove(os.path.join(page_dir, sel))
-                st.warning(f"Deleted {sel}")
-                st.rerun()
-
-        # Subtopic management (Admins or users with edit privilege)
-        st.markdown("---")
-        st.subheader("📁 Subtopic Management")
-        new = st.text_input("Add new subtopic"); icon = st.text_input("Icon", value="📘")
-        if st.button("➕ Add") and new.strip():
-            node.setdefault("subtopics", {})[new] = {"icon": icon, "content": "", "subtopics": {}}
-            # update ordering defaults
-            settings.setdefault("subtopic_order", {})
-            parent = level[-1] if level else "home"
-            settings["subtopic_order"].setdefault(parent, [])
-            settings["subtopic_order"][parent].append(new)
-            save_data()
-            save_settings(settings)
-            st.success("Added.")
-            st.rerun()
-        subs = list(node.get("subtopics", {}).keys())
-        if subs:
-            s = st.selectbox("Rename subtopic", [""] + subs)
-            if s:
-                n = st.text_input("New name", value=s)
-                if st.button("Save rename"):
-                    node["subtopics"][n] = node["subtopics"].pop(s)
-                    # update subtopic_order
-                    parent = level[-1] if level else "home"
-                    arr = settings.get("subtopic_order", {}).get(parent, [])
-                    settings["subtopic_order"][parent] = [n if x == s else x for x in arr]
-                    save_data(); save_settings(settings)
-                    st.success("Renamed.")
-                    st.rerun()
-            d = st.selectbox("Delete subtopic", [""] + subs, key=f"d_{len(level)}")
-            if d and st.button("🗑️ Delete subtopic"):
-                node["subtopics"].pop(d, None)
-                # remove from ordering too
-                parent = level[-1] if level else "home"
-                if parent in settings.get("subtopic_order", {}):
-                    settings["subtopic_order"][parent] = [x for x in settings["subtopic_order"][parent] if x != d]
-                    save_settings(settings)
-                save_data(); st.warning("Deleted."); st.rerun()
-
-# ------------------ Guard ------------------
-if not st.session_state.get("logged_in", False):
-    login_page()
-    st.stop()
-
-# ------------------ Sidebar ------------------
-apply_global_styles(st.session_state.live_settings)
-with st.sidebar:
-    # show header logo or small title in sidebar top (keeps minimal preview)
-    logo = settings.get("header_logo", "")
-    # do NOT preview large uploaded images in admin sidebar; show only small logo if exists
-    if logo and os.path.exists(logo) and settings.get("show_logo", True) and not settings.get("hide_header", False):
-        try:
-            st.image(logo, width=110)
-        except Exception:
-            st.image("https://upload.wikimedia.org/wikipedia/en/5/5a/Bharat_Sanchar_Nigam_Limited_Logo.png", width=110)
-    else:
-        st.image("https://upload.wikimedia.org/wikipedia/en/5/5a/Bharat_Sanchar_Nigam_Limited_Logo.png", width=110)
-    st.markdown(f"### 👤 {st.session_state.username}")
-    st.markdown(f"**Role:** {st.session_state.role}")
-    st.divider()
-    st.button("🏠 Home", on_click=lambda: st.session_state.update({"path": [], "view": "portal"}), use_container_width=True)
-    # feature toggle: user management visibility
-    if settings.get("feature_toggles", {}).get("user_management", True) and st.session_state.role == "Admin":
-        st.button("👥 Manage Users", on_click=lambda: st.session_state.update({"view": "users"}), use_container_width=True)
-    # settings menu visible only if toggle on and current user is admin
-    if settings.get("feature_toggles", {}).get("settings_menu", True) and st.session_state.role == "Admin":
-        st.button("⚙️ Settings", on_click=lambda: st.session_state.update({"view": "settings"}), use_container_width=True)
-    st.button("🚪 Logout", on_click=logout, use_container_width=True)
-    st.divider()
-
-# ------------------ Router ------------------
-if st.session_state.view == "settings" and st.session_state.role == "Admin":
-    settings_page()
-elif st.session_state.view == "users" and st.session_state.role == "Admin":
-    manage_users_page()
-else:
-    # Render home/top-level using topic_order and visible_sections
-    # Build ordered top-level list using settings.topic_order
-    top_order = settings.get("topic_order", list(sections.keys()))
-    ordered_top = [t for t in top_order if t in sections] + [t for t in sections if t not in top_order]
-    # Filter by visible_sections
-    visible = settings.get("visible_sections", {})
-    # build pseudo root node to pass into render_section if at home
-    if not st.session_state.path:
-        # build a temporary node with only visible sections in desired order
-        node = {"subtopics": {}}
-        for t in ordered_top:
-            if visible.get(t, True):
-                node["subtopics"][t] = sections.get(t, {})
-        render_section([], node)
-    else:
-        cur = sections
-        valid = True
-        for step in st.session_state.path[:-1]:
-            cur = cur.get(step, {}).get("subtopics", {})
-            if cur is None:
-                valid = False
-                break
-        last = st.session_state.path[-1] if st.session_state.path else None
-        if not valid or last not in cur:
-            st.session_state.path = []
-            st.rerun()
-        node_to_render = cur.get(last, {})
-        render_section(st.session_state.path, node_to_render)
-
-# ------------------ Persist and apply saved settings if changed on disk externally ------------------
-saved = safe_load_json(SETTINGS_FILE, DEFAULT_SETTINGS.copy())
-if saved != st.session_state.live_settings:
-    st.session_state.live_settings = saved.copy()
-    settings.update(saved)
-    apply_global_styles(st.session_state.live_settings)
-
-st.markdown("<p style='text-align:center;color:lightgray;margin-top:20px;'>Developed for BSNL Customer Care Marthandam 📍 | Jijo Shaji</p>", unsafe_allow_html=True)
+# app.py - BSNL KNOWLEDGE PORTAL MRM (Final — dynamic Settings + drag-and-drop ordering + styled accordions + header control)
+import streamlit as st
+import copy
+import functools
+import io
+import json
+import os
+import threading
+import time
+from streamlit.errors import StreamlitAPIException
+from streamlit_quill import st_quill
+from portal.announcements import AnnouncementBoard, is_active, new_notice as make_notice, normalize as normalize_notices
+from portal.backups import BackupManager, BackupScheduler
+from portal.blob_store import BlobStore
+from portal.bulk import FIELDS as BULK_FIELDS, PRIVILEGE_FIELDS, format_of, import_rows, privilege_rows, read_rows, supported as bulk_supported, tree_rows, write_rows
+from portal.content_store import ContentStore
+from portal.coordination import copy_path
+from portal.defaults import apply_defaults as apply_settings_defaults
+from portal.extraction import TextExtractor
+from portal.history import RevisionHistory, diff_lines
+from portal.node_index import JUMP_BUCKETS, NodeIndex, filter_names, initial
+from portal.perf import PhaseRecorder
+from portal.privileges import PrivilegeTable, bulk_update, set_user_grants, summary_rows as privilege_summary_rows, user_grants
+from portal.render_cache import RenderCache
+from portal.search_index import SearchIndex, split_hit, strip_tags
+from portal.semantic import SemanticIndex
+from portal.static_site import SiteExporter
+from portal.storage import atomic_write_json, open_store
+from portal.store_cache import StoreCache
+from portal.thumbnails import ThumbnailCache
+from portal.typeahead import TypeaheadIndex
+
+# Try to import streamlit-sortables for drag & drop ordering in settings.
+# If not available, the Settings UI will fall back to numeric ordering inputs.
+try:
+    from streamlit_sortables import sort_items
+    SORTABLES_AVAILABLE = True
+except Exception:
+    SORTABLES_AVAILABLE = False
+
+# streamlit-keyup sends the search box value as the user types (debounced in the browser).
+# Without it the typeahead falls back to st.text_input, which updates on Enter / focus loss.
+try:
+    from st_keyup import st_keyup
+    KEYUP_AVAILABLE = True
+except Exception:
+    KEYUP_AVAILABLE = False
+
+# ------------------ Config / Files ------------------
+st.set_page_config(page_title="BSNL KNOWLEDGE PORTAL MRM", layout="wide", page_icon="📘")
+_rerun_started = time.perf_counter()
+
+DATA_FILE = "bsnl_data.json"
+USERS_FILE = "users.json"
+NOTICE_FILE = "announcements.json"
+SETTINGS_FILE = "settings.json"
+UPLOAD_DIR = "uploads"
+THUMB_DIR = os.path.join(UPLOAD_DIR, ".thumbs")
+HEADER_LOGO_PAGE = ["__header_logo__"]    # blob store owner of the header logo
+GALLERY_THUMB_PX = 240      # gallery tiles are shown at 120px; 2x for sharp HiDPI screens
+LOGO_THUMB_PX = 300         # header (150px) and sidebar (110px) logo
+BLOB_GC_SECONDS = 3600      # how often unlinked blobs and their thumbnails are swept
+EXTRACT_QUEUE_FILE = os.path.join(UPLOAD_DIR, ".extract_queue.json")    # documents waiting for text extraction
+EXTRACT_WORKERS = 2
+DB_FILE = "portal.db"
+CONTENT_DIR = "content"         # page bodies, one file each (portal/content_store.py)
+CONTENT_CACHE_BYTES = 32 * 1024 * 1024  # bodies kept in memory, least recently viewed dropped first
+STATIC_SITE_DIR = "static_site"     # read-only HTML export for a plain web server (portal/static_site.py)
+HISTORY_DIR = "history"         # per-page content revisions (portal/history.py)
+HISTORY_LIST = 50               # newest revisions offered in the history picker
+BACKUP_DIR = "backups"          # hardlinked snapshots of data, bodies, uploads and history (portal/backups.py)
+BACKUP_INTERVAL_HOURS = float(os.environ.get("PORTAL_BACKUP_HOURS", "24"))     # 0 turns the schedule off
+EMBEDDINGS_DIR = "embeddings"   # semantic search vectors per provider (portal/semantic.py; PORTAL_EMBEDDINGS)
+# "sqlite" (default) keeps everything in DB_FILE; "json" uses the JSON files directly
+STORAGE_BACKEND = os.environ.get("PORTAL_STORAGE", "sqlite")
+# JSON file -> store collection (the JSON files stay the import/export format)
+FILE_COLLECTIONS = {DATA_FILE: "sections", USERS_FILE: "users", SETTINGS_FILE: "settings", NOTICE_FILE: "announcements"}
+SEARCH_TOP_K = 25
+TILE_PAGE = 48                  # tiles drawn at once (12 rows of 4); bigger nodes get paging, a filter and an A–Z bar
+TYPEAHEAD_TOP_K = 10
+TYPEAHEAD_MIN_CHARS = 2
+TYPEAHEAD_DEBOUNCE_MS = 300     # one query per pause in typing
+ANNOUNCEMENTS_ON_HOME = 5       # newest active notices shown on the home page
+ANNOUNCEMENTS_PER_PAGE = 10     # paging for the older/expired list
+PRIV_PICKER_LIMIT = 200         # users offered at once in the privileges picker
+PRIV_SUMMARY_PAGE = 25          # rows per page in the privileges summary
+RENDER_CACHE_BYTES = 64 * 1024 * 1024   # shared budget for post-processed page HTML
+PERF_SAMPLES = 20000            # phase timings kept for the Performance view (ring buffer)
+
+DEFAULT_SETTINGS = {
+    "background_color": "#0f172a",
+    "font_color": "#ffffff",
+    "font_family": "Sans",
+    "font_size": 16,
+    "default_icon": "📘",
+    "announcement_bg": "#1f6feb",
+    "theme_mode": "dark",
+    # New dynamic settings (defaults)
+    "header_visible": True,
+    "header_title": "📘 BSNL KNOWLEDGE PORTAL MRM",
+    "header_logo": "",  # path to uploaded logo file under uploads/
+    # finer header controls
+    "show_title": True,
+    "show_logo": True,
+    "hide_header": False,
+    "feature_toggles": {
+        "announcements": True,
+        "editor_tools": True,
+        "user_management": True,
+        "settings_menu": True,
+        "typeahead": True,
+        "semantic_search": True
+    },
+    "visible_sections": {},     # will be filled lazily with keys from sections
+    "user_privileges": {},      # { username: { "Topic" or "Topic / Subtopic": ["view","edit"], ... } }
+    "topic_order": [],         # list of top-level topic names (order)
+    "subtopic_order": {}       # { "Topic": ["sub1","sub2"] }
+}
+
+# ensure folders & files exist (once per process, see shared_store)
+def _ensure_files():
+    # atomic, so a second process starting at the same moment never reads a half-written file
+    if not os.path.exists(DATA_FILE):
+        atomic_write_json(DATA_FILE, {})
+
+    if not os.path.exists(USERS_FILE):
+        atomic_write_json(USERS_FILE, {"admin": {"password": "admin123", "role": "Admin"}})
+
+    if not os.path.exists(NOTICE_FILE):
+        atomic_write_json(NOTICE_FILE, [])
+
+    if not os.path.exists(SETTINGS_FILE):
+        atomic_write_json(SETTINGS_FILE, DEFAULT_SETTINGS)
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# ------------------ Utility ------------------
+@st.cache_resource(show_spinner=False)
+def perf_recorder():
+    """Per-phase rerun timings of all sessions (ring buffer of PERF_SAMPLES), for the Performance view."""
+    return PhaseRecorder(PERF_SAMPLES)
+
+PERF = perf_recorder()
+
+def timed(phase):
+    """Record each call of the decorated function as one sample of `phase`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with PERF.phase(phase):
+                return fn(*args, **kwargs)
+        return run
+    return deco
+
+@st.cache_resource(show_spinner=False)
+def shared_store():
+    """One loaded copy of each collection for all sessions; re-loaded only when the store changes."""
+    _ensure_files()
+    files = {name: path for path, name in FILE_COLLECTIONS.items()}
+    return StoreCache(open_store(STORAGE_BACKEND, DB_FILE, files))
+
+def safe_load_json(path, default):
+    return shared_store().get(FILE_COLLECTIONS[path], default)
+
+@timed("save")
+def safe_save_json(path, data, base=None):
+    """
+    Write a collection; returns what was stored. base: the loaded copy `data` was edited from, so
+    edits saved since by another session or process are merged in rather than overwritten.
+    """
+    return shared_store().save(FILE_COLLECTIONS[path], data, base=base)
+
+with PERF.phase("store_load"):
+    sections = safe_load_json(DATA_FILE, {})
+    users = safe_load_json(USERS_FILE, {"admin": {"password": "admin123", "role": "Admin"}})
+    settings = safe_load_json(SETTINGS_FILE, copy.deepcopy(DEFAULT_SETTINGS))
+    notices = safe_load_json(NOTICE_FILE, [])
+
+# Ensure new keys exist in settings (upgrade-safe)
+def ensure_settings_defaults():
+    global settings
+    # filled in on a copy: the cached settings are shared with every session until the save publishes them
+    upgraded = copy.deepcopy(settings)
+    if apply_settings_defaults(upgraded, sections, DEFAULT_SETTINGS):
+        settings = safe_save_json(SETTINGS_FILE, upgraded, base=settings)
+
+# only re-check defaults when sections or settings were (re)loaded from disk
+_defaults_key = (shared_store().version("sections"), shared_store().version("settings"))
+if shared_store().marks.get("settings_defaults") != _defaults_key:
+    with PERF.phase("settings_defaults"):
+        ensure_settings_defaults()
+    shared_store().marks["settings_defaults"] = _defaults_key
+
+# page bodies live in CONTENT_DIR; the tree only points at them. Inline bodies (older data files)
+# are moved out once per load of the tree, and bodies nothing points at any more are dropped.
+@st.cache_resource(show_spinner=False)
+def content_store():
+    """Page bodies by ref, loaded one at a time through an LRU of CONTENT_CACHE_BYTES."""
+    return ContentStore(CONTENT_DIR, CONTENT_CACHE_BYTES)
+
+if shared_store().marks.get("content_split") != shared_store().version("sections"):
+    with PERF.phase("content_split"):
+        if content_store().has_inline(sections):
+            tree = copy.deepcopy(sections)
+            content_store().split_tree(tree)
+            sections = safe_save_json(DATA_FILE, tree)
+        content_store().gc(content_store().refs(sections))
+    shared_store().marks["content_split"] = shared_store().version("sections")
+
+# ------------------ Session ------------------
+if "logged_in" not in st.session_state:
+    st.session_state.logged_in = False
+if "username" not in st.session_state:
+    st.session_state.username = ""
+if "role" not in st.session_state:
+    st.session_state.role = ""
+if "path" not in st.session_state:
+    st.session_state.path = []
+if "view" not in st.session_state:
+    st.session_state.view = "portal"
+if "search_results" not in st.session_state:
+    st.session_state.search_results = []
+if "live_settings" not in st.session_state:
+    st.session_state.live_settings = copy.deepcopy(settings)
+    st.session_state.live_base = settings     # what live_settings was copied from (merge base of its save)
+    st.session_state.settings_generation = shared_store().generation("settings")
+
+# ------------------ Helpers ------------------
+# single-node writes: one row with the SQLite store, whole-file rewrite with the JSON store.
+# They also patch the node, search and typeahead indexes, so none is ever rebuilt for an edit.
+# `sections` is shared by every session: an edit is made on edit_tree(path) and saved from there.
+def _lookup(path, tree=None):
+    cur = {"subtopics": sections if tree is None else tree}
+    for step in path:
+        if not isinstance(cur, dict) or step not in cur.get("subtopics", {}):
+            return None
+        cur = cur["subtopics"][step]
+    return cur
+
+def _subpaths(node):
+    """Paths of a node's whole subtree relative to it, () for the node itself (its pages' manifests)."""
+    out, stack = [], [((), node)]
+    while stack:
+        rel, cur = stack.pop()
+        out.append(rel)
+        if isinstance(cur, dict) and isinstance(cur.get("subtopics"), dict):
+            stack.extend((rel + (k,), v) for k, v in cur["subtopics"].items())
+    return out
+
+def edit_tree(path):
+    """A copy of `sections` whose nodes along path (and their children dicts) may be edited."""
+    return copy_path(sections, path)
+
+def _adopt(saved, version):
+    """
+    `saved` becomes `sections`. True if the store replayed our edit onto a tree another process had
+    changed; the indexes rebuild from that one (its version moved), so there is nothing to patch.
+    An edit replayed onto another session's save is patched like our own, from `saved`.
+    The semantic index is refreshed either way (refresh_semantic).
+    """
+    global sections
+    sections = saved
+    return shared_store().version("sections") != version
+
+# the edited tree came from edit_tree(), i.e. from `sections`: that is the base the store checks
+@timed("save")
+def save_node(path, tree):
+    if not path or _lookup(path, tree) is None:
+        return  # not part of sections (e.g. the synthetic home node)
+    version = shared_store().version("sections")
+    if not _adopt(shared_store().save_node("sections", tree, path, base=sections), version):
+        node = _lookup(path)
+        node_index().repoint(sections, path)
+        node_index().add(path, node)
+        search_index().update(path, node)
+        typeahead_index().update(path, node)
+    refresh_semantic()
+
+@timed("save")
+def rename_node(old_path, new_path, tree):
+    history().rename(old_path, new_path)
+    drop_blobs(blob_store().move_pages(old_path, new_path, _subpaths(_lookup(new_path, tree))))
+    version = shared_store().version("sections")
+    if not _adopt(shared_store().rename_node("sections", tree, old_path, new_path, base=sections), version):
+        node = _lookup(new_path)
+        node_index().repoint(sections, new_path[:-1])
+        node_index().rename(old_path, new_path, node)
+        search_index().rename(old_path, new_path, node, files=_extracted_files)
+        typeahead_index().rename(old_path, new_path, node)
+    refresh_semantic()
+
+@timed("save")
+def delete_node(path, tree):
+    history().remove(path)
+    drop_blobs(blob_store().drop_pages(path, _subpaths(_lookup(path))))
+    version = shared_store().version("sections")
+    if not _adopt(shared_store().delete_node("sections", tree, path, base=sections), version):
+        node_index().repoint(sections, path[:-1])
+        node_index().remove(path)
+        search_index().remove(path)
+        typeahead_index().remove(path)
+    refresh_semantic()
+def save_users(u):
+    global users
+    users = safe_save_json(USERS_FILE, u, base=users)
+def save_notices(n): safe_save_json(NOTICE_FILE, n)
+def save_settings(s, base=None):
+    global settings
+    s = safe_save_json(SETTINGS_FILE, s, base=settings if base is None else base)
+    # apply live settings
+    st.session_state.live_settings = copy.deepcopy(s)
+    st.session_state.live_base = s
+    # update global settings var too
+    settings = s
+
+@timed("styles")
+def apply_global_styles(st_settings):
+    font_map = {
+        "Sans": "Segoe UI, Tahoma, Geneva, Verdana, sans-serif",
+        "Serif": "Georgia, 'Times New Roman', Times, serif",
+        "Monospace": "Menlo, Monaco, Consolas, 'Courier New', monospace"
+    }
+    font_family_css = font_map.get(st_settings.get("font_family", "Sans"), font_map["Sans"])
+    bg = st_settings.get("background_color", DEFAULT_SETTINGS["background_color"])
+    color = st_settings.get("font_color", DEFAULT_SETTINGS["font_color"])
+    font_size = st_settings.get("font_size", DEFAULT_SETTINGS["font_size"])
+    ann_bg = st_settings.get("announcement_bg", DEFAULT_SETTINGS["announcement_bg"])
+
+    # Additional CSS: style expander to look like card/accordion and small animation
+    css = f"""
+    <style>
+    .stApp {{
+        background-color: {bg};
+        color: {color};
+        font-family: {font_family_css};
+        font-size: {font_size}px;
+    }}
+    h1,h2,h3,h4,h5,h6{{color:{color};}}
+    .announcement-banner{{background-color:{ann_bg};padding:8px 12px;border-radius:6px;margin-bottom:12px;}}
+    .announcement-text{{color:white;font-weight:700;text-align:center;margin:0;font-size:{font_size}px;}}
+    a{{color:#4ea8ff;}}
+
+    /* Accordion/Expander card look */
+    .streamlit-expanderHeader {{
+        background-color: rgba(255,255,255,0.02) !important;
+        border-radius: 10px;
+        padding: 10px 12px !important;
+        margin-bottom: 6px;
+        transition: transform .12s ease, box-shadow .12s ease;
+        box-shadow: 0 1px 0 rgba(0,0,0,0.2);
+    }}
+    .streamlit-expanderHeader:hover {{
+        transform: translateY(-2px);
+        box-shadow: 0 6px 18px rgba(0,0,0,0.25);
+    }}
+    .streamlit-expanderContent {{
+        background-color: rgba(255,255,255,0.01) !important;
+        border-radius: 8px;
+        padding: 12px;
+        margin-bottom: 12px;
+    }}
+    .portal-header {{
+        text-align:center;
+        font-size:28px;
+        font-weight:bold;
+        margin-top:10px;
+        margin-bottom:20px;
+        color:{color};
+    }}
+    .settings-section {{
+        border: 1px solid rgba(255,255,255,0.03);
+        padding: 10px;
+        border-radius: 10px;
+        margin-bottom: 14px;
+        background: rgba(255,255,255,0.01);
+    }}
+    .user-priv-box {{
+        border:1px solid rgba(255,255,255,0.04);
+        padding:8px;
+        border-radius:8px;
+        margin-bottom:8px;
+        background: rgba(0,0,0,0.02);
+    }}
+    </style>
+    """
+    st.markdown(css, unsafe_allow_html=True)
+
+def breadcrumb_label(path): return " / ".join(path) if path else "🏠 Home"
+
+def _indexed_content(node):
+    # index builds read every body once; keep them out of the page LRU
+    return content_store().content_of(node, cache=False)
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _search_index(data_version):
+    idx = SearchIndex.build(safe_load_json(DATA_FILE, {}), content=_indexed_content)
+    # attached documents whose text is already extracted (the rest arrive through apply_extracted)
+    for path, files in blob_store().pages():
+        if path and _lookup(path) is not None:
+            for name, entry in files.items():
+                text = text_extractor().text_for(entry)
+                if text:
+                    idx.update_file(path, name, text)
+    return idx
+
+def _extracted_files(path):
+    """[(name, text)] of a page's attached documents whose text is extracted."""
+    out = []
+    for name, _, entry in blob_store().list_files(path):
+        text = text_extractor().text_for(entry)
+        if text:
+            out.append((name, text))
+    return out
+
+def search_index():
+    """Process-wide inverted index, built once per load of DATA_FILE and patched on every tree edit."""
+    return _search_index(shared_store().version("sections"))
+
+@st.cache_resource(show_spinner=False)
+def _semantic_index():
+    # bound to the store here: refresh_later reads bodies outside any rerun
+    bodies = content_store()
+    return SemanticIndex(EMBEDDINGS_DIR, content_of=lambda node: bodies.content_of(node, cache=False))
+
+@timed("semantic_sync")
+def semantic_index():
+    """
+    Embedding matrix over titles and content chunks, kept on disk under EMBEDDINGS_DIR. Edits made
+    here are embedded in the background right after their save (refresh_semantic); a search only
+    syncs when the tree changed some other way (another process, a restore). Only nodes whose
+    title path or content ref moved are embedded again.
+    """
+    generation = shared_store().generation("sections")     # read before the tree: a newer tree only re-syncs
+    index = _semantic_index()
+    index.refresh(safe_load_json(DATA_FILE, {}), generation)
+    return index
+
+def refresh_semantic():
+    """Re-embed what a save changed, off the rerun (searches wait only if they arrive meanwhile)."""
+    if settings.get("feature_toggles", {}).get("semantic_search", True):
+        _semantic_index().refresh_later(sections, shared_store().generation("sections"))
+
+def apply_extracted():
+    """Move documents the extraction workers finished since the last call into the search index."""
+    for path, name, text in text_extractor().completed():
+        if path and _lookup(path) is not None:
+            search_index().update_file(path, name, text)
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _typeahead_index(data_version):
+    return TypeaheadIndex.build(safe_load_json(DATA_FILE, {}), content=_indexed_content)
+
+def typeahead_index():
+    """Trigram index over titles and key phrases for fuzzy suggestions; patched like search_index()."""
+    return _typeahead_index(shared_store().version("sections"))
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _node_index(data_version):
+    return NodeIndex.build(safe_load_json(DATA_FILE, {}))
+
+def node_index():
+    """Process-wide path -> node index (parents, depth, child order), patched on every tree edit."""
+    idx = _node_index(shared_store().version("sections"))
+    idx.sync_order(shared_store().generation("settings"))
+    return idx
+
+def get_all_topic_paths():
+    """Return list of strings 'Top' or 'Top / Sub' for all topics (memoized by the node index)."""
+    return node_index().all_paths()
+
+@st.cache_resource(show_spinner=False)
+def _privilege_state():
+    return {"table": None, "key": None, "tree": None}
+
+def privilege_table():
+    """
+    Compiled user_privileges (see portal/privileges.py), shared by all sessions.
+    Recompiled only when the grants or the set of Admins actually changed; the per-path
+    memo is dropped when the topic tree changes.
+    """
+    state = _privilege_state()
+    key = (shared_store().generation("settings"), shared_store().generation("users"))
+    if state["key"] != key:
+        grants = settings.get("user_privileges", {})
+        admins = {u for u, info in users.items() if isinstance(info, dict) and info.get("role") == "Admin"}
+        if state["table"] is None or not state["table"].matches(grants, admins):
+            state["table"] = PrivilegeTable(grants, admins)
+        state["key"] = key
+    tree = shared_store().generation("sections")
+    if state["tree"] != tree:
+        state["table"].clear_memo()
+        state["tree"] = tree
+    return state["table"]
+
+def has_privilege(username, path, action):
+    """
+    path: either list or string like 'Top / Sub'
+    action: 'view' or 'edit'
+    Checks exact path, then parent paths e.g. if user has permission on 'Top' it applies to 'Top / Sub' as well.
+    """
+    return privilege_table().allowed(username, path, action)
+
+def filter_privileged(username, paths, action):
+    """Bulk has_privilege: the subset of paths username may view/edit."""
+    return privilege_table().filter_paths(username, paths, action)
+
+@st.cache_resource(show_spinner=False)
+def blob_store():
+    """Content-addressed uploads (uploads/.blobs) linked from per-page manifests (uploads/.pages)."""
+    return BlobStore(UPLOAD_DIR)
+
+@timed("gallery_listing")
+def page_files(level):
+    """[(name, stored path, entry)] for a page; imports an old uploads/<Top_Sub>/ folder on first view."""
+    if blob_store().migrate_legacy(level, os.path.join(UPLOAD_DIR, "_".join(level) if level else "home")) and level:
+        for name, _, entry in blob_store().list_files(level):
+            text_extractor().submit(level, name, entry)
+    return blob_store().list_files(level)
+
+@st.cache_resource(show_spinner=False)
+def text_extractor():
+    """Process pool extracting uploaded pdf/docx/xlsx text next to the blobs; queue survives restarts."""
+    ex = TextExtractor(blob_store(), EXTRACT_QUEUE_FILE, workers=EXTRACT_WORKERS)
+    ex.backfill()
+    return ex
+
+def drop_blobs(paths):
+    for bp in paths:
+        thumbnails().evict(bp, digest=os.path.basename(bp).split(".")[0])
+
+@st.cache_resource(show_spinner=False)
+def history():
+    """Per-page content revisions; read only when someone opens a page's history."""
+    return RevisionHistory(HISTORY_DIR)
+
+@st.cache_resource(show_spinner=False)
+def thumbnails():
+    """Downscaled image variants under uploads/.thumbs, shared by all sessions."""
+    return ThumbnailCache(THUMB_DIR, sizes=(GALLERY_THUMB_PX,))
+
+# blobs nothing links any more (pages deleted by an older version, interrupted uploads) and
+# thumbnails of images that are gone are swept at startup and then every BLOB_GC_SECONDS
+# in a background thread: the sweep walks every manifest and blob, which no rerun should wait for
+def _sweep_blobs(blobs, thumbs):
+    for bp in blobs.gc():
+        thumbs.evict(bp, digest=os.path.basename(bp).split(".")[0])
+    thumbs.prune(digest for digest, _ in blobs.referenced())
+
+if time.time() - shared_store().marks.get("blob_gc", 0) > BLOB_GC_SECONDS:
+    shared_store().marks["blob_gc"] = time.time()
+    threading.Thread(target=_sweep_blobs, args=(blob_store(), thumbnails()), name="blob-gc", daemon=True).start()
+
+@timed("header")
+def render_header():
+    # central header shown on each page
+    # respects hide_header, show_logo, show_title
+    if settings.get("hide_header", False):
+        return
+    header_visible = settings.get("header_visible", True)
+    if not header_visible:
+        return
+    logo = settings.get("header_logo", "") or ""
+    title = settings.get("header_title", "📘 BSNL KNOWLEDGE PORTAL MRM")
+    show_logo = settings.get("show_logo", True)
+    show_title = settings.get("show_title", True)
+    cols = st.columns([1, 6, 1])
+    with cols[1]:
+        if show_logo and logo and os.path.exists(logo):
+            try:
+                st.image(thumbnails().thumbnail(logo, LOGO_THUMB_PX), width=150)
+            except Exception:
+                if show_title:
+                    st.markdown(f"<div class='portal-header'>{title}</div>", unsafe_allow_html=True)
+                else:
+                    st.markdown("", unsafe_allow_html=True)
+        else:
+            if show_title:
+                st.markdown(f"<div class='portal-header'>{title}</div>", unsafe_allow_html=True)
+            else:
+                st.markdown("", unsafe_allow_html=True)
+
+# ------------------ Auth ------------------
+def login(username, password):
+    if username in users and users[username]["password"] == password:
+        st.session_state.logged_in = True
+        st.session_state.username = username
+        st.session_state.role = users[username]["role"]
+        st.session_state.view = "portal"
+        st.rerun()
+    else:
+        st.error("Invalid username or password.")
+
+def logout():
+    st.session_state.clear()
+    st.session_state.logged_in = False
+    st.session_state.view = "login"
+    st.rerun()
+
+def login_page():
+    render_header()
+    st.title("🔐 Login to BSNL KNOWLEDGE PORTAL")
+    u = st.text_input("Username")
+    p = st.text_input("Password", type="password")
+    if st.button("Login"):
+        login(u, p)
+
+# ------------------ Announcements ------------------
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _announcement_board(generation):
+    items, changed = normalize_notices(safe_load_json(NOTICE_FILE, []))
+    if changed:
+        save_notices(items)     # one-time upgrade of plain-string announcements
+    return AnnouncementBoard(items)
+
+def announcement_board():
+    """Sorted active/archived notices, rebuilt only when announcements are saved or reloaded."""
+    return _announcement_board(shared_store().generation("announcements"))
+
+def _notice_label(n):
+    text = strip_tags(n.get("body", "")).strip()
+    when = time.strftime("%d-%m-%Y", time.localtime(n["created"])) if n.get("created", 0) > 100000 else "earlier"
+    return f"{'📌 ' if n.get('pinned') else ''}{when} — {text[:60]}"
+
+@timed("announcements")
+def render_announcements_on_home():
+    board = announcement_board()
+    if settings.get("feature_toggles", {}).get("announcements", True):
+        st.markdown("<div class='announcement-banner'><p class='announcement-text'>📢 Announcements</p></div>", unsafe_allow_html=True)
+        active = board.active()
+        if active:
+            for i, n in enumerate(active[:ANNOUNCEMENTS_ON_HOME], 1):
+                pin = "📌 " if n.get("pinned") else ""
+                st.markdown(f"<p class='announcement-text'>{pin}{i}. {n['body']}</p>", unsafe_allow_html=True)
+        else:
+            st.markdown("<p style='color:lightgray;text-align:center;'>No active announcements.</p>", unsafe_allow_html=True)
+        older = active[ANNOUNCEMENTS_ON_HOME:] + board.archive()
+        if older:
+            with st.expander(f"📜 Older announcements ({len(older)})", expanded=False):
+                pages = max(1, -(-len(older) // ANNOUNCEMENTS_PER_PAGE))
+                pg = st.number_input("Page", min_value=1, max_value=pages, value=1, key="notice_page")
+                chunk, _ = AnnouncementBoard.page(older, pg, ANNOUNCEMENTS_PER_PAGE)
+                for n in chunk:
+                    st.caption(_notice_label(n) + (" (expired)" if not is_active(n, time.time()) else ""))
+                    st.markdown(n["body"], unsafe_allow_html=True)
+    if st.session_state.role in ["Admin", "Editor"]:
+        st.divider()
+        st.markdown("### ✏️ Manage Announcements")
+        if not settings.get("feature_toggles", {}).get("announcements", True):
+            st.info("Announcements module is currently disabled via Settings.")
+        new_notice = st_quill(value="")
+        c1, c2 = st.columns(2)
+        pinned = c1.checkbox("📌 Pin to top")
+        expires_on = c2.date_input("Expires on (optional)", value=None)
+        if st.button("📢 Post Announcement"):
+            if new_notice.strip():
+                # expires at the end of the chosen day
+                expires = time.mktime(expires_on.timetuple()) + 86400 if expires_on else None
+                save_notices(board.with_added(make_notice(new_notice, pinned=pinned, expires=expires)))
+                st.success("Announcement posted.")
+                st.rerun()
+        if board.notices:
+            sel = st.selectbox("Select announcement", [""] + [n["id"] for n in board.active() + board.archive()],
+                               format_func=lambda nid: _notice_label(board.by_id[nid]) if nid else "")
+            if sel:
+                d1, d2 = st.columns(2)
+                is_pinned = board.by_id[sel].get("pinned")
+                if d1.button("📍 Unpin" if is_pinned else "📌 Pin"):
+                    save_notices(board.with_pinned(sel, not is_pinned))
+                    st.rerun()
+                if d2.button("🗑️ Delete Selected"):
+                    save_notices(board.without(sel))
+                    st.warning("Deleted.")
+                    st.rerun()
+
+# ------------------ Settings (Enhanced with styled accordions + header control) ------------------
+def settings_page():
+    render_header()
+    st.title("⚙️ Settings")
+
+    if st.session_state.role != "Admin":
+        st.warning("Only Admins can modify settings (you can still view).")
+
+    # Load live copy from session
+    live = st.session_state.live_settings
+
+    # We will put each section inside a styled expander to look like accordions.
+    # Appearance Section
+    with st.expander("🎨 Appearance", expanded=False):
+        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
+        c1, c2 = st.columns(2)
+        with c1:
+            bg = st.color_picker("Background color", value=live.get("background_color", DEFAULT_SETTINGS["background_color"]))
+            ann_bg = st.color_picker("Announcement banner color", value=live.get("announcement_bg", DEFAULT_SETTINGS["announcement_bg"]))
+            font_color = st.color_picker("Font color", value=live.get("font_color", DEFAULT_SETTINGS["font_color"]))
+        with c2:
+            font_family = st.selectbox("Font family", ["Sans", "Serif", "Monospace"], index=["Sans", "Serif", "Monospace"].index(live.get("font_family", "Sans")))
+            font_size = st.slider("Font size (px)", 12, 24, int(live.get("font_size", 16)))
+            default_icon = st.text_input("Default icon", value=live.get("default_icon", "📘"))
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # Header Section
+    with st.expander("🧱 Header Options", expanded=False):
+        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
+        colh1, colh2 = st.columns([3,1])
+        with colh1:
+            # new toggles: show_title, show_logo, hide_header
+            header_visible = st.checkbox("Enable header area (title/logo)", value=live.get("header_visible", True))
+            show_title = st.checkbox("Show header title text", value=live.get("show_title", True))
+            show_logo = st.checkbox("Show header logo", value=live.get("show_logo", True))
+            hide_header = st.checkbox("Hide entire header (overrides above)", value=live.get("hide_header", False))
+            header_title = st.text_input("Header title text", value=live.get("header_title", DEFAULT_SETTINGS.get("header_title", "BSNL")))
+            logo_upload = st.file_uploader("Upload header logo (PNG/JPG) — will not be previewed here", type=["png", "jpg", "jpeg"])
+            # show filename if exists (no preview in admin)
+            current_logo = live.get("header_logo", "")
+            if current_logo:
+                st.markdown(f"Current logo file: `{os.path.basename(current_logo)}` (used in header if visible)")
+        with colh2:
+            if logo_upload:
+                entry, orphans = blob_store().add_file(HEADER_LOGO_PAGE, logo_upload.name, logo_upload, replace_all=True)
+                drop_blobs(orphans)
+                logo_path = blob_store().blob_path(entry["blob"], entry["ext"])
+                thumbnails().thumbnail(logo_path, LOGO_THUMB_PX, digest=entry["blob"])
+                st.success("Header logo uploaded and saved.")
+                # update live and persistent settings immediately
+                live["header_logo"] = logo_path
+                save_settings(live, base=st.session_state.get("live_base"))
+                # re-run so header reflects new logo immediately
+                st.rerun()
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # Feature Toggles Section
+    with st.expander("⚙️ Feature Toggles", expanded=False):
+        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
+        ft = live.get("feature_toggles", DEFAULT_SETTINGS.get("feature_toggles", {}))
+        ft_ann = st.checkbox("Enable Announcements", value=ft.get("announcements", True))
+        ft_editor = st.checkbox("Enable Editor Tools", value=ft.get("editor_tools", True))
+        ft_users = st.checkbox("Enable User Management (sidebar)", value=ft.get("user_management", True))
+        ft_settings_menu = st.checkbox("Enable Settings Menu (visible to Admins)", value=ft.get("settings_menu", True))
+        ft_typeahead = st.checkbox("Enable fuzzy search suggestions", value=ft.get("typeahead", True))
+        ft_semantic = st.checkbox("Enable semantic search mode", value=ft.get("semantic_search", True))
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # Menu Visibility Section
+    with st.expander("📋 Menu Visibility (Top-level sections)", expanded=False):
+        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
+        vs = live.get("visible_sections", {})
+        for t in list(sections.keys()):
+            if t not in vs:
+                vs[t] = True
+        topic_order = live.get("topic_order", list(sections.keys()))
+        ordered_topics = [t for t in topic_order if t in sections] + [t for t in sections if t not in topic_order]
+        new_vs = {}
+        cols = st.columns(2)
+        for i, t in enumerate(ordered_topics):
+            key = f"vis_{t}"
+            val = st.checkbox(f"{t}", value=vs.get(t, True), key=key)
+            new_vs[t] = val
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # Ordering Section
+    with st.expander("🔀 Topic & Subtopic Ordering", expanded=False):
+        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
+        st.caption("Drag to reorder top-level sections (requires `streamlit-sortables`), fallback to numbered order inputs if not available.")
+        topics_for_order = list(ordered_topics)
+        if SORTABLES_AVAILABLE:
+            new_topic_order = sort_items(items=topics_for_order, key="topic_order")
+        else:
+            st.info("Drag-and-drop not available — pip install streamlit-sortables for DnD. Use numeric order inputs below.")
+            new_topic_order = []
+            for idx, t in enumerate(topics_for_order):
+                num = st.number_input(f"Position for '{t}'", min_value=1, max_value=len(topics_for_order), value=idx+1, key=f"num_{t}")
+                new_topic_order.append((t, num))
+            new_topic_order = [t for t, n in sorted(new_topic_order, key=lambda x: x[1])]
+
+        # Subtopic ordering per topic
+        new_subtopic_order = live.get("subtopic_order", {}).copy()
+        for t in list(sections.keys()):
+            st.markdown(f"**{t} subtopics**")
+            subs = list(sections.get(t, {}).get("subtopics", {}).keys())
+            if not subs:
+                st.markdown("_No subtopics_")
+                continue
+            cur_order = live.get("subtopic_order", {}).get(t, subs)
+            cur_order = [s for s in cur_order if s in subs] + [s for s in subs if s not in cur_order]
+            if SORTABLES_AVAILABLE:
+                res = sort_items(items=cur_order, key=f"sub_order_{t}")
+                new_subtopic_order[t] = res
+            else:
+                arr = []
+                for idx, s in enumerate(cur_order):
+                    num = st.number_input(f"Position for '{s}' in {t}", min_value=1, max_value=len(cur_order), value=idx+1, key=f"num_{t}_{s}")
+                    arr.append((s, num))
+                new_subtopic_order[t] = [s for s, n in sorted(arr, key=lambda x: x[1])]
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # User Privileges Section - show a top-level expander, but DO NOT nest expanders inside it.
+    # Only one user's grants are turned into widgets at a time, so the cost does not grow with headcount.
+    with st.expander("👥 User Privileges", expanded=False):
+        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
+        st.caption("Pick a user to edit their privileges, or grant/revoke in bulk. Admins always have full privileges.")
+        all_topic_paths = get_all_topic_paths()     # memoized per tree version
+        privs = settings.get("user_privileges", {})
+        tab_user, tab_bulk, tab_summary = st.tabs(["✏️ One user", "👥 Bulk", "📋 Summary"])
+        with tab_user:
+            flt = st.text_input("Find user", key="priv_user_filter").strip().lower()
+            matches = [u for u in users if flt in u.lower()] if flt else list(users)
+            if len(matches) > PRIV_PICKER_LIMIT:
+                st.caption(f"{len(matches)} users match — showing the first {PRIV_PICKER_LIMIT}; refine the search.")
+            u = st.selectbox("User", [""] + matches[:PRIV_PICKER_LIMIT], key="priv_user")
+            if u:
+                st.markdown(f"<div class='user-priv-box'><strong>User: {u}</strong> &nbsp; <span style='opacity:0.7'>({users[u]['role']})</span></div>", unsafe_allow_html=True)
+                cur_view, cur_edit = user_grants(privs, u)
+                # grants on paths that no longer exist are kept selectable instead of crashing the widget
+                options = all_topic_paths + [p for p in dict.fromkeys(cur_view + cur_edit) if p not in all_topic_paths]
+                colv, cole = st.columns([1,1])
+                with colv:
+                    view_sel = st.multiselect(f"Grant VIEW access for {u}:", options=options, default=cur_view, key=f"view_{u}")
+                with cole:
+                    edit_sel = st.multiselect(f"Grant EDIT access for {u}:", options=options, default=cur_edit, key=f"edit_{u}")
+                if st.button(f"Save privileges for {u}", key=f"save_priv_{u}"):
+                    new_settings = copy.deepcopy(settings)
+                    set_user_grants(new_settings.setdefault("user_privileges", {}), u, view_sel, edit_sel)
+                    save_settings(new_settings)
+                    st.success(f"Privileges saved for {u}")
+        with tab_bulk:
+            roles = ["Admin", "Editor", "User"]
+            target = st.radio("Apply to", ["Role", "Selected users"], horizontal=True, key="priv_bulk_target")
+            if target == "Role":
+                role = st.selectbox("Role", roles, index=2, key="priv_bulk_role")
+                targets = [x for x, info in users.items() if info.get("role") == role]
+            else:
+                targets = st.multiselect("Users", list(users), key="priv_bulk_users")
+            paths = st.multiselect("Topics", all_topic_paths, key="priv_bulk_paths")
+            action = st.radio("Access", ["view", "edit"], horizontal=True, key="priv_bulk_action")
+            st.caption(f"{len(targets)} user(s) selected.")
+            b1, b2 = st.columns(2)
+            for grant, col, label in ((True, b1, "✅ Grant"), (False, b2, "🚫 Revoke")):
+                if col.button(label, key=f"priv_bulk_{grant}", disabled=not (targets and paths)):
+                    new_settings = copy.deepcopy(settings)
+                    n = bulk_update(new_settings.setdefault("user_privileges", {}), targets, paths, action, grant=grant)
+                    save_settings(new_settings)
+                    st.success(f"{'Granted' if grant else 'Revoked'} {action} on {len(paths)} topic(s) for {n} user(s).")
+        with tab_summary:
+            rows = privilege_summary_rows(users, privs)
+            pages = max(1, -(-len(rows) // PRIV_SUMMARY_PAGE))
+            pg = st.number_input("Page", min_value=1, max_value=pages, value=1, key="priv_summary_page")
+            st.table(rows[(pg - 1) * PRIV_SUMMARY_PAGE: pg * PRIV_SUMMARY_PAGE])
+            st.caption(f"{len(rows)} users · page {pg} of {pages}")
+        st.markdown("</div>", unsafe_allow_html=True)
+
+    # Save / Reset Buttons as a final collapsible control
+    with st.expander("💾 Save / Reset Settings", expanded=False):
+        st.markdown("<div class='settings-section'>", unsafe_allow_html=True)
+        if st.button("💾 Save Settings"):
+            # update live dict and persist
+            live.update({
+                "background_color": bg,
+                "announcement_bg": ann_bg,
+                "font_color": font_color,
+                "font_family": font_family,
+                "font_size": font_size,
+                "default_icon": default_icon,
+                "header_visible": header_visible,
+                "header_title": header_title,
+                "show_title": show_title,
+                "show_logo": show_logo,
+                "hide_header": hide_header
+            })
+            live["feature_toggles"] = {
+                "announcements": ft_ann,
+                "editor_tools": ft_editor,
+                "user_management": ft_users,
+                "settings_menu": ft_settings_menu,
+                "typeahead": ft_typeahead,
+                "semantic_search": ft_semantic
+            }
+            live["visible_sections"] = new_vs
+            live["topic_order"] = new_topic_order
+            live["subtopic_order"] = new_subtopic_order
+            save_settings(live, base=st.session_state.get("live_base"))
+            st.success("Settings saved and applied.")
+            st.rerun()
+        if st.button("🔄 Reset to Defaults"):
+            safe_save_json(SETTINGS_FILE, copy.deepcopy(DEFAULT_SETTINGS))
+            st.success("Settings reset to defaults. Reloading...")
+            st.rerun()
+        st.markdown("</div>", unsafe_allow_html=True)
+
+# ------------------ User Management ------------------
+def manage_users_page():
+    render_header()
+    st.title("👥 Manage Users")
+    tabs = st.tabs(["📋 View All","➕ Add","✏️ Edit","🗑️ Delete"])
+    with tabs[0]:
+        st.table([{"Username":u,"Role":users[u]["role"]} for u in users])
+    with tabs[1]:
+        u = st.text_input("Username"); p = st.text_input("Password", type="password")
+        r = st.selectbox("Role", ["Admin","Editor","User"])
+        if st.button("Add"): 
+            if u in users: st.error("Exists.")
+            else:
+                save_users({**users, u: {"password": p,"role": r}}); st.success("Added."); st.rerun()
+    with tabs[2]:
+        e = st.selectbox("Edit user", [""]+list(users.keys()))
+        if e:
+            r = st.selectbox("Role", ["Admin","Editor","User"], index=["Admin","Editor","User"].index(users[e]["role"]))
+            p = st.text_input("New password", type="password")
+            if st.button("Save"): 
+                edited = {**users, e: {**users[e], "role": r, **({"password": p} if p else {})}}
+                save_users(edited); st.success("Updated."); st.rerun()
+    with tabs[3]:
+        d = st.selectbox("Delete user", [""]+list(users.keys()))
+        if d and d!="admin" and st.button("Delete"):
+            save_users({k: v for k, v in users.items() if k != d}); st.warning("Deleted."); st.rerun()
+        elif d=="admin": st.info("Cannot delete admin.")
+
+# ------------------ Bulk import / export ------------------
+def bulk_page():
+    global sections
+    render_header()
+    st.title("📦 Bulk Import / Export")
+    formats = [f for f in ("csv", "xlsx", "jsonl") if bulk_supported(f)]
+    st.subheader("Import")
+    st.caption("One row per page with columns path (\"Top / Sub / Page\"), icon and content (HTML). "
+               "Missing parent topics are created; everything is saved in one write at the end.")
+    up = st.file_uploader("Rows file", type=formats, key="bulk_file")
+    overwrite = st.checkbox("Replace icon and content of pages that already exist", value=True)
+    dry_run = st.checkbox("Validate only (change nothing)")
+    if up and st.button("📥 Import"):
+        bar = st.progress(0.0, text="Reading rows…")
+        up.seek(0)
+
+        def show(n):
+            bar.progress(min(1.0, up.tell() / max(1, up.size)), text=f"{n:,} rows")
+
+        with PERF.phase("bulk_import"):
+            # rows are applied to private copies: the shared tree changes only by the save below,
+            # so a failed import leaves nothing behind for other sessions
+            tree, new_settings = copy.deepcopy(sections), copy.deepcopy(settings)
+            report = import_rows(read_rows(up, format_of(up.name)), tree, new_settings, content_store(),
+                                 default_icon=settings.get("default_icon", "📘"), overwrite=overwrite,
+                                 dry_run=dry_run, progress=show)
+            if not dry_run and (report.created or report.updated):
+                sections = safe_save_json(DATA_FILE, tree)
+                save_settings(new_settings)
+                # too many nodes changed to patch the indexes one by one
+                shared_store().touch("sections")
+                refresh_semantic()
+        bar.progress(1.0, text=f"{report.rows:,} rows")
+        c = st.columns(4)
+        c[0].metric("Created" if not dry_run else "Would create", report.created)
+        c[1].metric("Updated" if not dry_run else "Would update", report.updated)
+        c[2].metric("Unchanged", report.unchanged)
+        c[3].metric("Rejected rows", report.error_count)
+        if report.errors:
+            st.dataframe([{"Line": line, "Problem": msg} for line, msg in report.errors],
+                         use_container_width=True, hide_index=True)
+    st.subheader("Export")
+    fmt = st.selectbox("Format", formats, key="bulk_fmt")
+    if st.button("📤 Prepare export"):
+        bar = st.progress(0.0, text="Writing rows…")
+        total = max(1, len(node_index()))
+        out = {}
+        with PERF.phase("bulk_export"):
+            for kind, rows, fields in (("pages", tree_rows(sections, settings, content_store()), BULK_FIELDS),
+                                       ("privileges", privilege_rows(settings), PRIVILEGE_FIELDS)):
+                # in memory: the download button holds the bytes anyway, and nothing is left on disk
+                buf = io.BytesIO()
+                n = write_rows(rows, fields, buf, fmt,
+                               progress=lambda n: bar.progress(min(1.0, n / total), text=f"{n:,} rows"))
+                out[kind] = (buf.getvalue(), n, fmt)
+        st.session_state.bulk_export = out
+    for kind, (data, n, ext) in st.session_state.get("bulk_export", {}).items():
+        st.download_button(f"⬇️ {kind} ({n:,} rows)", data, file_name=f"portal_{kind}.{ext}", key=f"bulk_dl_{kind}")
+    static_site_section()
+
+@st.cache_resource(show_spinner=False)
+def site_exporter():
+    return SiteExporter(STATIC_SITE_DIR, content_store(), blob_store(), render=render_cache().render,
+                        thumbnail=lambda fp, digest: thumbnails().thumbnail(fp, GALLERY_THUMB_PX, digest=digest))
+
+def static_site_section():
+    st.subheader("Static site")
+    st.caption(f"Read-only HTML copy of the visible portal in {STATIC_SITE_DIR}/ (pages, files, search) for a "
+               "plain web server. Exporting again rewrites only pages whose content, tiles or files changed.")
+    if st.button("🌐 Export static site"):
+        bar = st.progress(0.0, text="Rendering pages…")
+        total = max(1, len(node_index()))
+        with PERF.phase("static_export"):
+            stats = site_exporter().export(
+                sections, settings, progress=lambda n: bar.progress(min(1.0, n / total), text=f"{n:,} pages"))
+        bar.progress(1.0, text=f"{stats['pages']:,} pages")
+        st.success(f"{stats['written']:,} written, {stats['unchanged']:,} unchanged, {stats['removed']:,} removed.")
+
+# ------------------ Backups ------------------
+@st.cache_resource(show_spinner=False)
+def backups():
+    """(BackupManager, BackupScheduler or None); the scheduler thread runs once per process."""
+    manager = BackupManager(BACKUP_DIR, shared_store(), CONTENT_DIR, UPLOAD_DIR, HISTORY_DIR)
+    scheduler = None
+    if BACKUP_INTERVAL_HOURS > 0:
+        scheduler = BackupScheduler(manager, BACKUP_INTERVAL_HOURS * 3600)
+        scheduler.start()
+    return manager, scheduler
+
+backups()   # starts the schedule with the first run of the script in this process
+
+def backups_page():
+    render_header()
+    st.title("🗄️ Backups")
+    manager, scheduler = backups()
+    if scheduler is None:
+        st.caption("Scheduled snapshots are off (PORTAL_BACKUP_HOURS=0).")
+    else:
+        st.caption(f"A snapshot is taken in the background every {BACKUP_INTERVAL_HOURS:g} h. Unchanged files are "
+                   "hardlinked to the previous snapshot, so each one stores only what changed.")
+        if scheduler.error:
+            st.warning(f"Last scheduled snapshot failed: {scheduler.error}")
+    if st.button("📸 Take snapshot now"):
+        with st.spinner("Taking snapshot…"), PERF.phase("backup"):
+            info = manager.snapshot(note=f"manual ({st.session_state.username})")
+            manager.prune()
+        st.success(f"Snapshot {info['id']}: {info['files']:,} files, {info['new_bytes']/1048576:.1f} MB new, "
+                   f"{info['seconds']:.1f}s.")
+    snaps = manager.snapshots()
+    if not snaps:
+        st.info("No snapshots yet.")
+        return
+    st.dataframe([{"Snapshot": s["id"], "Taken": time.strftime("%Y-%m-%d %H:%M", time.localtime(s["created"])),
+                   "Note": s.get("note", ""), "Took (s)": s["seconds"], "Files": s["files"],
+                   "New MB": round(s["new_bytes"] / 1048576, 2), "Total MB": round(s["total_bytes"] / 1048576, 2)}
+                  for s in snaps], use_container_width=True, hide_index=True)
+    sid = st.selectbox("Snapshot", [s["id"] for s in snaps], key="backup_pick")
+    sure = st.checkbox(f"Replace all current pages, users, settings, notices, files and history with {sid}",
+                       key="backup_confirm")
+    c = st.columns(2)
+    if c[0].button(f"↩️ Restore {sid}", disabled=not sure):
+        with st.spinner("Restoring…"), PERF.phase("backup_restore"):
+            safety = manager.restore(sid)
+        # the restored collections are the store's cached copies now; the rerun picks them up
+        st.session_state.path = []
+        st.session_state.backup_restored = (sid, safety["id"])
+        st.rerun()
+    if c[1].button(f"🗑️ Delete {sid}"):
+        manager.delete(sid)
+        st.rerun()
+    if st.session_state.get("backup_restored"):
+        done, safety = st.session_state.pop("backup_restored")
+        st.success(f"Restored {done}. The state before the restore was saved as {safety}.")
+
+# ------------------ Performance ------------------
+def performance_page():
+    render_header()
+    st.title("📈 Performance")
+    n, span = PERF.window()
+    st.caption(f"{n} samples from all sessions over the last {span/60:.1f} min (keeps the newest {PERF_SAMPLES}). "
+               "'rerun' is a full script run; fragment reruns show up only in their own phase.")
+    if st.button("🔄 Reset samples"):
+        PERF.reset()
+        st.rerun()
+    st.subheader("Phases")
+    rows = PERF.summary()
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    else:
+        st.info("No samples yet.")
+    st.subheader("Slowest pages")
+    pages = PERF.slowest_pages()
+    if pages:
+        st.dataframe(pages, use_container_width=True, hide_index=True)
+    st.subheader("Disk and caches")
+    store = shared_store().stats()
+    c = st.columns(4)
+    c[0].metric("Store stamp checks", store["stamp_checks"])
+    c[1].metric("Store reads (reloads)", store["loads"])
+    c[2].metric("Store writes", store["writes"])
+    c[3].metric("Uploads written", PERF.counters.get("upload_writes", 0))
+    rc = render_cache().stats()
+    c = st.columns(4)
+    c[0].metric("Render cache hits", rc["hits"])
+    c[1].metric("Render cache misses", rc["misses"])
+    c[2].metric("Render cache MB", f"{rc['bytes']/1048576:.1f}")
+    c[3].metric("Extraction queue", text_extractor().pending())
+    cc = content_store().stats()
+    c = st.columns(4)
+    c[0].metric("Page bodies in memory", cc["entries"])
+    c[1].metric("Body cache hits", cc["hits"])
+    c[2].metric("Body cache misses", cc["misses"])
+    c[3].metric("Body cache MB", f"{cc['bytes']/1048576:.1f}")
+
+# ------------------ Main Portal Rendering ------------------
+@st.cache_resource(show_spinner=False)
+def render_cache():
+    """Post-processed content HTML (new-tab links, heading anchors, lazy images), keyed by content hash."""
+    return RenderCache(max_bytes=RENDER_CACHE_BYTES)
+
+# ------------------ Fragments ------------------
+# The page is split into regions that rerun on their own (st.fragment): typing in the search box
+# reruns only the search results, saving content reruns only the content/editor panel, and a
+# subtopic add/rename/delete reruns only the tile grid. refresh() names the regions an edit changed.
+def region(name):
+    """st.fragment that also records which region is running, so refresh() can scope its rerun."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            st.session_state._active_region = name
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                st.session_state._active_region = None
+        return st.fragment(run)
+    return deco
+
+def refresh(*regions):
+    """Rerun just the running fragment when it draws every changed region, otherwise the whole app."""
+    current = st.session_state.get("_active_region")
+    if current and set(regions) <= {current}:
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            pass    # fragment reruns are not allowed during a full script run
+    st.rerun()
+
+def can_edit(level):
+    cur_path_str = " / ".join(level) if level else ""
+    return settings.get("feature_toggles", {}).get("editor_tools", True) and (st.session_state.role == "Admin" or has_privilege(st.session_state.username, cur_path_str, "edit"))
+
+def open_result(p):
+    st.session_state.path = list(p)
+    refresh("search", "tiles", "page")
+
+@region("search")
+@timed("search")
+def search_region():
+    apply_extracted()
+    typeahead = settings.get("feature_toggles", {}).get("typeahead", True)
+    if typeahead and KEYUP_AVAILABLE:
+        q = st_keyup("🔍 Search", key="search_box", debounce=TYPEAHEAD_DEBOUNCE_MS)
+    else:
+        q = st.text_input("🔍 Search", key="search_box")
+    semantic = settings.get("feature_toggles", {}).get("semantic_search", True) and st.radio(
+        "Search mode", ["Keyword", "Semantic"], horizontal=True, key="search_mode",
+        label_visibility="collapsed") == "Semantic"
+    if typeahead and q and len(q.strip()) >= TYPEAHEAD_MIN_CHARS:
+        suggestions = typeahead_index().suggest(q, k=TYPEAHEAD_TOP_K)
+        if suggestions:
+            st.caption("Suggestions")
+            cols = st.columns(2)
+            for i, p in enumerate(suggestions):
+                if cols[i % 2].button(" → ".join(p), key=f"ta_{json.dumps(p)}"):
+                    open_result(p)
+    if q and semantic:
+        with st.spinner("Updating embeddings…"):
+            hits = semantic_index().search(q, k=SEARCH_TOP_K)
+        st.session_state.search_results = [p for p, _ in hits]
+        if not hits:
+            st.caption("No matches.")
+        for p, score in hits:
+            if st.button(f"{' → '.join(p)}  ·  {score:.2f}", key=f"v_{json.dumps(p)}"):
+                open_result(p)
+    elif q:
+        st.session_state.search_results = search_index().search(q, k=SEARCH_TOP_K)
+        if not st.session_state.search_results:
+            st.caption("No matches.")
+        for p in st.session_state.search_results:
+            page, file_name = split_hit(p)
+            label = " → ".join(page + [f"📄 {file_name}"]) if file_name else " → ".join(p)
+            if st.button(label, key=f"s_{json.dumps(p)}"):
+                open_result(page)
+
+def tile_slice(level, names, order):
+    """
+    (tiles to draw, names matching the filter). Nodes with up to TILE_PAGE children show them all;
+    larger ones show one page of the list narrowed by the filter box and the A–Z bar, so only that
+    page's buttons are created. The narrowed lists come from the node index, memoized per node.
+    """
+    if len(names) <= TILE_PAGE:
+        return names, names
+    key = "tiles_" + "_".join(level)
+    text = st.text_input("Filter", key=f"{key}_filter", placeholder=f"Filter {len(names):,} subtopics…",
+                         label_visibility="collapsed")
+    if level:
+        buckets = node_index().initials(level, order)
+    else:
+        found = [initial(n) for n in names]
+        buckets = {b: found.count(b) for b in JUMP_BUCKETS if b in found}
+    letter = st.radio("Jump to", ["All"] + list(buckets), horizontal=True, key=f"{key}_letter",
+                      format_func=lambda b: b if b == "All" else f"{b} ({buckets[b]})", label_visibility="collapsed")
+    letter = None if letter == "All" else letter
+    matching = node_index().filtered_children(level, order, text, letter) if level else filter_names(names, text, letter)
+    # a new filter or letter starts again at the first page
+    view = (text.strip().casefold(), letter)
+    if st.session_state.get(f"{key}_view") != view:
+        st.session_state[f"{key}_view"] = view
+        st.session_state[f"{key}_page"] = 0
+    pages = max(1, -(-len(matching) // TILE_PAGE))
+    page = min(st.session_state.get(f"{key}_page", 0), pages - 1)
+    start = page * TILE_PAGE
+    c = st.columns([1, 4, 1])
+    c[0].button("◀ Prev", key=f"{key}_prev", disabled=page == 0,
+                on_click=lambda: st.session_state.update({f"{key}_page": page - 1}))
+    c[1].caption(f"{start + 1 if matching else 0:,}–{min(start + TILE_PAGE, len(matching)):,} of {len(matching):,}"
+                 + (f" (of {len(names):,})" if len(matching) < len(names) else "") + f" · page {page + 1} of {pages}")
+    c[2].button("Next ▶", key=f"{key}_next", disabled=page >= pages - 1,
+                on_click=lambda: st.session_state.update({f"{key}_page": page + 1}))
+    return matching[start:start + TILE_PAGE], matching
+
+@region("tiles")
+@timed("tiles")
+def tiles_region(level, node):
+    # Show subtopics but filter by visible_sections and use ordering
+    subtopics = node.get("subtopics", {}) if isinstance(node, dict) else {}
+
+    # When listing subtopics in a top-level page, use settings.subtopic_order to order
+    ordered_subs = list(subtopics.keys())
+    sorder = []
+    if level:
+        parent = level[-1]
+        sorder = settings.get("subtopic_order", {}).get(parent, [])
+        ordered_subs = node_index().ordered_children(level, sorder)
+    else:
+        visible_sections = settings.get("visible_sections", {})
+        ordered_subs = [t for t in ordered_subs if visible_sections.get(t, True) is not False]
+    shown, matching = tile_slice(level, ordered_subs, sorder)
+
+    cols = st.columns(4)
+    for i, topic in enumerate(shown):
+        data = subtopics.get(topic, {})
+        icon = data.get("icon", st.session_state.live_settings.get("default_icon","📘"))
+        col = cols[i % 4]
+        if col.button(f"{icon} {topic}", key=f"btn_{'_'.join(level+[topic])}"):
+            st.session_state.path.append(topic)
+            refresh("search", "tiles", "page")
+
+    # Subtopic management (Admins or users with edit privilege) - lives with the tiles it changes
+    if not can_edit(level):
+        return
+    with st.expander("📁 Subtopic Management", expanded=False):
+        new = st.text_input("Add new subtopic"); icon = st.text_input("Icon", value="📘")
+        if st.button("➕ Add") and new.strip():
+            tree = edit_tree(level)
+            _lookup(level, tree).setdefault("subtopics", {})[new] = {"icon": icon, "subtopics": {}}
+            # update ordering defaults
+            new_settings = copy.deepcopy(settings)
+            parent = level[-1] if level else "home"
+            new_settings.setdefault("subtopic_order", {}).setdefault(parent, []).append(new)
+            save_node(level + [new], tree)
+            save_settings(new_settings)
+            st.success("Added.")
+            refresh("tiles")
+        subs = list(node.get("subtopics", {}).keys())
+        if len(subs) > TILE_PAGE:
+            subs = list(matching)   # what the filter / A–Z bar above narrowed the tiles to
+        if subs:
+            s = st.selectbox("Rename subtopic", [""] + subs)
+            if s:
+                n = st.text_input("New name", value=s).strip()
+                # an unchanged, empty or taken name is not a rename
+                if st.button("Save rename") and n != s:
+                    if not n or n in node.get("subtopics", {}):
+                        st.error("Enter a new name that no other subtopic here uses.")
+                    else:
+                        tree = edit_tree(level)
+                        children = _lookup(level, tree)["subtopics"]
+                        children[n] = children.pop(s)
+                        # update subtopic_order
+                        new_settings = copy.deepcopy(settings)
+                        parent = level[-1] if level else "home"
+                        arr = new_settings.get("subtopic_order", {}).get(parent, [])
+                        new_settings.setdefault("subtopic_order", {})[parent] = [n if x == s else x for x in arr]
+                        rename_node(level + [s], level + [n], tree); save_settings(new_settings)
+                        st.success("Renamed.")
+                        refresh("tiles")
+            d = st.selectbox("Delete subtopic", [""] + subs, key=f"d_{len(level)}")
+            if d and st.button("🗑️ Delete subtopic"):
+                tree = edit_tree(level)
+                _lookup(level, tree)["subtopics"].pop(d, None)
+                # remove from ordering too
+                parent = level[-1] if level else "home"
+                if parent in settings.get("subtopic_order", {}):
+                    new_settings = copy.deepcopy(settings)
+                    new_settings["subtopic_order"][parent] = [x for x in new_settings["subtopic_order"][parent] if x != d]
+                    save_settings(new_settings)
+                delete_node(level + [d], tree); st.warning("Deleted."); refresh("tiles")
+
+@region("page")
+@timed("page")
+def page_region(level, node):
+    # content and files
+    if isinstance(node, dict):
+        content = content_store().content_of(node)
+        if content:
+            st.markdown("---")
+            try:
+                safe_html = render_cache().render(content)
+                st.markdown(safe_html, unsafe_allow_html=True)
+            except Exception:
+                st.markdown(content, unsafe_allow_html=True)
+
+        # Show uploaded files for everyone (only where uploaded)
+        # ====== IMPORTANT CHANGE: show files ONLY when `level` is truthy (i.e. not home)
+        if level:
+            files = page_files(level)
+            if files:
+                st.markdown("---")
+                c = st.columns(5)
+                for i, (f, fp, entry) in enumerate(files):
+                    ext = f.split(".")[-1].lower()
+                    if ext in ["png", "jpg", "jpeg"]:
+                        try:
+                            # small cached variant in the grid; the link keeps the original
+                            c[i%5].image(thumbnails().thumbnail(fp, GALLERY_THUMB_PX, digest=entry["blob"]), width=120)
+                            c[i%5].markdown(f"🖼️ [{f}]({fp})")
+                        except Exception:
+                            c[i%5].markdown(f"🖼️ [{f}]({fp})")
+                    else:
+                        c[i%5].markdown(f"📄 [{f}]({fp})")
+
+    # Editor controls governed by feature toggle and user privileges
+    if can_edit(level):
+        st.markdown("---")
+        st.subheader("⚙️ Admin/Editor Controls")
+        edited = st_quill(value=content_store().content_of(node), key=f"edit_{len(level)}")
+        if settings.get("feature_toggles", {}).get("editor_tools", True):
+            if st.button("💾 Save Content"):
+                if level and isinstance(node, dict):
+                    previous = content_store().content_of(node)
+                    tree = edit_tree(level)
+                    content_store().set_content(_lookup(level, tree), edited)
+                    render_cache().prerender(edited)
+                    history().record(level, edited, st.session_state.username, previous=previous)
+                    save_node(level, tree)
+                st.success("Saved.")
+                refresh("page")
+            if level and isinstance(node, dict):
+                render_history(level, node)
+        up = st.file_uploader("📤 Upload File", type=["png","jpg","jpeg","pdf","xlsx","xls","docx"])
+        # the uploader keeps its file across reruns: store each upload once
+        if up and st.session_state.get("_stored_upload") != up.file_id:
+            # streamed into the blob store and linked from this page's manifest (home files are stored, not displayed)
+            entry, orphans = blob_store().add_file(level, up.name, up)
+            PERF.count("upload_writes")
+            drop_blobs(orphans)
+            if ThumbnailCache.is_image(up.name):
+                thumbnails().make(blob_store().blob_path(entry["blob"], entry["ext"]), digest=entry["blob"])
+            st.session_state._stored_upload = up.file_id
+            if level:
+                # document text is extracted in the background and becomes searchable when done
+                text = text_extractor().submit(level, up.name, entry)
+                if text is not None:
+                    search_index().update_file(level, up.name, text)
+            st.success(f"Uploaded {up.name}")
+            refresh("page")
+        # Delete list for current page (drops this page's reference; the blob goes when nothing links it)
+        files = [f for f, _, _ in page_files(level)] if level else []
+        if files:
+            sel = st.selectbox("Delete file", [""] + files)
+            if sel and st.button("🗑️ Delete"):
+                drop_blobs(blob_store().remove_file(level, sel))
+                search_index().remove_file(level, sel)
+                st.warning(f"Deleted {sel}")
+                refresh("page")
+
+def render_history(level, node):
+    """View, diff and restore earlier revisions of a page's content (loaded only while the toggle is on)."""
+    if not st.toggle("🕘 Revision history", key=f"hist_{len(level)}"):
+        return
+    with PERF.phase("history"):
+        revs = history().revisions(level)[:HISTORY_LIST]
+    if not revs:
+        st.info("No earlier revisions yet; one is kept on every save.")
+        return
+    labels = {r["rev"]: f"r{r['rev']} · {time.strftime('%Y-%m-%d %H:%M', time.localtime(r['ts']))} · "
+                        f"{r['user'] or '-'} · {r['size']} chars" + (f" · {r['note']}" if r["note"] else "")
+              for r in revs}
+    rev = st.selectbox("Revision", list(labels), format_func=labels.get, key=f"hist_rev_{len(level)}")
+    text = history().text(level, rev) or ""
+    current = content_store().content_of(node)
+    mode = st.radio("Show", ["Changes vs current", "Changes vs previous revision", "Rendered", "HTML"],
+                    horizontal=True, key=f"hist_mode_{len(level)}")
+    if mode == "Changes vs current":
+        st.code(diff_lines(text, current, f"r{rev}", "current") or "Same as the current content.", language="diff")
+    elif mode == "Changes vs previous revision":
+        before = history().text(level, rev - 1) if rev > 1 else ""
+        st.code(diff_lines(before or "", text, f"r{rev - 1}", f"r{rev}") or "No changes.", language="diff")
+    elif mode == "Rendered":
+        st.markdown(render_cache().render(text), unsafe_allow_html=True)
+    else:
+        st.code(text, language="html")
+    if text != current and st.button(f"↩️ Restore r{rev}", key=f"hist_restore_{len(level)}"):
+        tree = edit_tree(level)
+        content_store().set_content(_lookup(level, tree), text)
+        render_cache().prerender(text)
+        history().record(level, text, st.session_state.username, previous=current, note=f"restored r{rev}")
+        save_node(level, tree)
+        st.success(f"Restored r{rev}.")
+        refresh("page")
+
+def render_section(level, node):
+    render_header()
+    if not level:
+        # show announcements only if feature enabled
+        if settings.get("feature_toggles", {}).get("announcements", True):
+            render_announcements_on_home()
+    st.markdown(f"## {breadcrumb_label(level)}")
+    if level and st.button("⬅️ Back"):
+        st.session_state.path = st.session_state.path[:-1]
+        st.rerun()
+
+    search_region()
+    tiles_region(level, node)
+    page_region(level, node)
+
+# ------------------ Guard ------------------
+if not st.session_state.get("logged_in", False):
+    login_page()
+    st.stop()
+
+# ------------------ Sidebar ------------------
+apply_global_styles(st.session_state.live_settings)
+with st.sidebar:
+    # show header logo or small title in sidebar top (keeps minimal preview)
+    logo = settings.get("header_logo", "")
+    # do NOT preview large uploaded images in admin sidebar; show only small logo if exists
+    if logo and os.path.exists(logo) and settings.get("show_logo", True) and not settings.get("hide_header", False):
+        try:
+            st.image(thumbnails().thumbnail(logo, LOGO_THUMB_PX), width=110)
+        except Exception:
+            st.image("https://upload.wikimedia.org/wikipedia/en/5/5a/Bharat_Sanchar_Nigam_Limited_Logo.png", width=110)
+    else:
+        st.image("https://upload.wikimedia.org/wikipedia/en/5/5a/Bharat_Sanchar_Nigam_Limited_Logo.png", width=110)
+    st.markdown(f"### 👤 {st.session_state.username}")
+    st.markdown(f"**Role:** {st.session_state.role}")
+    st.divider()
+    st.button("🏠 Home", on_click=lambda: st.session_state.update({"path": [], "view": "portal"}), use_container_width=True)
+    # feature toggle: user management visibility
+    if settings.get("feature_toggles", {}).get("user_management", True) and st.session_state.role == "Admin":
+        st.button("👥 Manage Users", on_click=lambda: st.session_state.update({"view": "users"}), use_container_width=True)
+    # settings menu visible only if toggle on and current user is admin
+    if settings.get("feature_toggles", {}).get("settings_menu", True) and st.session_state.role == "Admin":
+        st.button("⚙️ Settings", on_click=lambda: st.session_state.update({"view": "settings"}), use_container_width=True)
+    if st.session_state.role == "Admin":
+        st.button("📦 Bulk Import/Export", on_click=lambda: st.session_state.update({"view": "bulk"}), use_container_width=True)
+        st.button("🗄️ Backups", on_click=lambda: st.session_state.update({"view": "backups"}), use_container_width=True)
+        st.button("📈 Performance", on_click=lambda: st.session_state.update({"view": "performance"}), use_container_width=True)
+    st.button("🚪 Logout", on_click=logout, use_container_width=True)
+    st.divider()
+
+# ------------------ Router ------------------
+if st.session_state.view == "settings" and st.session_state.role == "Admin":
+    settings_page()
+elif st.session_state.view == "users" and st.session_state.role == "Admin":
+    manage_users_page()
+elif st.session_state.view == "bulk" and st.session_state.role == "Admin":
+    bulk_page()
+elif st.session_state.view == "backups" and st.session_state.role == "Admin":
+    backups_page()
+elif st.session_state.view == "performance" and st.session_state.role == "Admin":
+    performance_page()
+else:
+    # Render home/top-level using topic_order and visible_sections
+    # Build ordered top-level list using settings.topic_order
+    top_order = settings.get("topic_order", list(sections.keys()))
+    ordered_top = [t for t in top_order if t in sections] + [t for t in sections if t not in top_order]
+    # Filter by visible_sections
+    visible = settings.get("visible_sections", {})
+    # build pseudo root node to pass into render_section if at home
+    if not st.session_state.path:
+        # build a temporary node with only visible sections in desired order
+        node = {"subtopics": {}}
+        for t in ordered_top:
+            if visible.get(t, True):
+                node["subtopics"][t] = sections.get(t, {})
+        render_section([], node)
+    else:
+        node_to_render = node_index().get(st.session_state.path)
+        if node_to_render is None:
+            st.session_state.path = []
+            st.rerun()
+        render_section(st.session_state.path, node_to_render)
+
+# ------------------ Persist and apply saved settings if changed on disk externally ------------------
+# the shared store already holds the latest settings; only react when its generation moved
+if st.session_state.get("settings_generation") != shared_store().generation("settings"):
+    saved = safe_load_json(SETTINGS_FILE, copy.deepcopy(DEFAULT_SETTINGS))
+    st.session_state.live_settings = copy.deepcopy(saved)
+    st.session_state.live_base = saved
+    st.session_state.settings_generation = shared_store().generation("settings")
+    settings = saved
+    apply_global_styles(st.session_state.live_settings)
+
+st.markdown("<p style='text-align:center;color:lightgray;margin-top:20px;'>Developed for BSNL Customer Care Marthandam 📍 | Jijo Shaji</p>", unsafe_allow_html=True)
+PERF.record("rerun", (time.perf_counter() - _rerun_started) * 1000,
+            page=st.session_state.view if st.session_state.view != "portal" else " / ".join(st.session_state.path))
@@ -0,0 +1 @@
+# portal - non-UI building blocks for the BSNL KNOWLEDGE PORTAL MRM (imported by app.py)
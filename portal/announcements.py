@@ -0,0 +1,83 @@
+# announcements.py - announcement records with ids, timestamps, pinning and expiry
+#
+# A notice is {"id", "body" (Quill HTML), "created" (epoch s), "expires" (epoch s or None), "pinned"}.
+# Old announcements.json files hold bare HTML strings; normalize() upgrades them in place.
+import hashlib
+import time
+import uuid
+
+
+def new_notice(body, pinned=False, expires=None, now=None):
+    return {
+        "id": uuid.uuid4().hex[:12],
+        "body": body,
+        "created": int(now if now is not None else time.time()),
+        "expires": int(expires) if expires else None,
+        "pinned": bool(pinned),
+    }
+
+
+def normalize(items):
+    """(notices, changed): legacy strings become records with a stable id, oldest first."""
+    out, changed = [], False
+    for i, n in enumerate(items or []):
+        if isinstance(n, dict) and "id" in n:
+            out.append(n)
+            continue
+        body = n.get("body", "") if isinstance(n, dict) else str(n)
+        nid = hashlib.sha1(f"{i}:{body}".encode("utf-8")).hexdigest()[:12]
+        out.append({"id": nid, "body": body, "created": i, "expires": None, "pinned": False})
+        changed = True
+    return out, changed
+
+
+def is_active(notice, now):
+    return not notice.get("expires") or notice["expires"] > now
+
+
+class AnnouncementBoard:
+    """
+    Sorted views over one loaded list of notices (rebuilt only when the list is saved or reloaded).
+    active(): pinned first, then newest first; archive(): expired, newest first.
+    The split is recomputed only when the next expiry time has passed.
+    """
+
+    def __init__(self, notices):
+        self.notices = notices
+        self.by_id = {n["id"]: n for n in notices}
+        self._split = None
+        self._valid_until = 0
+
+    def _views(self, now):
+        if self._split is None or now >= self._valid_until:
+            active = [n for n in self.notices if is_active(n, now)]
+            expired = [n for n in self.notices if not is_active(n, now)]
+            active.sort(key=lambda n: (not n.get("pinned"), -n.get("created", 0)))
+            expired.sort(key=lambda n: -n.get("created", 0))
+            upcoming = [n["expires"] for n in active if n.get("expires")]
+            self._valid_until = min(upcoming) if upcoming else float("inf")
+            self._split = (active, expired)
+        return self._split
+
+    def active(self, now=None):
+        return self._views(now if now is not None else time.time())[0]
+
+    def archive(self, now=None):
+        return self._views(now if now is not None else time.time())[1]
+
+    @staticmethod
+    def page(items, page, per_page):
+        """(slice, page count) for 1-based page."""
+        pages = max(1, -(-len(items) // per_page))
+        page = min(max(1, page), pages)
+        return items[(page - 1) * per_page: page * per_page], pages
+
+    # ---- edits return a new list to be saved ----
+    def with_added(self, notice):
+        return self.notices + [notice]
+
+    def without(self, notice_id):
+        return [n for n in self.notices if n["id"] != notice_id]
+
+    def with_pinned(self, notice_id, pinned):
+        return [dict(n, pinned=bool(pinned)) if n["id"] == notice_id else n for n in self.notices]
@@ -0,0 +1,330 @@
+# api.py - read-only JSON HTTP API over the portal's data files, for CRM / IVR integrations
+#
+#   python -m portal.api [--host 127.0.0.1] [--port 8600]        (PORTAL_STORAGE, PORTAL_API_TOKEN)
+#
+#   GET /api/tree?depth=&fields=                 skeleton: name, icon, path, children
+#   GET /api/children?path=&offset=&limit=&fields=   one level, paged
+#   GET /api/node?path=Top / Sub&fields=         one node (content, icon, children, files)
+#   GET /api/search?q=&offset=&limit=            ranked pages and attached files
+#   GET /api/files?path=                         uploads linked to a page
+#
+# Runs next to app.py on the same files: StoreCache revalidates against the store's stamps, so
+# edits made in the app show up within a second. Every response carries a strong ETag; /api/node
+# derives it from the content ref, icon, child names and file digests before reading the body, so
+# an unchanged node is answered 304 without touching disk. Hidden top-level topics
+# (visible_sections) are left out, as on the portal's home page.
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import sys
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from portal.blob_store import BlobStore
+from portal.bulk import open_data, ordered_names
+from portal.content_store import inline_content
+from portal.coordination import LockTimeout
+from portal.search_index import SearchIndex, split_hit
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+NODE_FIELDS = ("name", "path", "icon", "content", "children", "files", "content_hash")
+TREE_FIELDS = ("name", "path", "icon", "children")
+DEFAULT_NODE_FIELDS = ("name", "path", "icon", "content", "children")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_path(value):
+    parts = [p.strip() for p in (value or "").split(" / ")]
+    return [p for p in parts if p]
+
+
+def _fields(query, allowed, default):
+    raw = query.get("fields", [""])[0]
+    if not raw:
+        return default
+    fields = tuple(f.strip() for f in raw.split(",") if f.strip())
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ApiError(400, f"unknown fields: {', '.join(unknown)} (allowed: {', '.join(allowed)})")
+    return fields
+
+
+def _int(query, name, default, lo, hi):
+    try:
+        value = int(query.get(name, [default])[0])
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be an integer")
+    return max(lo, min(hi, value))
+
+
+def _page(items, query):
+    offset = _int(query, "offset", 0, 0, 10 ** 9)
+    limit = _int(query, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+    chunk = items[offset:offset + limit]
+    nxt = offset + limit if offset + limit < len(items) else None
+    return {"items": chunk, "offset": offset, "limit": limit, "total": len(items), "next": nxt}
+
+
+def etag_of(*parts):
+    return '"' + hashlib.sha1(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+
+
+class PortalApi:
+    """
+    Request handling without the HTTP plumbing:
+    handle(route, query, if_none_match) -> (status, etag, body or None for 304).
+    """
+
+    def __init__(self, store, bodies, blobs):
+        self.store = store
+        self.bodies = bodies
+        self.blobs = blobs
+        self._lock = threading.Lock()
+        self._index = (None, None)      # (sections version, SearchIndex)
+        self._tree_cache = {}           # (generation, settings generation, depth, fields) -> (etag, body)
+
+    # ------------------ Data ------------------
+    def _data(self):
+        return self.store.get("sections", {}), self.store.get("settings", {})
+
+    def _visible(self, tree, settings):
+        visible = settings.get("visible_sections", {})
+        return [t for t in ordered_names(tree, settings.get("topic_order", [])) if visible.get(t, True) is not False]
+
+    def _children(self, node, path, settings, tree):
+        if not path:
+            return self._visible(tree, settings)
+        subs = node.get("subtopics") if isinstance(node, dict) else None
+        if not isinstance(subs, dict):
+            return []
+        return ordered_names(subs, settings.get("subtopic_order", {}).get(path[-1], []))
+
+    def _lookup(self, tree, settings, path):
+        if not path:
+            return {"subtopics": tree}
+        if path[0] not in self._visible(tree, settings):
+            return None
+        cur = {"subtopics": tree}
+        for step in path:
+            subs = cur.get("subtopics") if isinstance(cur, dict) else None
+            if not isinstance(subs, dict) or step not in subs:
+                return None
+            cur = subs[step]
+        return cur if isinstance(cur, dict) else {}
+
+    def _search_index(self, tree):
+        version = self.store.version("sections")
+        with self._lock:
+            if self._index[0] != version:
+                idx = SearchIndex.build(tree, content=lambda n: self.bodies.content_of(n, cache=False))
+                for path, files in self.blobs.pages():
+                    for name, entry in files.items():
+                        tp = self.blobs.text_path(entry["blob"])
+                        if path and os.path.exists(tp):
+                            with open(tp, "r", encoding="utf-8") as f:
+                                idx.update_file(path, name, f.read())
+                self._index = (version, idx)
+            return self._index[1]
+
+    def _files(self, path):
+        return [{"name": name, "size": e.get("size"), "uploaded": e.get("uploaded"), "sha1": e["blob"], "ext": e.get("ext")}
+                for name, _, e in self.blobs.list_files(path)] if path else []
+
+    # ------------------ Routes ------------------
+    def handle(self, route, query, if_none_match=()):
+        tree, settings = self._data()
+        if route == "/api/tree":
+            return self.tree(tree, settings, query)
+        if route == "/api/children":
+            return self.children(tree, settings, query)
+        if route == "/api/node":
+            return self.node(tree, settings, query, if_none_match)
+        if route == "/api/search":
+            return self.search(tree, settings, query)
+        if route == "/api/files":
+            return self.files(tree, settings, query)
+        raise ApiError(404, "no such endpoint")
+
+    def tree(self, tree, settings, query):
+        depth = _int(query, "depth", 64, 1, 64)
+        fields = _fields(query, TREE_FIELDS, TREE_FIELDS)
+        key = (self.store.generation("sections"), self.store.generation("settings"), depth, fields)
+        cached = self._tree_cache.get(key)
+        if cached is None:
+            def walk(path, node, level):
+                out = []
+                for name in self._children(node, path, settings, tree):
+                    child = node["subtopics"][name]
+                    item = {}
+                    if "name" in fields:
+                        item["name"] = name
+                    if "path" in fields:
+                        item["path"] = " / ".join(path + [name])
+                    if "icon" in fields:
+                        item["icon"] = child.get("icon", "") if isinstance(child, dict) else ""
+                    if "children" in fields and level < depth:
+                        item["children"] = walk(path + [name], child, level + 1)
+                    out.append(item)
+                return out
+
+            body = {"items": walk([], {"subtopics": tree}, 1)}
+            cached = (etag_of(body), body)
+            self._tree_cache = {key: cached}
+        return 200, cached[0], cached[1]
+
+    def children(self, tree, settings, query):
+        path = parse_path(query.get("path", [""])[0])
+        node = self._lookup(tree, settings, path)
+        if node is None:
+            raise ApiError(404, "no such page")
+        fields = _fields(query, TREE_FIELDS, ("name", "path", "icon"))
+        subs = node.get("subtopics") if isinstance(node.get("subtopics"), dict) else {}
+        items = []
+        for name in self._children(node, path, settings, tree):
+            child = subs.get(name)
+            item = {}
+            if "name" in fields:
+                item["name"] = name
+            if "path" in fields:
+                item["path"] = " / ".join(path + [name])
+            if "icon" in fields:
+                item["icon"] = child.get("icon", "") if isinstance(child, dict) else ""
+            if "children" in fields:
+                item["children"] = len(child.get("subtopics") or {}) if isinstance(child, dict) else 0
+            items.append(item)
+        body = _page(items, query)
+        return 200, etag_of(body), body
+
+    def node(self, tree, settings, query, if_none_match=()):
+        path = parse_path(query.get("path", [""])[0])
+        if not path:
+            raise ApiError(400, "path is required")
+        node = self._lookup(tree, settings, path)
+        if node is None:
+            raise ApiError(404, "no such page")
+        fields = _fields(query, NODE_FIELDS, DEFAULT_NODE_FIELDS)
+        children = self._children(node, path, settings, tree)
+        files = self._files(path) if "files" in fields else []
+        content_hash = node.get("content_ref") or hashlib.sha1(inline_content(node).encode("utf-8")).hexdigest()
+        etag = etag_of(path, fields, content_hash, node.get("icon"), children, [f["sha1"] + f["name"] for f in files])
+        if etag in if_none_match:
+            return 304, etag, None    # the body is never read
+        body = {}
+        if "name" in fields:
+            body["name"] = path[-1]
+        if "path" in fields:
+            body["path"] = " / ".join(path)
+        if "icon" in fields:
+            body["icon"] = node.get("icon", "")
+        if "content_hash" in fields:
+            body["content_hash"] = content_hash
+        if "content" in fields:
+            body["content"] = self.bodies.content_of(node)
+        if "children" in fields:
+            body["children"] = children
+        if "files" in fields:
+            body["files"] = files
+        return 200, etag, body
+
+    def search(self, tree, settings, query):
+        q = query.get("q", [""])[0].strip()
+        if not q:
+            raise ApiError(400, "q is required")
+        visible = set(self._visible(tree, settings))
+        hits = []
+        for p in self._search_index(tree).search(q, k=MAX_LIMIT):
+            page, file_name = split_hit(p)
+            if page and page[0] in visible:
+                hits.append({"path": " / ".join(page), "file": file_name})
+        body = _page(hits, query)
+        return 200, etag_of(body), body
+
+    def files(self, tree, settings, query):
+        path = parse_path(query.get("path", [""])[0])
+        if not path or self._lookup(tree, settings, path) is None:
+            raise ApiError(404, "no such page")
+        body = _page(self._files(path), query)
+        return 200, etag_of(body), body
+
+
+class Handler(BaseHTTPRequestHandler):
+    api = None
+    token = None
+    server_version = "PortalAPI/1"
+    protocol_version = "HTTP/1.1"   # keep-alive for pollers; every response sets Content-Length
+
+    def log_message(self, fmt, *args):
+        pass    # integrations poll at high rates; keep stderr for errors only
+
+    def _send(self, status, etag=None, body=None):
+        data = b"" if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if data and self.command != "HEAD":
+            self.wfile.write(data)
+
+    def _authorized(self):
+        # constant-time comparison: the time taken must not reveal how much of the token matched
+        given = self.headers.get("Authorization", "").encode("utf-8")
+        return hmac.compare_digest(given, f"Bearer {self.token}".encode("utf-8"))
+
+    def do_GET(self):
+        if self.token and not self._authorized():
+            return self._send(401, body={"error": "missing or wrong bearer token"})
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        inm = [t.strip() for t in self.headers.get("If-None-Match", "").split(",") if t.strip()]
+        try:
+            status, etag, body = self.api.handle(url.path.rstrip("/"), query, inm)
+        except ApiError as e:
+            return self._send(e.status, body={"error": str(e)})
+        except (LockTimeout, sqlite3.OperationalError):
+            # a writer held the store longer than our lock timeout: worth retrying shortly
+            return self._send(503, body={"error": "data store busy, retry"})
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            return self._send(500, body={"error": "internal error"})
+        if status == 200 and (etag in inm or "*" in inm):
+            status, body = 304, None
+        self._send(status, etag, body)
+
+    do_HEAD = do_GET
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m portal.api", description="read-only JSON API over the portal data")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8600)
+    args = ap.parse_args(argv)
+    store, bodies = open_data()
+    Handler.api = PortalApi(store, bodies, BlobStore("uploads"))
+    Handler.token = os.environ.get("PORTAL_API_TOKEN") or None
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"portal API on http://{args.host}:{args.port}/api/tree")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+# backups.py - point-in-time snapshots of all portal state, hardlinking what did not change
+#
+#   backups/<id>/store/<collection>.json    sections, users, settings, announcements as saved
+#   backups/<id>/content/...                page bodies the snapshot's tree points at
+#   backups/<id>/uploads/.blobs|.pages/...  linked files, page manifests, legacy upload folders
+#   backups/<id>/history/...                revision logs
+#   backups/<id>/snapshot.json              when, how long, how many files and how many new bytes
+#
+# Content-addressed files (bodies, blobs) are never rewritten, so they are hardlinked from the live
+# folders. Every other file is hardlinked from the previous snapshot when its size and mtime are
+# unchanged and copied otherwise, so a snapshot stores only what changed since the last one.
+# Only the collections are read under their store locks (they are small, and that is what keeps
+# them consistent with each other). Manifests are replaced whole by their writers and revision
+# logs only appended to, so both are mirrored afterwards without blocking anyone: a log line
+# caught mid-append is left out of the copy.
+#
+#   python -m portal.backups snapshot | list | prune | restore <id>
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from portal.content_store import ContentStore
+from portal.coordination import FileLock, LockTimeout
+from portal.storage import COLLECTIONS, atomic_write_json, read_json
+
+KEEP_LAST = 7       # newest snapshots always kept
+KEEP_DAILY = 7      # plus the newest of each of the last N days that have one
+KEEP_WEEKLY = 4     # plus the newest of each of the last N weeks that have one
+INFO = "snapshot.json"
+DEFAULTS = {"sections": {}, "users": {}, "settings": {}, "announcements": []}
+
+
+def _size_mtime(fp):
+    st_ = os.stat(fp)
+    return st_.st_size, st_.st_mtime_ns
+
+
+def _trim_partial_line(fp):
+    """Cut a copy of an append-only log back to its last complete line."""
+    with open(fp, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+
+
+def _link_or_copy(src, dest):
+    """Hardlink src to dest (copy where links are not possible); True if it was copied."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        os.link(src, dest)
+        return False
+    except OSError:
+        shutil.copy2(src, dest)
+        return True
+
+
+class _Tally:
+    def __init__(self):
+        self.files = 0
+        self.linked = 0
+        self.copied = 0
+        self.new_bytes = 0
+        self.total_bytes = 0
+        self.missing = 0
+
+    def add(self, size, copied):
+        self.files += 1
+        self.total_bytes += size
+        if copied:
+            self.copied += 1
+            self.new_bytes += size
+        else:
+            self.linked += 1
+
+
+class BackupManager:
+    """
+    snapshot(note) -> info dict; snapshots() newest first; restore(id); prune(); due(interval).
+    `cache` is the app's StoreCache: collections are read from its store under the store's locks,
+    and a restore writes them back through it so every process re-loads them.
+    """
+
+    def __init__(self, root, cache, content_dir="content", upload_dir="uploads", history_dir="history"):
+        self.root = root
+        self.cache = cache
+        self.content_dir = content_dir
+        self.upload_dir = upload_dir
+        self.history_dir = history_dir
+        for folder in (root, upload_dir, history_dir):
+            os.makedirs(folder, exist_ok=True)
+        self._lock = FileLock(os.path.join(root, ".lock"), timeout=600)
+        self._try_lock = FileLock(os.path.join(root, ".lock"), timeout=0)   # the scheduler never queues
+
+    # ------------------ Listing ------------------
+    def snapshots(self):
+        out = []
+        for name in os.listdir(self.root):
+            info = read_json(os.path.join(self.root, name, INFO), None)
+            if isinstance(info, dict):
+                out.append(info)
+        return sorted(out, key=lambda i: i["created"], reverse=True)
+
+    def due(self, interval):
+        """True if the newest snapshot is older than `interval` seconds (or there is none)."""
+        snaps = self.snapshots()
+        return not snaps or time.time() - snaps[0]["created"] >= interval
+
+    def _new_id(self, now):
+        base = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        sid, n = base, 1
+        while os.path.exists(os.path.join(self.root, sid)):
+            n += 1
+            sid = f"{base}-{n}"
+        return sid
+
+    # ------------------ Snapshot ------------------
+    def _state_locks(self):
+        locks = [self.cache.store.lock(name) for name in COLLECTIONS]
+        unique = []
+        for lock in locks:      # SQLite hands out one lock for every collection; FileLock is not re-entrant
+            if all(lock is not u for u in unique):
+                unique.append(lock)
+        return unique
+
+    def _mirror(self, src_dir, dest_dir, prev_dir, tally, skip=(), logs=False):
+        """
+        Files of src_dir into dest_dir: linked from prev_dir when unchanged there, else copied.
+        logs: the files are append-only line logs; a copy ending in a partial line is trimmed.
+        """
+        if not os.path.isdir(src_dir):
+            return
+        for dirpath, dirnames, names in os.walk(src_dir):
+            rel_dir = os.path.relpath(dirpath, src_dir)
+            if rel_dir == ".":
+                dirnames[:] = [d for d in dirnames if d not in skip]
+            for fn in names:
+                if fn.startswith(".tmp_") or fn.endswith((".lock", ".part")) or (rel_dir == "." and fn in skip):
+                    continue
+                src = os.path.join(dirpath, fn)
+                rel = os.path.normpath(os.path.join(rel_dir, fn))
+                dest = os.path.join(dest_dir, rel)
+                try:
+                    size, mtime = _size_mtime(src)
+                except OSError:
+                    continue    # removed while we walked
+                old = os.path.join(prev_dir, rel) if prev_dir else None
+                if old and os.path.exists(old) and _size_mtime(old) == (size, mtime):
+                    tally.add(size, _link_or_copy(old, dest))
+                else:
+                    os.makedirs(os.path.dirname(dest), exist_ok=True)
+                    try:
+                        shutil.copy2(src, dest)
+                    except FileNotFoundError:
+                        continue    # replaced or removed while we walked
+                    if logs:
+                        _trim_partial_line(dest)
+                    tally.add(size, True)
+
+    def _write_collection(self, name, value, work, prev, tally):
+        """store/<name>.json; linked to the previous snapshot's copy when the collection did not change."""
+        raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        dest = os.path.join(work, "store", f"{name}.json")
+        old = os.path.join(prev, "store", f"{name}.json") if prev else None
+        if old and os.path.exists(old) and os.path.getsize(old) == len(raw):
+            with open(old, "rb") as f:
+                if f.read() == raw:
+                    tally.add(len(raw), _link_or_copy(old, dest))
+                    return
+        with open(dest, "wb") as f:
+            f.write(raw)
+        tally.add(len(raw), True)
+
+    def _link_immutable(self, src, dest, tally):
+        if not os.path.exists(src):
+            tally.missing += 1
+            return
+        tally.add(os.path.getsize(src), _link_or_copy(src, dest))
+
+    def snapshot(self, note="", wait=True, older_than=None):
+        """
+        Take a snapshot; returns its info. None when wait is False and another process is taking
+        one, or when older_than (seconds) is given and the newest snapshot is younger than that.
+        """
+        lock = self._lock if wait else self._try_lock
+        try:
+            lock.acquire()
+        except LockTimeout:
+            return None
+        try:
+            if older_than is not None and not self.due(older_than):
+                return None     # another process took it while we were deciding
+            return self._snapshot(note)
+        finally:
+            lock.release()
+
+    def _snapshot(self, note):
+        started = time.perf_counter()
+        now = time.time()
+        sid = self._new_id(now)
+        work = os.path.join(self.root, f".tmp_{sid}")
+        shutil.rmtree(work, ignore_errors=True)
+        previous = self.snapshots()
+        prev = os.path.join(self.root, previous[0]["id"]) if previous else None
+        tally = _Tally()
+        store = self.cache.store
+        up_dest = os.path.join(work, "uploads")
+        with contextlib.ExitStack() as held:
+            for lock in self._state_locks():
+                held.enter_context(lock)
+            data = {name: store.load(name, DEFAULTS[name]) for name in COLLECTIONS}
+        # no longer blocking writers
+        os.makedirs(os.path.join(work, "store"), exist_ok=True)
+        for name, value in data.items():
+            self._write_collection(name, value, work, prev, tally)
+        self._mirror(os.path.join(self.upload_dir, ".pages"), os.path.join(up_dest, ".pages"),
+                     prev and os.path.join(prev, "uploads", ".pages"), tally)
+        self._mirror(self.history_dir, os.path.join(work, "history"), prev and os.path.join(prev, "history"),
+                     tally, logs=True)
+        bodies = ContentStore(self.content_dir)
+        for ref in bodies.refs(data["sections"]):
+            self._link_immutable(bodies.path(ref), os.path.join(work, "content", ref[:2], f"{ref}.html"), tally)
+        pages_dir = os.path.join(up_dest, ".pages")
+        for fn in (os.listdir(pages_dir) if os.path.isdir(pages_dir) else ()):
+            for name, entry in read_json(os.path.join(pages_dir, fn), {}).get("files", {}).items():
+                ext = entry.get("ext") or (name.rsplit(".", 1)[-1].lower() if "." in name else "bin")
+                for e in dict.fromkeys((ext, "txt")):
+                    rel = os.path.join(".blobs", entry["blob"][:2], f"{entry['blob']}.{e}")
+                    src = os.path.join(self.upload_dir, rel)
+                    if e == "txt" and not os.path.exists(src):
+                        continue    # text not extracted (yet)
+                    if not os.path.exists(os.path.join(up_dest, rel)):
+                        self._link_immutable(src, os.path.join(up_dest, rel), tally)
+        # legacy uploads/<Top_Sub>/ folders not yet moved into the blob store
+        self._mirror(self.upload_dir, up_dest, prev and os.path.join(prev, "uploads"), tally,
+                     skip={".blobs", ".pages", ".thumbs", ".extract_queue.json"})
+        info = {
+            "id": sid, "created": now, "note": note, "backend": getattr(store, "backend", ""),
+            "seconds": round(time.perf_counter() - started, 3), "files": tally.files, "linked": tally.linked,
+            "copied": tally.copied, "new_bytes": tally.new_bytes, "total_bytes": tally.total_bytes,
+            "missing": tally.missing,
+        }
+        atomic_write_json(os.path.join(work, INFO), info)
+        os.replace(work, os.path.join(self.root, sid))     # complete snapshots only
+        return info
+
+    # ------------------ Retention ------------------
+    def retained(self, snaps, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+        """Ids to keep out of `snaps` (newest first)."""
+        keep = {s["id"] for s in snaps[:keep_last]}
+        for fmt, count in (("%Y-%m-%d", keep_daily), ("%G-W%V", keep_weekly)):
+            seen = []
+            for s in snaps:
+                bucket = time.strftime(fmt, time.localtime(s["created"]))
+                if bucket not in seen:
+                    if len(seen) == count:
+                        break
+                    seen.append(bucket)
+                    keep.add(s["id"])
+        return keep
+
+    def prune(self, **keep):
+        """Delete snapshots outside the retention policy (and leftovers of interrupted ones)."""
+        with self._lock:
+            snaps = self.snapshots()
+            kept = self.retained(snaps, **keep)
+            removed = [s["id"] for s in snaps if s["id"] not in kept]
+            for sid in removed:
+                shutil.rmtree(os.path.join(self.root, sid), ignore_errors=True)
+            for name in os.listdir(self.root):
+                if name.startswith(".tmp_"):
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            return removed
+
+    def delete(self, sid):
+        with self._lock:
+            shutil.rmtree(os.path.join(self.root, sid), ignore_errors=True)
+
+    # ------------------ Restore ------------------
+    def _replace_dir(self, src_dir, live_dir):
+        """Make live_dir hold exactly the files of src_dir (copies: live files may be appended to)."""
+        wanted = set()
+        if os.path.isdir(src_dir):
+            for dirpath, _, names in os.walk(src_dir):
+                for fn in names:
+                    rel = os.path.relpath(os.path.join(dirpath, fn), src_dir)
+                    wanted.add(rel)
+                    dest = os.path.join(live_dir, rel)
+                    os.makedirs(os.path.dirname(dest), exist_ok=True)
+                    shutil.copy2(os.path.join(dirpath, fn), dest + ".part")
+                    os.replace(dest + ".part", dest)
+        if os.path.isdir(live_dir):
+            for dirpath, _, names in os.walk(live_dir):
+                for fn in names:
+                    rel = os.path.relpath(os.path.join(dirpath, fn), live_dir)
+                    if rel not in wanted and not fn.endswith(".lock"):
+                        os.remove(os.path.join(dirpath, fn))
+
+    def _link_missing(self, src_dir, live_dir, skip=()):
+        if not os.path.isdir(src_dir):
+            return
+        for dirpath, dirnames, names in os.walk(src_dir):
+            if dirpath == src_dir:
+                dirnames[:] = [d for d in dirnames if d not in skip]
+            for fn in names:
+                dest = os.path.join(live_dir, os.path.relpath(os.path.join(dirpath, fn), src_dir))
+                if not os.path.exists(dest):
+                    _link_or_copy(os.path.join(dirpath, fn), dest)
+
+    def restore(self, sid):
+        """
+        Bring the portal back to snapshot `sid`. The current state is snapshotted first (note
+        "before restore of <sid>"), so a restore can itself be undone. Returns that snapshot's info.
+        """
+        folder = os.path.join(self.root, sid)
+        if not os.path.exists(os.path.join(folder, INFO)):
+            raise ValueError(f"no such snapshot: {sid}")
+        safety = self.snapshot(note=f"before restore of {sid}")
+        with self._lock:
+            # bodies and blobs first, so the restored tree and manifests never point at missing files
+            self._link_missing(os.path.join(folder, "content"), self.content_dir)
+            self._link_missing(os.path.join(folder, "uploads", ".blobs"), os.path.join(self.upload_dir, ".blobs"))
+            self._link_missing(os.path.join(folder, "uploads"), self.upload_dir, skip={".blobs", ".pages"})
+            with contextlib.ExitStack() as held:
+                held.enter_context(FileLock(os.path.join(self.upload_dir, ".lock")))
+                held.enter_context(FileLock(os.path.join(self.history_dir, ".lock")))
+                self._replace_dir(os.path.join(folder, "uploads", ".pages"), os.path.join(self.upload_dir, ".pages"))
+                self._replace_dir(os.path.join(folder, "history"), self.history_dir)
+            for name in COLLECTIONS:
+                self.cache.replace(name, read_json(os.path.join(folder, "store", f"{name}.json"), DEFAULTS[name]))
+        return safety
+
+
+class BackupScheduler(threading.Thread):
+    """Daemon thread: a snapshot (then prune) whenever the newest one is older than `interval` seconds."""
+
+    def __init__(self, manager, interval, check_every=60.0):
+        super().__init__(name="portal-backups", daemon=True)
+        self.manager = manager
+        self.interval = interval
+        self.check_every = check_every
+        self.last = None        # info of the last snapshot this thread took
+        self.error = None       # last failure, shown in the Backups view
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.check_every):
+            try:
+                if self.manager.due(self.interval):
+                    info = self.manager.snapshot(note="scheduled", wait=False, older_than=self.interval)
+                    if info is not None:
+                        self.last = info
+                        self.error = None
+                        self.manager.prune()
+            except Exception as e:  # keep the schedule alive; the next check retries
+                self.error = f"{time.strftime('%Y-%m-%d %H:%M')}: {e!r}"
+
+    def stop(self):
+        self._stopped.set()
+
+
+# ------------------ Command line ------------------
+def main(argv=None):
+    from portal.bulk import open_data
+    ap = argparse.ArgumentParser(prog="python -m portal.backups", description="portal snapshots")
+    ap.add_argument("--dir", default="backups")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("snapshot").add_argument("--note", default="")
+    sub.add_parser("list")
+    sub.add_parser("prune")
+    sub.add_parser("restore").add_argument("id")
+    args = ap.parse_args(argv)
+    manager = BackupManager(args.dir, open_data()[0])
+    if args.cmd == "snapshot":
+        print(json.dumps(manager.snapshot(note=args.note)))
+    elif args.cmd == "list":
+        for s in manager.snapshots():
+            print(f"{s['id']}  {s['files']:>7} files  {s['new_bytes'] / 1048576:8.1f} MB new  "
+                  f"{s['seconds']:6.1f}s  {s.get('note', '')}")
+    elif args.cmd == "prune":
+        print(json.dumps(manager.prune()))
+    else:
+        print(json.dumps(manager.restore(args.id)))
+
+
+if __name__ == "__main__":
+    main()
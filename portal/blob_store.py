@@ -0,0 +1,267 @@
+# blob_store.py - content-addressed upload storage with per-page manifests
+#
+#   uploads/.blobs/<ab>/<sha1>.<ext>   each distinct file stored once
+#   uploads/.blobs/<ab>/<sha1>.txt     extracted text of a document blob (see extraction.py)
+#   uploads/.pages/<page key>.json     {"path": [...], "files": {name: {"blob", "size", "uploaded"}}}
+#   uploads/.lock                      held around every manifest edit and collection, by all processes
+#
+# A page key is the sha1 of the JSON-encoded path, so ["A_B", "C"] and ["A", "B_C"] no longer
+# share a folder the way "_".join(path) did.
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from portal.coordination import FileLock
+from portal.storage import atomic_write_json, read_json
+
+CHUNK = 1024 * 1024
+
+
+def page_key(path):
+    return hashlib.sha1(json.dumps(list(path), ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _ext(name):
+    return name.rsplit(".", 1)[-1].lower() if "." in name else "bin"
+
+
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+        self.blob_dir = os.path.join(root, ".blobs")
+        self.page_dir = os.path.join(root, ".pages")
+        os.makedirs(root, exist_ok=True)
+        self._lock = FileLock(os.path.join(root, ".lock"))
+        self._manifests = {}    # key -> (stamp, manifest)
+
+    # ------------------ Blobs ------------------
+    def blob_path(self, digest, ext):
+        return os.path.join(self.blob_dir, digest[:2], f"{digest}.{ext}")
+
+    def text_path(self, digest):
+        return self.blob_path(digest, "txt")
+
+    def spool(self, fileobj):
+        """
+        Copy fileobj into a .part file in CHUNK-sized pieces while hashing it; returns (tmp, digest, size).
+        Needs no lock: gc leaves .part files younger than an hour alone.
+        """
+        os.makedirs(self.blob_dir, exist_ok=True)
+        h = hashlib.sha1()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.blob_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    block = fileobj.read(CHUNK)
+                    if not block:
+                        break
+                    h.update(block)
+                    out.write(block)
+                    size += len(block)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return tmp, h.hexdigest(), size
+
+    def _commit(self, tmp, digest, ext):
+        """Move a spooled file to its blob path (dropped if that blob exists); caller holds the lock."""
+        dest = self.blob_path(digest, ext)
+        if os.path.exists(dest):
+            os.remove(tmp)          # already stored: keep the existing copy
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(tmp, dest)
+        return dest
+
+    def put_stream(self, fileobj, ext):
+        """Copy fileobj to the store. Returns (digest, size, path)."""
+        tmp, digest, size = self.spool(fileobj)
+        with self._lock:
+            return digest, size, self._commit(tmp, digest, ext)
+
+    # ------------------ Manifests ------------------
+    def _manifest_file(self, path):
+        return os.path.join(self.page_dir, page_key(path) + ".json")
+
+    def manifest(self, path):
+        mf = self._manifest_file(path)
+        try:
+            st_ = os.stat(mf)
+            stamp = (st_.st_mtime_ns, st_.st_size)
+        except OSError:
+            return {"path": list(path), "files": {}}
+        cached = self._manifests.get(mf)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        data = read_json(mf, {"path": list(path), "files": {}})
+        self._manifests[mf] = (stamp, data)
+        return data
+
+    def _read_manifest(self, path):
+        # a private, current copy for read-modify-write: another process may have written since
+        # our cached read within the same mtime tick
+        return read_json(self._manifest_file(path), {"path": list(path), "files": {}})
+
+    def _write_manifest(self, path, manifest):
+        os.makedirs(self.page_dir, exist_ok=True)
+        mf = self._manifest_file(path)
+        # an emptied manifest is kept: it also records that legacy files were already imported
+        atomic_write_json(mf, manifest)
+        self._manifests.pop(mf, None)
+
+    def has_manifest(self, path):
+        return os.path.exists(self._manifest_file(path))
+
+    def pages(self):
+        """Yield (path, files) for every page manifest."""
+        if not os.path.isdir(self.page_dir):
+            return
+        for fn in os.listdir(self.page_dir):
+            if fn.endswith(".json"):
+                m = read_json(os.path.join(self.page_dir, fn), {})
+                if m.get("files"):
+                    yield m.get("path", []), m["files"]
+
+    def list_files(self, path):
+        """[(name, blob path, entry)] for a page, sorted by name."""
+        files = self.manifest(path)["files"]
+        return [(name, self.blob_path(e["blob"], e.get("ext", _ext(name))), e) for name, e in sorted(files.items())]
+
+    def add_file(self, path, name, fileobj, replace_all=False):
+        """Store an upload and link it to the page under `name`. Returns (entry, orphaned blob paths)."""
+        ext = _ext(name)
+        # the upload is streamed without the lock; only the rename and the manifest edit hold it
+        tmp, digest, size = self.spool(fileobj)
+        with self._lock:
+            # linked under the same lock as the rename so a concurrent collect cannot drop the new blob
+            self._commit(tmp, digest, ext)
+            manifest = self._read_manifest(path)
+            dropped = list(manifest["files"].values()) if replace_all else [manifest["files"].get(name)]
+            if replace_all:
+                manifest["files"] = {}
+            entry = {"blob": digest, "ext": ext, "size": size, "uploaded": int(time.time())}
+            manifest["files"][name] = entry
+            self._write_manifest(path, manifest)
+            orphans = self._collect([e for e in dropped if e and e["blob"] != digest])
+        return entry, orphans
+
+    def remove_file(self, path, name):
+        """Drop a page's reference to a file; returns blob paths that became unreferenced (and were deleted)."""
+        with self._lock:
+            manifest = self._read_manifest(path)
+            entry = manifest["files"].pop(name, None)
+            if entry is None:
+                return []
+            self._write_manifest(path, manifest)
+            return self._collect([entry])
+
+    def move_pages(self, old_path, new_path, subpaths=((),)):
+        """
+        A page was renamed: re-key the manifests of its pages, given relative to it by subpaths
+        (() for the page itself), to the new paths. Returns blob paths that became unreferenced
+        (files of a stale manifest already at a new key).
+        """
+        old_path, new_path = list(old_path), list(new_path)
+        with self._lock:
+            dropped = []
+            for rel in subpaths:
+                mf = self._manifest_file(old_path + list(rel))
+                if not os.path.exists(mf):
+                    continue
+                m = read_json(mf, {"files": {}})
+                m["path"] = new_path + list(rel)
+                dropped.extend(self._read_manifest(m["path"])["files"].values())
+                self._write_manifest(m["path"], m)
+                os.remove(mf)
+                self._manifests.pop(mf, None)
+            return self._collect(dropped)
+
+    def drop_pages(self, path, subpaths=((),)):
+        """A page was deleted: remove the manifests of its pages (as for move_pages); returns the orphaned blob paths."""
+        with self._lock:
+            dropped = []
+            for rel in subpaths:
+                mf = self._manifest_file(list(path) + list(rel))
+                if os.path.exists(mf):
+                    dropped.extend(read_json(mf, {}).get("files", {}).values())
+                    os.remove(mf)
+                    self._manifests.pop(mf, None)
+            return self._collect(dropped)
+
+    # ------------------ Garbage collection ------------------
+    def referenced(self):
+        """{(digest, ext)} linked from any manifest."""
+        refs = set()
+        if not os.path.isdir(self.page_dir):
+            return refs
+        for fn in os.listdir(self.page_dir):
+            if fn.endswith(".json"):
+                for name, e in read_json(os.path.join(self.page_dir, fn), {}).get("files", {}).items():
+                    refs.add((e["blob"], e.get("ext", _ext(name))))
+        return refs
+
+    def _collect(self, entries):
+        if not entries:
+            return []
+        refs = self.referenced()
+        removed = []
+        for e in entries:
+            key = (e["blob"], e.get("ext", "bin"))
+            if key not in refs:
+                bp = self.blob_path(*key)
+                if os.path.exists(bp):
+                    os.remove(bp)
+                    removed.append(bp)
+                tp = self.text_path(e["blob"])
+                if os.path.exists(tp):
+                    os.remove(tp)
+        return removed
+
+    def gc(self):
+        """Delete every blob no manifest links to (and stale .part files). Returns removed paths."""
+        removed = []
+        if not os.path.isdir(self.blob_dir):
+            return removed
+        with self._lock:
+            linked = self.referenced()
+            refs = {f"{d}.{x}" for d, x in linked} | {f"{d}.txt" for d, _ in linked}
+            for dirpath, _, names in os.walk(self.blob_dir):
+                for fn in names:
+                    fp = os.path.join(dirpath, fn)
+                    if fn.endswith(".part") and time.time() - os.path.getmtime(fp) < 3600:
+                        continue    # upload still being written
+                    if fn not in refs:
+                        os.remove(fp)
+                        removed.append(fp)
+        return removed
+
+    # ------------------ Legacy uploads/<Top_Sub>/ folders ------------------
+    def migrate_legacy(self, path, legacy_dir):
+        """One-time import of a page's old upload folder into the store (the folder is left in place)."""
+        # checked without the lock first: this runs on every page view, and uploads hold the lock
+        if self.has_manifest(path) or not os.path.isdir(legacy_dir):
+            return False
+        names = sorted(f for f in os.listdir(legacy_dir) if os.path.isfile(os.path.join(legacy_dir, f)))
+        spooled = []
+        try:
+            for name in names:
+                with open(os.path.join(legacy_dir, name), "rb") as f:
+                    spooled.append((name, *self.spool(f)))
+            with self._lock:
+                if self.has_manifest(path):
+                    return False    # another process migrated it meanwhile
+                manifest = {"path": list(path), "files": {}}
+                for name, tmp, digest, size in spooled:
+                    self._commit(tmp, digest, _ext(name))
+                    manifest["files"][name] = {"blob": digest, "ext": _ext(name), "size": size,
+                                               "uploaded": int(os.path.getmtime(os.path.join(legacy_dir, name)))}
+                self._write_manifest(path, manifest)
+                return True
+        finally:
+            for _, tmp, _, _ in spooled:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
@@ -0,0 +1,344 @@
+# bulk.py - streaming import/export of the topic tree (and privileges) as CSV, XLSX or JSONL
+#
+# Rows are (path, icon, content); path is "Top / Sub / Page" (a list in JSONL also works, for names
+# containing " / "). Rows are read one at a time and applied in batches of BATCH; bodies go straight
+# to the ContentStore, so memory is the tree skeleton plus one batch, not the file. Nothing reaches
+# the data files until the caller saves the tree and settings once at the end.
+#
+#   python -m portal.bulk import <file> [--dry-run] [--keep-existing]
+#   python -m portal.bulk export <file> [--privileges <file>]
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import os
+import sys
+
+BATCH = 1000
+MAX_ERRORS = 200            # errors kept for the report (all are counted)
+MAX_NAME = 200
+MAX_FIELD = 64 * 1024 * 1024    # characters in one CSV field (a page body); longer ones reject the row
+FIELDS = ("path", "icon", "content")
+PRIVILEGE_FIELDS = ("user", "path", "actions")
+
+# format -> module that must be importable
+REQUIREMENTS = {"csv": None, "jsonl": None, "xlsx": "openpyxl"}
+
+
+def supported(fmt):
+    if fmt not in REQUIREMENTS:
+        return False
+    return REQUIREMENTS[fmt] is None or importlib.util.find_spec(REQUIREMENTS[fmt]) is not None
+
+
+def format_of(filename):
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return {"ndjson": "jsonl"}.get(ext, ext)
+
+
+# ------------------ Reading ------------------
+def read_rows(fileobj, fmt):
+    """Yield (line number, row dict) from a binary file object, one row at a time."""
+    if fmt in ("csv", "jsonl"):
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="" if fmt == "csv" else None)
+        try:
+            yield from (_csv_rows(text) if fmt == "csv" else _jsonl_rows(text))
+        finally:
+            text.detach()   # the caller's file object stays open (the app reads its position for progress)
+    elif fmt == "xlsx":
+        from openpyxl import load_workbook
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = [str(h or "").strip().lower() for h in next(rows, ())]
+            for n, values in enumerate(rows, 2):
+                if any(v not in (None, "") for v in values):
+                    yield n, {h: ("" if v is None else v) for h, v in zip(header, values) if h}
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"unsupported format: {fmt}")
+
+
+def _csv_rows(text):
+    # the default limit (128 KiB) is shorter than some circulars; export writes them whole
+    if csv.field_size_limit() < MAX_FIELD:
+        csv.field_size_limit(MAX_FIELD)
+    reader = csv.DictReader(text)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield reader.line_num + 1, {"__error__": f"unreadable CSV row ({e})"}
+            continue
+        yield reader.line_num, {(k or "").strip().lower(): v for k, v in row.items()}
+
+
+def _jsonl_rows(text):
+    for n, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield n, {"__error__": f"not JSON ({e.msg})"}
+            continue
+        yield n, row if isinstance(row, dict) else {"__error__": "not a JSON object"}
+
+
+def parse_path(value):
+    """'Top / Sub' or ["Top", "Sub"] -> ["Top", "Sub"]; raises ValueError when unusable."""
+    if isinstance(value, (list, tuple)):
+        parts = [str(p).strip() for p in value]
+    else:
+        parts = [p.strip() for p in str(value or "").split(" / ")]
+    if not parts or not any(parts):
+        raise ValueError("empty path")
+    for p in parts:
+        if not p:
+            raise ValueError("empty name in path")
+        if len(p) > MAX_NAME:
+            raise ValueError(f"name longer than {MAX_NAME} characters")
+    return parts
+
+
+def validate(row):
+    """(path, icon or None, content or None) for one row; raises ValueError with the reason."""
+    if "__error__" in row:
+        raise ValueError(row["__error__"])
+    path = parse_path(row.get("path"))
+    icon = row.get("icon")
+    icon = str(icon).strip() if icon not in (None, "") else None
+    if icon is not None and len(icon) > 16:
+        raise ValueError("icon longer than 16 characters")
+    content = row.get("content")
+    if content is not None and not isinstance(content, str):
+        content = str(content)
+    return path, icon, content if content != "" else None
+
+
+# ------------------ Import ------------------
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []    # (line, message), at most MAX_ERRORS
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {"rows": self.rows, "created": self.created, "updated": self.updated,
+                "unchanged": self.unchanged, "errors": self.error_count}
+
+
+def import_rows(rows, tree, settings, bodies, default_icon="📘", overwrite=True, dry_run=False, progress=None):
+    """
+    Merge (line, row) pairs into `tree` (a `sections` dict) in place: missing parents are created,
+    new names are appended to settings' topic_order / subtopic_order, icons and content of
+    existing pages are replaced unless overwrite is False. With dry_run nothing is changed and
+    the report says what would happen. progress(rows done) is called after every batch.
+    """
+    report = ImportReport()
+    planned = set()     # dry run: paths that would have been created
+    batch = []
+
+    def apply(batch):
+        for line, row in batch:
+            try:
+                path, icon, content = validate(row)
+            except ValueError as e:
+                report.error(line, str(e))
+                continue
+            if dry_run:
+                _plan(tree, path, planned, report)
+                continue
+            created, node = _ensure(tree, settings, path, default_icon)
+            changed = False
+            if icon is not None and (created or overwrite) and node.get("icon") != icon:
+                node["icon"] = icon
+                changed = True
+            if content is not None and (created or overwrite) and bodies.content_of(node, cache=False) != content:
+                bodies.set_content(node, content, cache=False)
+                changed = True
+            if created:
+                report.created += 1
+            elif changed:
+                report.updated += 1
+            else:
+                report.unchanged += 1
+
+    for line, row in rows:
+        report.rows += 1
+        batch.append((line, row))
+        if len(batch) >= BATCH:
+            apply(batch)
+            batch = []
+            if progress:
+                progress(report.rows)
+    apply(batch)
+    if progress:
+        progress(report.rows)
+    return report
+
+
+def _plan(tree, path, planned, report):
+    children = tree
+    for i, name in enumerate(path):
+        key = tuple(path[:i + 1])
+        node = children.get(name) if isinstance(children, dict) else None
+        if node is None and key not in planned:
+            planned.add(key)
+            if i == len(path) - 1:
+                report.created += 1
+        elif i == len(path) - 1:
+            report.updated += 1
+        children = node.get("subtopics", {}) if isinstance(node, dict) else {}
+
+
+def _ensure(tree, settings, path, default_icon):
+    """(created, node) for path, creating it and any missing parents with their ordering entries."""
+    children = tree
+    created = False
+    for i, name in enumerate(path):
+        node = children.get(name)
+        if not isinstance(node, dict):
+            node = children[name] = {"icon": default_icon, "subtopics": {}}
+            created = i == len(path) - 1
+            if i == 0:
+                # an empty topic_order means "tree order", which already puts the new topic last
+                if settings.get("topic_order"):
+                    settings["topic_order"].append(name)
+            else:
+                settings.setdefault("subtopic_order", {}).setdefault(path[i - 1], []).append(name)
+        children = node.setdefault("subtopics", {})
+    return created, node
+
+
+# ------------------ Export ------------------
+def ordered_names(children, order):
+    """Names of `children` listed in `order` first, the rest in tree order (how the portal shows tiles)."""
+    listed = [n for n in dict.fromkeys(order or []) if n in children]
+    return listed + [n for n in children if n not in set(listed)]
+
+
+def walk(tree, settings):
+    """Yield (path, node) depth-first in topic_order / subtopic_order, each page before its children."""
+    sub_order = settings.get("subtopic_order", {})
+    stack = [([name], tree[name]) for name in reversed(ordered_names(tree, settings.get("topic_order", [])))]
+    while stack:
+        path, node = stack.pop()
+        yield path, node
+        children = node.get("subtopics") if isinstance(node, dict) else None
+        if isinstance(children, dict):
+            for name in reversed(ordered_names(children, sub_order.get(path[-1], []))):
+                stack.append((path + [name], children[name]))
+
+
+def tree_rows(tree, settings, bodies):
+    for path, node in walk(tree, settings):
+        node = node if isinstance(node, dict) else {}
+        yield {"path": " / ".join(path), "icon": node.get("icon", ""), "content": bodies.content_of(node, cache=False)}
+
+
+def privilege_rows(settings):
+    for user, grants in (settings.get("user_privileges") or {}).items():
+        for path, actions in (grants or {}).items():
+            yield {"user": user, "path": path, "actions": "|".join(actions or [])}
+
+
+def write_rows(rows, fields, out, fmt, progress=None):
+    """Stream rows to a binary file object; returns how many were written."""
+    n = 0
+    if fmt == "xlsx":
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(list(fields))
+        for row in rows:
+            ws.append([row.get(f, "") for f in fields])
+            n += 1
+            if progress and n % BATCH == 0:
+                progress(n)
+        wb.save(out)
+    else:
+        text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+        writer = csv.DictWriter(text, fieldnames=fields) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                text.write(json.dumps(row, ensure_ascii=False) + "\n")
+            n += 1
+            if progress and n % BATCH == 0:
+                progress(n)
+        text.flush()
+        text.detach()
+    if progress:
+        progress(n)
+    return n
+
+
+# ------------------ Command line ------------------
+def open_data():
+    """(StoreCache, ContentStore) over the data files in the current directory, for command-line tools."""
+    from portal.content_store import ContentStore
+    from portal.storage import open_store
+    from portal.store_cache import StoreCache
+    store = StoreCache(open_store(os.environ.get("PORTAL_STORAGE", "sqlite"), "portal.db"))
+    return store, ContentStore("content")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m portal.bulk", description="bulk import/export of the topic tree")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import")
+    imp.add_argument("file")
+    imp.add_argument("--dry-run", action="store_true", help="validate and count, change nothing")
+    imp.add_argument("--keep-existing", action="store_true", help="do not replace icons/content of existing pages")
+    exp = sub.add_parser("export")
+    exp.add_argument("file")
+    exp.add_argument("--privileges", help="also write user privileges to this file")
+    args = ap.parse_args(argv)
+
+    def show(n):
+        print(f"  {n} rows", file=sys.stderr)
+
+    store, bodies = open_data()
+    tree = store.get("sections", {})
+    settings = store.get("settings", {})
+    fmt = format_of(args.file)
+    if not supported(fmt):
+        ap.error(f"unsupported format {fmt!r} (csv, jsonl, or xlsx with openpyxl installed)")
+    if args.cmd == "import":
+        with open(args.file, "rb") as f:
+            report = import_rows(read_rows(f, fmt), tree, settings, bodies,
+                                 overwrite=not args.keep_existing, dry_run=args.dry_run, progress=show)
+        if not args.dry_run and (report.created or report.updated):
+            store.save("sections", tree)
+            store.save("settings", settings)
+        for line, msg in report.errors:
+            print(f"  line {line}: {msg}", file=sys.stderr)
+        print(json.dumps(report.as_dict()))
+    else:
+        with open(args.file, "wb") as f:
+            n = write_rows(tree_rows(tree, settings, bodies), FIELDS, f, fmt, progress=show)
+        if args.privileges:
+            pfmt = format_of(args.privileges)
+            with open(args.privileges, "wb") as f:
+                write_rows(privilege_rows(settings), PRIVILEGE_FIELDS, f, pfmt)
+        print(json.dumps({"rows": n}))
+
+
+if __name__ == "__main__":
+    main()
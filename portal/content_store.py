@@ -0,0 +1,157 @@
+# content_store.py - page bodies kept apart from the topic tree, loaded on demand through a byte-budgeted LRU
+#
+#   content/<ab>/<sha1>.html   one file per distinct body (content-addressed, never rewritten)
+#
+# A node in `sections` holds "content_ref" (that sha1) instead of its "content" HTML, so the tree
+# every process loads is only the skeleton: names, icons, children and order. Nodes that still
+# carry inline "content" (data from before the split, synthetic trees) keep working: content_of()
+# reads either form, and split_tree() moves inline bodies out.
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+REF_KEY = "content_ref"
+
+
+def inline_content(node):
+    content = node.get("content", "") if isinstance(node, dict) else ""
+    return content if isinstance(content, str) else ""
+
+
+class ContentStore:
+    """
+    put(text) -> ref; get(ref) -> text, kept in an LRU of at most max_bytes (UTF-8) shared by all
+    sessions. content_of(node) / set_content(node, text) are the node-level calls the app uses.
+    """
+
+    def __init__(self, root, max_bytes=32 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()   # ref -> (text, size)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._dirs = set()          # shard folders known to exist
+
+    def path(self, ref):
+        return os.path.join(self.root, ref[:2], f"{ref}.html")
+
+    def put(self, text, cache=True):
+        """Store a body (once per distinct text); returns its ref."""
+        data = text.encode("utf-8")
+        ref = hashlib.sha1(data).hexdigest()
+        dest = self.path(ref)
+        if not os.path.exists(dest):
+            folder = os.path.dirname(dest)
+            if folder not in self._dirs:
+                os.makedirs(folder, exist_ok=True)
+                self._dirs.add(folder)
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, dest)
+        if cache:
+            self._remember(ref, text, len(data))
+        return ref
+
+    def get(self, ref, cache=True):
+        """Body for ref ("" if missing). cache=False reads past the LRU (index builds scan every body)."""
+        with self._lock:
+            hit = self._lru.get(ref)
+            if hit is not None:
+                self._lru.move_to_end(ref)
+                self.hits += 1
+                return hit[0]
+            self.misses += 1
+        try:
+            with open(self.path(ref), "rb") as f:
+                data = f.read()
+        except OSError:
+            return ""
+        text = data.decode("utf-8")
+        if cache:
+            self._remember(ref, text, len(data))
+        return text
+
+    def _remember(self, ref, text, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if ref in self._lru:
+                return
+            self._lru[ref] = (text, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._lru:
+                _, (_, old_size) = self._lru.popitem(last=False)
+                self._bytes -= old_size
+
+    # ------------------ Nodes ------------------
+    def content_of(self, node, cache=True):
+        if not isinstance(node, dict):
+            return ""
+        ref = node.get(REF_KEY)
+        return self.get(ref, cache=cache) if ref else inline_content(node)
+
+    def set_content(self, node, text, cache=True):
+        """Point the node at `text` (stored as a body); an empty text drops the reference."""
+        node.pop("content", None)
+        if text:
+            node[REF_KEY] = self.put(text, cache=cache)
+        else:
+            node.pop(REF_KEY, None)
+
+    def split_tree(self, tree):
+        """Move inline "content" of every node into the store; returns how many nodes changed."""
+        moved = 0
+        for node in self._walk(tree):
+            if "content" in node:
+                self.set_content(node, inline_content(node), cache=False)
+                moved += 1
+        return moved
+
+    def has_inline(self, tree):
+        return any("content" in node for node in self._walk(tree))
+
+    def refs(self, tree):
+        return {node[REF_KEY] for node in self._walk(tree) if node.get(REF_KEY)}
+
+    def _walk(self, tree):
+        stack = [tree] if isinstance(tree, dict) else []
+        while stack:
+            children = stack.pop()
+            for node in children.values():
+                if isinstance(node, dict):
+                    yield node
+                    if isinstance(node.get("subtopics"), dict):
+                        stack.append(node["subtopics"])
+
+    # ------------------ Garbage collection ------------------
+    def gc(self, keep, min_age=3600):
+        """
+        Delete bodies not in `keep` (refs). Files younger than min_age seconds are left alone:
+        another process may have stored one and not yet saved the tree that points to it.
+        """
+        removed = []
+        if not os.path.isdir(self.root):
+            return removed
+        now = time.time()
+        for dirpath, _, names in os.walk(self.root):
+            for fn in names:
+                ref, ext = os.path.splitext(fn)
+                if ext not in (".html", ".part") or ref in keep:
+                    continue
+                fp = os.path.join(dirpath, fn)
+                try:
+                    if now - os.path.getmtime(fp) >= min_age:
+                        os.remove(fp)
+                        removed.append(fp)
+                except OSError:
+                    pass
+        return removed
+
+    def stats(self):
+        return {"entries": len(self._lru), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,213 @@
+# coordination.py - keeping several portal processes consistent on one set of data files
+#
+#   FileLock      advisory exclusive lock (fcntl / msvcrt) held around every read-modify-write
+#   merge3        three-way merge of a collection another process changed since we loaded it
+#   graft_node / move_node / drop_node
+#                 replay a single-node edit onto a freshly loaded sections tree
+#   copy_path     copy-on-write: a tree to edit one node of without touching the shared one
+import copy
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class FileLock:
+    """
+    Exclusive lock on `path` (created if missing) shared by every process that uses the same file.
+    Threads of one process are serialized by an in-process lock first, so the OS lock is taken
+    at most once per process. Not re-entrant.
+    """
+
+    def __init__(self, path, timeout=10.0, poll=0.005):
+        self.path = path
+        self.timeout = timeout
+        self.poll = poll
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise LockTimeout(self.path)
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            while True:
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    else:
+                        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        os.close(fd)
+                        raise LockTimeout(self.path)
+                    time.sleep(self.poll)
+            self._fd = fd
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+# ------------------ Three-way merge ------------------
+_MISSING = object()
+
+
+def _by_id(items):
+    return all(isinstance(x, dict) and "id" in x for x in items)
+
+
+def merge3(base, ours, theirs):
+    """
+    Combine our edits (base -> ours) with another process's (base -> theirs).
+    Dicts merge per key and lists of {"id": ...} records per id; where both sides changed the
+    same value, ours wins. A key one side deleted and the other changed is kept.
+    """
+    if ours == base:
+        return theirs
+    if theirs == base or theirs == ours:
+        return ours
+    if isinstance(base, dict) and isinstance(ours, dict) and isinstance(theirs, dict):
+        keys = list(theirs) + [k for k in ours if k not in theirs]
+        out = {}
+        for k in keys:
+            v = _merge_value(base.get(k, _MISSING), ours.get(k, _MISSING), theirs.get(k, _MISSING))
+            if v is not _MISSING:
+                out[k] = v
+        return out
+    if isinstance(base, list) and isinstance(ours, list) and isinstance(theirs, list) \
+            and _by_id(base) and _by_id(ours) and _by_id(theirs):
+        b = {x["id"]: x for x in base}
+        o = {x["id"]: x for x in ours}
+        t = {x["id"]: x for x in theirs}
+        ids = [x["id"] for x in theirs] + [x["id"] for x in ours if x["id"] not in t]
+        out = []
+        for i in ids:
+            v = _merge_value(b.get(i, _MISSING), o.get(i, _MISSING), t.get(i, _MISSING))
+            if v is not _MISSING:
+                out.append(v)
+        return out
+    return ours
+
+
+def _merge_value(b, o, t):
+    if o == b:
+        return t
+    if t == b:
+        return o
+    if o is _MISSING:
+        return t        # we deleted what they changed: keep their change
+    if t is _MISSING:
+        return o
+    return merge3(b if b is not _MISSING else {}, o, t) if isinstance(o, (dict, list)) else o
+
+
+# ------------------ Copy-on-write edits of the shared tree ------------------
+def copy_path(tree, path):
+    """
+    A new tree that shares every subtree off `path`: the top-level dict and each node along path,
+    with its subtopics dict, are copied, so that node and its list of children can be edited and
+    saved while other sessions keep reading the old tree.
+    """
+    root = dict(tree)
+    children = root
+    for step in path:
+        node = children.get(step)
+        if not isinstance(node, dict):
+            break
+        node = children[step] = dict(node)
+        if not isinstance(node.get("subtopics"), dict):
+            break
+        children = node["subtopics"] = dict(node["subtopics"])
+    return root
+
+
+# ------------------ Replaying node edits onto a fresh tree ------------------
+def _children(tree, path, create=False):
+    """The `subtopics` dict holding the node at path (tree itself for top level), or None."""
+    children = tree
+    for step in path[:-1]:
+        node = children.get(step) if isinstance(children, dict) else None
+        if not isinstance(node, dict):
+            return None
+        children = node.setdefault("subtopics", {}) if create else node.get("subtopics")
+    return children if isinstance(children, dict) else None
+
+
+def _find(tree, path):
+    children = _children(tree, path)
+    return children.get(path[-1]) if children is not None else None
+
+
+def graft_node(fresh, ours_tree, path):
+    """Put our version of the node at path into fresh: our fields; children from both sides."""
+    path = list(path)
+    ours = _find(ours_tree, path)
+    siblings = _children(fresh, path, create=True)
+    if ours is None or siblings is None:
+        return False
+    theirs = siblings.get(path[-1])
+    if not isinstance(ours, dict):
+        siblings[path[-1]] = copy.deepcopy(ours)
+        return True
+    merged = {k: copy.deepcopy(v) for k, v in ours.items() if k != "subtopics"}
+    ours_subs = ours.get("subtopics")
+    theirs_subs = theirs.get("subtopics") if isinstance(theirs, dict) else None
+    if ours_subs is not None or theirs_subs is not None:
+        subs = {}
+        for name, child in (ours_subs or {}).items():
+            subs[name] = (theirs_subs or {}).get(name, copy.deepcopy(child))
+        for name, child in (theirs_subs or {}).items():
+            subs.setdefault(name, child)
+        merged["subtopics"] = subs
+    siblings[path[-1]] = merged
+    return True
+
+
+def move_node(fresh, old_path, new_path):
+    """Rename in place (keeping the sibling position); False if the node is gone or the name taken."""
+    old_path, new_path = list(old_path), list(new_path)
+    siblings = _children(fresh, old_path)
+    if siblings is None or old_path[-1] not in siblings or new_path[-1] in siblings:
+        return False
+    items = [(new_path[-1] if k == old_path[-1] else k, v) for k, v in siblings.items()]
+    siblings.clear()
+    siblings.update(items)
+    return True
+
+
+def drop_node(fresh, path):
+    siblings = _children(fresh, list(path))
+    if siblings is None:
+        return False
+    return siblings.pop(list(path)[-1], None) is not None
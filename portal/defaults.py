@@ -0,0 +1,40 @@
+# defaults.py - upgrade-safe filling of missing settings keys (kept free of streamlit so it can be benchmarked)
+
+
+def apply_defaults(settings, sections, defaults):
+    """Add missing keys, section visibility and ordering to settings in place; True if anything changed."""
+    changed = False
+    for k, v in defaults.items():
+        if k not in settings:
+            settings[k] = v
+            changed = True
+    # visible_sections defaults: mark every top-level section visible if not present
+    if "visible_sections" not in settings or not isinstance(settings["visible_sections"], dict):
+        settings["visible_sections"] = {}
+        changed = True
+    for top in sections.keys():
+        if top not in settings["visible_sections"]:
+            settings["visible_sections"][top] = True
+            changed = True
+    # topic_order default
+    if not settings.get("topic_order"):
+        settings["topic_order"] = list(sections.keys())
+        changed = True
+    # subtopic_order defaults
+    if "subtopic_order" not in settings or not isinstance(settings["subtopic_order"], dict):
+        settings["subtopic_order"] = {}
+        changed = True
+    for top, val in sections.items():
+        subs = list(val.get("subtopics", {}).keys())
+        if top not in settings["subtopic_order"]:
+            settings["subtopic_order"][top] = subs
+            changed = True
+        else:
+            # ensure all subs present
+            known = set(settings["subtopic_order"].get(top, []))
+            for s in subs:
+                if s not in known:
+                    settings["subtopic_order"][top].append(s)
+                    known.add(s)
+                    changed = True
+    return changed
@@ -0,0 +1,206 @@
+# extraction.py - background text extraction of uploaded documents (pdf, docx, xlsx/xls) for search
+#
+# Text is written next to the blob as uploads/.blobs/<ab>/<sha1>.txt. Blobs are content-addressed,
+# so a file whose sidecar exists has already been extracted and is never read again.
+# Pending jobs live in a small JSON queue file shared by all processes (each adds and removes only
+# its own references, under the file's lock) and are resubmitted when a process restarts.
+import importlib.util
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+from portal.coordination import FileLock
+from portal.storage import atomic_write_json, read_json
+
+MAX_CHARS = 2_000_000       # cap per file so one huge workbook cannot swamp the search index
+
+# ext -> modules one of which must be importable for it to be extracted
+REQUIREMENTS = {
+    "pdf": ("pypdf", "PyPDF2"),
+    "docx": (),
+    "xlsx": ("openpyxl",),
+    "xls": ("xlrd",),
+}
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def supported(ext):
+    ext = (ext or "").lower()
+    if ext not in REQUIREMENTS:
+        return False
+    mods = REQUIREMENTS[ext]
+    return not mods or any(importlib.util.find_spec(m) is not None for m in mods)
+
+
+# ------------------ Extractors (run in the worker processes) ------------------
+def _pdf_text(src):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        from PyPDF2 import PdfReader
+    pages = []
+    for page in PdfReader(src).pages:
+        pages.append(page.extract_text() or "")
+    return "\n".join(pages)
+
+
+def _docx_text(src):
+    with zipfile.ZipFile(src) as z:
+        root = ElementTree.fromstring(z.read("word/document.xml"))
+    paras = []
+    for p in root.iter(_W_NS + "p"):
+        paras.append("".join(t.text or "" for t in p.iter(_W_NS + "t")))
+    return "\n".join(x for x in paras if x)
+
+
+def _sheet_text(src):
+    import pandas as pd
+    parts = []
+    for sheet, df in pd.read_excel(src, sheet_name=None, header=None, dtype=str).items():
+        parts.append(str(sheet))
+        for row in df.itertuples(index=False):
+            parts.append(" ".join(v for v in row if isinstance(v, str) and v.strip()))
+    return "\n".join(parts)
+
+
+EXTRACTORS = {"pdf": _pdf_text, "docx": _docx_text, "xlsx": _sheet_text, "xls": _sheet_text}
+
+
+def extract_file(src, ext, dest):
+    """Write src's plain text to dest (atomically). A file that cannot be parsed gets an empty sidecar."""
+    try:
+        text = EXTRACTORS[ext](src)
+    except Exception:
+        text = ""
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)[:MAX_CHARS]
+    folder = os.path.dirname(dest)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".txt.part")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return len(text)
+
+
+def read_text(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+# ------------------ Queue + worker pool ------------------
+class TextExtractor:
+    """
+    submit(path, name, entry) queues a page's upload for extraction and returns at once; the work runs
+    in a process pool (so parsing a 200-page PDF holds neither the uploader's rerun nor the GIL).
+    Finished files are collected with completed() -> [(page path, file name, text)] by whoever
+    next asks, which feeds them into the shared search index.
+    """
+
+    def __init__(self, blobs, queue_file, workers=2):
+        self.blobs = blobs
+        self.queue_file = queue_file
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pool = None
+        self._jobs = {}         # digest -> {"ext", "refs": [[path, name], ...]}
+        self._done = deque()
+        self._file_lock = FileLock(queue_file + ".lock")
+        for digest, job in read_json(queue_file, {}).items():
+            self._start(digest, job["ext"], job["refs"])
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _persist(self, digest, ext, refs, done=False):
+        """Merge one change into the queue file: refs added to digest's job, or (done) taken off it."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.queue_file)), exist_ok=True)
+        with self._file_lock:
+            queue = read_json(self.queue_file, {})
+            job = queue.setdefault(digest, {"ext": ext, "refs": []})
+            if done:
+                job["refs"] = [r for r in job["refs"] if r not in refs]
+                if not job["refs"]:
+                    del queue[digest]
+            else:
+                job["refs"].extend(r for r in refs if r not in job["refs"])
+            atomic_write_json(self.queue_file, queue)
+
+    def text_for(self, entry):
+        """Extracted text of a manifest entry, or None if it has not been extracted (yet)."""
+        return read_text(self.blobs.text_path(entry["blob"]))
+
+    def submit(self, path, name, entry):
+        """Queue one linked file. Returns its text right away when this content was extracted before."""
+        ext = entry.get("ext", "")
+        if not supported(ext):
+            return None
+        text = self.text_for(entry)
+        if text is not None:
+            return text
+        self._start(entry["blob"], ext, [[list(path), name]])
+        return None
+
+    def _start(self, digest, ext, refs):
+        with self._lock:
+            job = self._jobs.get(digest)
+            if job is not None:
+                added = [list(r) for r in refs if list(r) not in job["refs"]]
+                if added:
+                    job["refs"].extend(added)
+                    self._persist(digest, ext, added)
+                return
+            src = self.blobs.blob_path(digest, ext)
+            if not os.path.exists(src) or not supported(ext):
+                return
+            self._jobs[digest] = {"ext": ext, "refs": [list(r) for r in refs]}
+            self._persist(digest, ext, self._jobs[digest]["refs"])
+            future = self._executor().submit(extract_file, src, ext, self.blobs.text_path(digest))
+        future.add_done_callback(lambda f, d=digest: self._finished(d, f))
+
+    def _finished(self, digest, future):
+        with self._lock:
+            job = self._jobs.pop(digest, None)
+            if job is not None:
+                self._persist(digest, job["ext"], job["refs"], done=True)
+        if job is None or future.exception() is not None:
+            return
+        text = read_text(self.blobs.text_path(digest)) or ""
+        for path, name in job["refs"]:
+            self._done.append((path, name, text))
+
+    def backfill(self):
+        """Queue every linked document that has no extracted text yet (uploads from before this feature)."""
+        queued = 0
+        for path, files in self.blobs.pages():
+            for name, entry in files.items():
+                ext = entry.get("ext", "")
+                if supported(ext) and not os.path.exists(self.blobs.text_path(entry["blob"])):
+                    self._start(entry["blob"], ext, [[list(path), name]])
+                    queued += 1
+        return queued
+
+    def completed(self):
+        out = []
+        while self._done:
+            out.append(self._done.popleft())
+        return out
+
+    def pending(self):
+        return len(self._jobs)
@@ -0,0 +1,250 @@
+# history.py - per-node content revisions stored as deltas, with periodic full snapshots
+#
+#   history/<page key>.jsonl   line 1: {"path": [...]}; then one revision per line, append-only:
+#       {"rev", "ts", "user", "size", "sha", "note", "chain", "delta": [...]}    or "full" (+ "z")
+#
+# A delta is a list of ops over the previous revision's text: int n > 0 copies n characters,
+# int n < 0 skips -n, a string is inserted. Every `snapshot_every`-th revision (or whenever the
+# delta is not much smaller than the text) is stored whole, zlib-compressed when large, so
+# rebuilding any revision applies at most snapshot_every - 1 deltas. Nothing is read until a
+# page's history is opened, except the last line of the file on each save.
+import base64
+import difflib
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+
+from portal.blob_store import page_key
+from portal.coordination import FileLock
+
+SNAPSHOT_EVERY = 25
+COMPRESS_OVER = 512     # characters; shorter snapshots are kept as plain text
+_TAIL_BLOCK = 8192
+
+# tags, words and whitespace runs: small edits to one long HTML line stay small deltas
+_TOKEN_RE = re.compile(r"<[^>]*>|[^<\s]+|\s+")
+
+
+def _sha(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+# ------------------ Deltas ------------------
+def make_delta(old, new):
+    """Ops turning `old` into `new` (see module comment)."""
+    # common prefix and suffix first, so only the edited middle goes through difflib
+    n = min(len(old), len(new))
+    head = 0
+    while head < n and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < n - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    a = _TOKEN_RE.findall(old[head:len(old) - tail])
+    b = _TOKEN_RE.findall(new[head:len(new) - tail])
+    ops = []
+
+    def put(op):
+        if not op:
+            return
+        if ops and type(ops[-1]) is type(op) and (isinstance(op, str) or (ops[-1] > 0) == (op > 0)):
+            ops[-1] += op
+        else:
+            ops.append(op)
+
+    put(head)
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            put(sum(len(t) for t in a[i1:i2]))
+            continue
+        put(-sum(len(t) for t in a[i1:i2]))
+        put("".join(b[j1:j2]))
+    put(tail)
+    return ops
+
+
+def apply_delta(old, ops):
+    out = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.append(old[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def diff_lines(old, new, old_label="before", new_label="after"):
+    """Unified diff of two HTML texts, one tag or text run per line so single-line content diffs readably."""
+    def lines(text):
+        return [t for t in re.split(r"(?=<)|(?<=>)", text or "") if t.strip()]
+    return "\n".join(difflib.unified_diff(lines(old), lines(new), old_label, new_label, lineterm="", n=2))
+
+
+# ------------------ Store ------------------
+def _last_line(path):
+    """Last non-empty line of a file, read from the end."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        buf = b""
+        while end > 0:
+            start = max(0, end - _TAIL_BLOCK)
+            f.seek(start)
+            buf = f.read(end - start) + buf
+            end = start
+            stripped = buf.rstrip(b"\n")
+            if b"\n" in stripped:
+                return stripped.rsplit(b"\n", 1)[1].decode("utf-8")
+        return buf.rstrip(b"\n").decode("utf-8")
+
+
+class RevisionHistory:
+    """
+    record(path, content, user, previous) appends a revision when a node's content is saved;
+    revisions(path) lists them newest first and text(path, rev) rebuilds one. rename / remove
+    follow the tree edits, including every descendant's history.
+    """
+
+    def __init__(self, root, snapshot_every=SNAPSHOT_EVERY):
+        self.root = root
+        self.snapshot_every = max(1, snapshot_every)
+        os.makedirs(root, exist_ok=True)
+        self._lock = FileLock(os.path.join(root, ".lock"))
+
+    def _file(self, path):
+        return os.path.join(self.root, page_key(path) + ".jsonl")
+
+    def _tail(self, fp):
+        try:
+            last = json.loads(_last_line(fp))
+        except (OSError, ValueError):
+            return None
+        return last if "rev" in last else None
+
+    def _full(self, text):
+        if len(text) > COMPRESS_OVER:
+            return {"full": base64.b64encode(zlib.compress(text.encode("utf-8"), 9)).decode("ascii"), "z": 1}
+        return {"full": text}
+
+    def _append(self, fp, path, records):
+        new_file = not os.path.exists(fp)
+        with open(fp, "a", encoding="utf-8") as f:
+            if new_file:
+                f.write(json.dumps({"path": list(path)}, ensure_ascii=False) + "\n")
+            for r in records:
+                f.write(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def record(self, path, content, user="", previous=None, note=""):
+        """
+        Append `content` as the page's newest revision; returns its number (None if unchanged).
+        `previous` is the content before this save: on a page's first save it becomes revision 1,
+        later it spares rebuilding the last revision when its checksum matches.
+        """
+        content = content or ""
+        with self._lock:
+            fp = self._file(path)
+            last = self._tail(fp)
+            now = int(time.time())
+            records = []
+            if last is None:
+                if previous:
+                    records.append(dict(self._full(previous), rev=1, ts=now, user="", size=len(previous),
+                                        sha=_sha(previous), note="before history", chain=0))
+                    last = records[-1]
+                    base = previous
+                else:
+                    base = None
+            elif previous is not None and _sha(previous) == last["sha"]:
+                base = previous
+            else:
+                base = self._text_locked(fp, last["rev"])
+            if base is not None and content == base:
+                if records:
+                    self._append(fp, path, records)
+                return None
+            rev = last["rev"] + 1 if last else 1
+            meta = {"rev": rev, "ts": now, "user": user, "size": len(content), "sha": _sha(content), "note": note}
+            chain = last["chain"] + 1 if last else 0
+            delta = make_delta(base, content) if base is not None and chain < self.snapshot_every else None
+            if delta is None or len(json.dumps(delta, ensure_ascii=False)) >= len(content) // 2:
+                records.append(dict(meta, chain=0, **self._full(content)))
+            else:
+                records.append(dict(meta, chain=chain, delta=delta))
+            self._append(fp, path, records)
+            return rev
+
+    def _read(self, fp):
+        try:
+            with open(fp, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()][1:]
+        except (OSError, ValueError):
+            return []
+
+    def revisions(self, path):
+        """[{rev, ts, user, size, note}] newest first."""
+        keep = ("rev", "ts", "user", "size", "note")
+        return [{k: r.get(k) for k in keep} for r in reversed(self._read(self._file(path)))]
+
+    def _text_locked(self, fp, rev):
+        records = self._read(fp)
+        upto = [r for r in records if r["rev"] <= rev]
+        if not upto or upto[-1]["rev"] != rev:
+            return None
+        start = max(i for i, r in enumerate(upto) if "full" in r)
+        text = None
+        for r in upto[start:]:
+            if "full" in r:
+                text = zlib.decompress(base64.b64decode(r["full"])).decode("utf-8") if r.get("z") else r["full"]
+            else:
+                text = apply_delta(text, r["delta"])
+        return text
+
+    def text(self, path, rev):
+        """Content of revision `rev` (None if there is no such revision)."""
+        return self._text_locked(self._file(path), rev)
+
+    # ------------------ Tree edits ------------------
+    def _owned(self, path):
+        """(file, stored path) for path and every page below it."""
+        path = list(path)
+        out = []
+        for fn in os.listdir(self.root):
+            if fn.endswith(".jsonl"):
+                fp = os.path.join(self.root, fn)
+                try:
+                    with open(fp, "r", encoding="utf-8") as f:
+                        stored = json.loads(f.readline()).get("path", [])
+                except (OSError, ValueError):
+                    continue
+                if stored[:len(path)] == path:
+                    out.append((fp, stored))
+        return out
+
+    def rename(self, old_path, new_path):
+        if list(old_path) == list(new_path):
+            return
+        with self._lock:
+            for fp, stored in self._owned(old_path):
+                moved = list(new_path) + stored[len(old_path):]
+                dest = self._file(moved)
+                with open(fp, "r", encoding="utf-8") as f:
+                    f.readline()
+                    body = f.read()
+                tmp = dest + ".part"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"path": moved}, ensure_ascii=False) + "\n" + body)
+                os.replace(tmp, dest)
+                if fp != dest:
+                    os.remove(fp)
+
+    def remove(self, path):
+        with self._lock:
+            for fp, _ in self._owned(path):
+                os.remove(fp)
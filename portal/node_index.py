@@ -0,0 +1,224 @@
+# node_index.py - flat path -> node index kept alongside the sections tree
+import string
+import threading
+
+MAX_VIEWS = 32      # memoized filter / jump-bar views per parent
+JUMP_BUCKETS = tuple(string.ascii_uppercase) + ("0-9", "#")
+
+
+def initial(name):
+    """Jump-bar bucket of a name: "A".."Z", "0-9", or "#" for anything else (emoji, Devanagari ...)."""
+    c = name.lstrip()[:1].upper()
+    if "A" <= c <= "Z":
+        return c
+    return "0-9" if c.isdigit() else "#"
+
+
+def filter_names(names, text="", letter=None):
+    """names (kept in their order) containing `text` (case-insensitive) and, with letter, in that bucket."""
+    needle = text.strip().casefold()
+    return [n for n in names if (not needle or needle in n.casefold()) and (letter is None or initial(n) == letter)]
+
+
+class NodeEntry:
+    __slots__ = ("node", "parent", "depth", "children")
+
+    def __init__(self, node, parent, depth):
+        self.node = node            # the node dict itself (same object as in sections)
+        self.parent = parent        # parent path tuple, () for top-level topics
+        self.depth = depth          # 1 for top-level topics
+        self.children = []          # child names, in tree (dict) order
+
+
+class NodeIndex:
+    """
+    Maps path tuples ("Prepaid", "STV Packs") to their node in O(1).
+    Built once from sections, then patched by add/remove/rename so it never needs a rebuild.
+    Also memoizes per-parent child ordering (subtopic_order) and the flat "Top / Sub" path list.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {(): NodeEntry(None, None, 0)}
+        self._ordered = {}          # path -> ordered child names (valid for the current order_key)
+        self._views = {}            # path -> {(text, letter): names} and {None: bucket counts}, same lifetime
+        self._order_key = None
+        self._all_paths = None
+
+    @classmethod
+    def build(cls, sections):
+        idx = cls()
+        idx._entries[()].node = {"subtopics": sections}
+        idx._add_children((), sections)
+        return idx
+
+    # ------------------ Lookup ------------------
+    def __contains__(self, path):
+        return tuple(path) in self._entries
+
+    def __len__(self):
+        return len(self._entries) - 1
+
+    def get(self, path, default=None):
+        e = self._entries.get(tuple(path))
+        return e.node if e is not None and e.parent is not None else default
+
+    def entry(self, path):
+        return self._entries.get(tuple(path))
+
+    def parent(self, path):
+        e = self._entries.get(tuple(path))
+        return e.parent if e is not None else None
+
+    def depth(self, path):
+        e = self._entries.get(tuple(path))
+        return e.depth if e is not None else None
+
+    def children(self, path):
+        e = self._entries.get(tuple(path))
+        return list(e.children) if e is not None else []
+
+    def sync_order(self, order_key):
+        """Drop memoized orderings when the ordering settings changed (order_key = settings generation)."""
+        if order_key != self._order_key:
+            with self._lock:
+                self._ordered.clear()
+                self._views.clear()
+                self._order_key = order_key
+
+    def ordered_children(self, path, order):
+        """Children of path sorted by `order` (names not in it keep tree order, at the end)."""
+        path = tuple(path)
+        cached = self._ordered.get(path)
+        if cached is not None:
+            return cached
+        e = self._entries.get(path)
+        if e is None:
+            return []
+        present = set(e.children)
+        listed = [s for s in dict.fromkeys(order or []) if s in present]
+        listed_set = set(listed)
+        result = listed + [s for s in e.children if s not in listed_set]
+        self._ordered[path] = result
+        return result
+
+    def filtered_children(self, path, order, text="", letter=None):
+        """
+        ordered_children narrowed by filter_names, memoized like the ordering itself: until the
+        children of path or the ordering settings change.
+        """
+        path = tuple(path)
+        views = self._views.setdefault(path, {})
+        key = (text.strip().casefold(), letter)
+        cached = views.get(key)
+        if cached is None:
+            names = self.ordered_children(path, order)
+            cached = names if key == ("", None) else filter_names(names, text, letter)
+            if len(views) >= MAX_VIEWS:
+                views.clear()
+            views[key] = cached
+        return cached
+
+    def initials(self, path, order):
+        """{bucket: child count} in jump-bar order (A..Z, then 0-9, then #), for the children of path."""
+        path = tuple(path)
+        views = self._views.setdefault(path, {})
+        counts = views.get(None)
+        if counts is None:
+            found = {}
+            for name in self.ordered_children(path, order):
+                b = initial(name)
+                found[b] = found.get(b, 0) + 1
+            counts = {b: found[b] for b in JUMP_BUCKETS if b in found}
+            views[None] = counts
+        return counts
+
+    def all_paths(self):
+        """['Top', 'Top / Sub', ...] in tree order (what the privilege editor lists)."""
+        paths = self._all_paths
+        if paths is None:
+            paths = []
+            stack = [()]
+            while stack:
+                cur = stack.pop()
+                if cur:
+                    paths.append(" / ".join(cur))
+                for name in reversed(self._entries[cur].children):
+                    stack.append(cur + (name,))
+            self._all_paths = paths
+        return paths
+
+    # ------------------ Patching ------------------
+    def _add_children(self, path, children):
+        if not isinstance(children, dict):
+            return
+        for name, node in children.items():
+            self._add(path + (name,), node)
+
+    def _add(self, path, node, link=True):
+        if link:
+            self._entries[path[:-1]].children.append(path[-1])
+        self._entries[path] = NodeEntry(node, path[:-1], len(path))
+        if isinstance(node, dict):
+            self._add_children(path, node.get("subtopics"))
+
+    def _changed(self, parent):
+        self._ordered.pop(parent, None)
+        self._views.pop(parent, None)
+        self._all_paths = None
+
+    def add(self, path, node):
+        """Insert (or replace) a node and its whole subtree. The parent must already be indexed."""
+        path = tuple(path)
+        with self._lock:
+            if path[:-1] not in self._entries:
+                return
+            existed = path in self._entries
+            if existed and self._entries[path].node is node:
+                return  # same object, only its fields changed
+            if existed:
+                self._drop(path, unlink=False)
+            self._add(path, node, link=not existed)
+            self._changed(path[:-1])
+
+    def repoint(self, sections, path):
+        """Follow a copy-on-write edit: the root and the entries along path now hold sections' nodes."""
+        with self._lock:
+            node = self._entries[()].node = {"subtopics": sections}
+            for i in range(1, len(path) + 1):
+                e = self._entries.get(tuple(path[:i]))
+                children = node.get("subtopics") if isinstance(node, dict) else None
+                if e is None or not isinstance(children, dict) or path[i - 1] not in children:
+                    return
+                node = e.node = children[path[i - 1]]
+
+    def _drop(self, path, unlink=True):
+        e = self._entries.pop(path, None)
+        if e is None:
+            return
+        for name in e.children:
+            self._drop(path + (name,), unlink=False)
+        self._ordered.pop(path, None)
+        self._views.pop(path, None)
+        if unlink:
+            siblings = self._entries[path[:-1]].children
+            if path[-1] in siblings:
+                siblings.remove(path[-1])
+
+    def remove(self, path):
+        path = tuple(path)
+        with self._lock:
+            if path not in self._entries or not path:
+                return
+            self._drop(path)
+            self._changed(path[:-1])
+
+    def rename(self, old_path, new_path, node):
+        """Move a subtree to a new name; like the dict pop/insert in the app, it becomes the last child."""
+        old_path, new_path = tuple(old_path), tuple(new_path)
+        with self._lock:
+            self._drop(old_path)
+            if new_path in self._entries:
+                self._drop(new_path)
+            self._add(new_path, node)
+            self._changed(new_path[:-1])
@@ -0,0 +1,80 @@
+# perf.py - per-phase rerun timings in a fixed-size ring buffer shared by all sessions
+#
+# Recording is a perf_counter pair and one deque append (atomic, no lock); all aggregation
+# happens in summary() / slowest_pages(), i.e. only while someone looks at the dashboard.
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def _pct(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))]
+
+
+class PhaseRecorder:
+    def __init__(self, capacity=5000):
+        self.samples = deque(maxlen=capacity)   # (wall time, phase, ms, page)
+        self.counters = {}
+        self.started = time.time()
+
+    @contextmanager
+    def phase(self, name, page=""):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append((time.time(), name, (time.perf_counter() - t) * 1000, page))
+
+    def record(self, name, ms, page=""):
+        self.samples.append((time.time(), name, ms, page))
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        self.samples.clear()
+        self.counters.clear()
+        self.started = time.time()
+
+    # ------------------ Aggregation (dashboard only) ------------------
+    def summary(self):
+        """One row per phase: calls, p50/p95/p99/max and total ms, slowest total first."""
+        by_phase = {}
+        for _, name, ms, _ in list(self.samples):
+            by_phase.setdefault(name, []).append(ms)
+        rows = []
+        for name, values in by_phase.items():
+            values.sort()
+            rows.append({
+                "Phase": name,
+                "Calls": len(values),
+                "p50 ms": round(_pct(values, 50), 2),
+                "p95 ms": round(_pct(values, 95), 2),
+                "p99 ms": round(_pct(values, 99), 2),
+                "Max ms": round(values[-1], 2),
+                "Total ms": round(sum(values), 1),
+            })
+        rows.sort(key=lambda r: -r["Total ms"])
+        return rows
+
+    def slowest_pages(self, phase="rerun", limit=15):
+        by_page = {}
+        for _, name, ms, page in list(self.samples):
+            if name == phase:
+                by_page.setdefault(page, []).append(ms)
+        rows = []
+        for page, values in by_page.items():
+            values.sort()
+            rows.append({"Page": page or "🏠 Home", "Reruns": len(values), "p50 ms": round(_pct(values, 50), 2),
+                         "p95 ms": round(_pct(values, 95), 2), "Max ms": round(values[-1], 2)})
+        rows.sort(key=lambda r: -r["p95 ms"])
+        return rows[:limit]
+
+    def window(self):
+        """(number of samples, seconds covered)."""
+        samples = list(self.samples)
+        if not samples:
+            return 0, 0.0
+        return len(samples), samples[-1][0] - samples[0][0]
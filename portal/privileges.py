@@ -0,0 +1,144 @@
+# privileges.py - per-user privilege tries compiled from settings["user_privileges"]
+import copy
+import threading
+
+ACTION_BITS = {"view": 1, "edit": 2}
+
+
+def _parts(path):
+    """'Top / Sub' or ['Top', 'Sub'] -> ('Top', 'Sub'); '' / [] -> ()."""
+    if isinstance(path, (list, tuple)):
+        return tuple(path)
+    path = str(path)
+    return tuple(path.split(" / ")) if path else ()
+
+
+def _mask(actions):
+    m = 0
+    for a in actions or []:
+        m |= ACTION_BITS.get(a, 0)
+    return m
+
+
+class PrivilegeTable:
+    """
+    Compiled form of { username: { "Top" or "Top / Sub": ["view", "edit"] } }.
+
+    Each user gets a trie over path parts; a grant on "Top" is inherited by everything below it,
+    so the answer for a path is the OR of the masks along its trie walk. Answers are memoized per
+    (user, path), making repeated checks a single dict lookup.
+    """
+
+    def __init__(self, user_privileges, admins=()):
+        self.source = copy.deepcopy(user_privileges or {})
+        self.admins = frozenset(admins)
+        self._tries = {}
+        self._memo = {}
+        self._lock = threading.Lock()
+        for username, grants in self.source.items():
+            root = [0, {}]
+            for path_str, actions in (grants or {}).items():
+                node = root
+                for part in _parts(path_str):
+                    node = node[1].setdefault(part, [0, {}])
+                node[0] |= _mask(actions)
+            self._tries[username] = root
+
+    def mask(self, username, path):
+        """Bitmask of actions username may take on path (all bits for Admins)."""
+        if username in self.admins:
+            return sum(ACTION_BITS.values())
+        parts = _parts(path)
+        key = (username, parts)
+        m = self._memo.get(key)
+        if m is not None:
+            return m
+        node = self._tries.get(username)
+        m = 0
+        if node is not None:
+            m = node[0]
+            for part in parts:
+                node = node[1].get(part)
+                if node is None:
+                    break
+                m |= node[0]
+        with self._lock:
+            self._memo[key] = m
+        return m
+
+    def allowed(self, username, path, action):
+        if not username:
+            return False
+        return bool(self.mask(username, path) & ACTION_BITS.get(action, 0))
+
+    def filter_paths(self, username, paths, action):
+        """Keep only the paths (lists, tuples or 'A / B' strings) username may `action`."""
+        if not username:
+            return []
+        if username in self.admins:
+            return list(paths)
+        bit = ACTION_BITS.get(action, 0)
+        return [p for p in paths if self.mask(username, p) & bit]
+
+    def clear_memo(self):
+        with self._lock:
+            self._memo.clear()
+
+    def matches(self, user_privileges, admins):
+        """True when this table was compiled from equal inputs (so it can be kept)."""
+        return self.admins == frozenset(admins) and self.source == (user_privileges or {})
+
+
+# ------------------ Editing helpers (settings["user_privileges"] is edited in place) ------------------
+def user_grants(user_privileges, username):
+    """(view paths, edit paths) granted directly to username."""
+    grants = (user_privileges or {}).get(username, {})
+    return ([p for p, a in grants.items() if "view" in a],
+            [p for p, a in grants.items() if "edit" in a])
+
+
+def set_user_grants(user_privileges, username, view_paths, edit_paths):
+    mapping = {}
+    for p in view_paths:
+        mapping.setdefault(p, []).append("view")
+    for p in edit_paths:
+        if "edit" not in mapping.setdefault(p, []):
+            mapping[p].append("edit")
+    user_privileges[username] = mapping
+
+
+def bulk_update(user_privileges, usernames, paths, action, grant=True):
+    """Grant or revoke one action on paths for many users; returns how many users changed."""
+    changed = 0
+    for u in usernames:
+        grants = user_privileges.setdefault(u, {})
+        before = {p: list(a) for p, a in grants.items()}
+        for p in paths:
+            acts = grants.get(p, [])
+            if grant and action not in acts:
+                grants[p] = acts + [action]
+            elif not grant and action in acts:
+                acts = [a for a in acts if a != action]
+                if acts:
+                    grants[p] = acts
+                else:
+                    grants.pop(p, None)
+        if grants != before:
+            changed += 1
+    return changed
+
+
+def summary_rows(users, user_privileges):
+    """One row per user for the privileges overview table."""
+    rows = []
+    for u, info in users.items():
+        view, edit = user_grants(user_privileges, u)
+        role = info.get("role", "") if isinstance(info, dict) else ""
+        rows.append({
+            "Username": u,
+            "Role": role,
+            "View grants": "all" if role == "Admin" else len(view),
+            "Edit grants": "all" if role == "Admin" else len(edit),
+            "Paths": ", ".join(sorted(set(view) | set(edit))[:3]) + (" …" if len(set(view) | set(edit)) > 3 else ""),
+        })
+    return rows
@@ -0,0 +1,143 @@
+# render_cache.py - one-time HTML post-processing of node content, shared through a byte-budgeted LRU
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+
+def content_hash(text):
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+# ------------------ Pipeline steps (html -> html) ------------------
+_SCRIPT_RE = re.compile(r"<script\b[^>]*>.*?</script\s*>", re.IGNORECASE | re.DOTALL)
+# start tags (quoted values may hold ">") and the attributes in one; handlers are only looked for there,
+# so text such as "status online=yes" in a page body is left alone
+_START_TAG_RE = re.compile(r"""<([a-zA-Z][^\s/>]*)((?:[^>"']|"[^"]*"|'[^']*')*)>""")
+_ATTR_RE = re.compile(r"""([\s/]*)([^\s"'>/=]+)(\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'>]+))?""")
+_HEADING_RE = re.compile(r"<(h[1-6])(\s[^>]*)?>(.*?)</\1>", re.IGNORECASE | re.DOTALL)
+_IMG_RE = re.compile(r"<img(?![^>]*\bloading=)", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def _drop_handlers(tag):
+    attrs = _ATTR_RE.sub(lambda a: "" if a.group(2).lower().startswith("on") else a.group(0), tag.group(2))
+    return f"<{tag.group(1)}{attrs}>"
+
+
+def strip_scripts(html_text):
+    """Drop <script> blocks and inline on*= handlers pasted into content."""
+    return _START_TAG_RE.sub(_drop_handlers, _SCRIPT_RE.sub("", html_text))
+
+
+def rewrite_links_to_new_tab(html_text):
+    # Add target="_blank" to anchor tags to open in new tab
+    # Works if content contains HTML <a href="..."> links
+    return re.sub(r'<a\s+href=', r'<a target="_blank" href=', html_text, flags=re.IGNORECASE)
+
+
+def add_heading_anchors(html_text):
+    """Give headings without an id a slug id, so sections of long circulars can be linked."""
+    seen = {}
+
+    def repl(m):
+        tag, attrs, inner = m.group(1), m.group(2) or "", m.group(3)
+        if re.search(r"\bid\s*=", attrs, re.IGNORECASE):
+            return m.group(0)
+        slug = re.sub(r"[^\w]+", "-", _TAG_RE.sub("", inner).lower()).strip("-") or "section"
+        n = seen.get(slug, 0)
+        seen[slug] = n + 1
+        if n:
+            slug = f"{slug}-{n}"
+        return f'<{tag} id="{slug}"{attrs}>{inner}</{tag}>'
+
+    return _HEADING_RE.sub(repl, html_text)
+
+
+def lazy_load_images(html_text):
+    return _IMG_RE.sub('<img loading="lazy"', html_text)
+
+
+DEFAULT_STEPS = (strip_scripts, rewrite_links_to_new_tab, add_heading_anchors, lazy_load_images)
+
+
+class RenderCache:
+    """
+    render(content) -> ready-to-show HTML. The pipeline runs once per distinct content (keyed by its
+    sha1) and the result sits in an LRU bounded by `max_bytes`. prerender() is called at save time so
+    the first reader after an edit already gets a hit. Add later post-processing with add_step().
+    """
+
+    def __init__(self, steps=DEFAULT_STEPS, max_bytes=32 * 1024 * 1024):
+        self.steps = list(steps)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()      # (hash, pipeline) -> (html, size in bytes)
+        self._bytes = 0
+        self._hash_of = {}             # id(content) -> (content, hash): skip re-hashing the same str
+        self.hits = 0
+        self.misses = 0
+
+    def _signature(self):
+        return tuple(getattr(s, "__name__", repr(s)) for s in self.steps)
+
+    def add_step(self, fn):
+        with self._lock:
+            self.steps.append(fn)
+            self._lru.clear()
+            self._bytes = 0
+
+    def _key(self, content):
+        known = self._hash_of.get(id(content))
+        if known is not None and known[0] is content:
+            h = known[1]
+        else:
+            h = content_hash(content)
+            with self._lock:
+                if len(self._hash_of) > 4096:
+                    self._hash_of.clear()
+                self._hash_of[id(content)] = (content, h)
+        return (h, self._signature())
+
+    def _run(self, content):
+        out = content
+        for step in self.steps:
+            out = step(out)
+        return out
+
+    def render(self, content):
+        if not isinstance(content, str) or not content:
+            return content
+        key = self._key(content)
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return hit[0]
+            self.misses += 1
+        html_out = self._run(content)
+        self._put(key, html_out)
+        return html_out
+
+    def prerender(self, content):
+        """Run the pipeline at write time; returns the content hash."""
+        if isinstance(content, str) and content:
+            self.render(content)
+        return content_hash(content if isinstance(content, str) else "")
+
+    def _put(self, key, html_out):
+        size = len(html_out.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._lru:
+                return
+            self._lru[key] = (html_out, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._lru:
+                _, (_, old_size) = self._lru.popitem(last=False)
+                self._bytes -= old_size
+
+    def stats(self):
+        return {"entries": len(self._lru), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,234 @@
+# search_index.py - tokenized inverted index over node titles + tag-stripped content
+import html
+import math
+import re
+import threading
+from bisect import bisect_left
+
+from portal.content_store import inline_content
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TAG_RE = re.compile(r"<[^>]+>")
+# last part of the key of an attached file's document: page path + (FILE_MARK + file name,)
+FILE_MARK = "\x00file:"
+
+
+def strip_tags(html_text):
+    """Quill HTML -> plain text (tags removed, entities decoded)."""
+    if not isinstance(html_text, str) or not html_text:
+        return ""
+    return html.unescape(TAG_RE.sub(" ", html_text))
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+def split_hit(path):
+    """Search hit -> (page path, attached file name or None)."""
+    if path and isinstance(path[-1], str) and path[-1].startswith(FILE_MARK):
+        return list(path[:-1]), path[-1][len(FILE_MARK):]
+    return list(path), None
+
+
+def _count(tokens):
+    counts = {}
+    for t in tokens:
+        counts[t] = counts.get(t, 0) + 1
+    return counts
+
+
+class SearchIndex:
+    """
+    Inverted index keyed by node path (tuple of names).
+    Two fields per node: title (the key in `subtopics`) and body (node["content"] without tags).
+    Attached files are documents too (title = file name, body = extracted text), keyed under their
+    page so removing the page removes them; see update_file / split_hit.
+    Ranking is BM25 per field, with title hits weighted above body hits.
+    Built once from `sections`, then patched with update/remove/rename when the tree changes.
+    `content(node)` returns a node's HTML: inline "content" by default, a ContentStore lookup in the app.
+    """
+
+    # how many vocabulary terms a query token may expand to by prefix ("rech" -> "recharge")
+    MAX_PREFIX_EXPANSION = 50
+    PREFIX_WEIGHT = 0.6
+
+    def __init__(self, k1=1.2, b=0.75, title_weight=3.0, body_weight=1.0, content=None):
+        self.k1 = k1
+        self.b = b
+        self.weights = (title_weight, body_weight)
+        self._content = content or inline_content
+        self._lock = threading.RLock()
+        self._postings = {}     # term -> { path: (tf_title, tf_body) }
+        self._docs = {}         # path -> (title_len, body_len, {term: (tf_title, tf_body)})
+        self._children = {}     # path -> set(child paths) (for subtree removal)
+        self._len_totals = [0, 0]
+        self._vocab = []        # sorted terms, rebuilt lazily for prefix lookups
+        self._vocab_dirty = True
+
+    # ------------------ Build / patch ------------------
+    @classmethod
+    def build(cls, data, **kwargs):
+        idx = cls(**kwargs)
+        idx.add_tree(data)
+        return idx
+
+    def add_tree(self, data, prefix=()):
+        """Index every node of a `subtopics`-style dict (recursively) under `prefix`."""
+        if not isinstance(data, dict):
+            return
+        with self._lock:
+            for key, value in data.items():
+                path = tuple(prefix) + (key,)
+                self._index_node(path, value)
+                if isinstance(value, dict) and isinstance(value.get("subtopics"), dict):
+                    self.add_tree(value["subtopics"], path)
+
+    def update(self, path, node):
+        """Re-index a single node (title/content changed). Children are left untouched."""
+        with self._lock:
+            self._index_node(tuple(path), node)
+
+    def remove(self, path):
+        """Drop a node and all of its descendants."""
+        path = tuple(path)
+        with self._lock:
+            for child in list(self._children.get(path, ())):
+                self.remove(child)
+            self._children.pop(path, None)
+            self._unindex_node(path)
+            if len(path) > 1:
+                siblings = self._children.get(path[:-1])
+                if siblings is not None:
+                    siblings.discard(path)
+
+    def rename(self, old_path, new_path, node, files=None):
+        """
+        Move a subtree: every descendant path changes, so remove and re-add it. The attached files
+        go with the old paths; files(page path) -> [(name, text)] supplies them again for each page.
+        """
+        new_path = tuple(new_path)
+        docs = []
+        if files is not None:
+            stack = [(new_path, node)]
+            while stack:
+                path, cur = stack.pop()
+                docs.extend((path, name, text) for name, text in files(path))
+                if isinstance(cur, dict) and isinstance(cur.get("subtopics"), dict):
+                    stack.extend((path + (k,), v) for k, v in cur["subtopics"].items())
+        with self._lock:
+            self.remove(old_path)
+            self._index_node(new_path, node)
+            if isinstance(node, dict) and isinstance(node.get("subtopics"), dict):
+                self.add_tree(node["subtopics"], new_path)
+            for path, name, text in docs:
+                self.update_file(path, name, text)
+
+    def update_file(self, path, name, text):
+        """Index (or re-index) a file attached to the page at path."""
+        with self._lock:
+            self._index_doc(tuple(path) + (FILE_MARK + name,), name, text or "")
+
+    def remove_file(self, path, name):
+        self.remove(tuple(path) + (FILE_MARK + name,))
+
+    def _index_node(self, path, node):
+        self._index_doc(path, path[-1], strip_tags(self._content(node)))
+
+    def _index_doc(self, path, title, body):
+        self._unindex_node(path)
+        title_counts = _count(tokenize(title))
+        body_tokens = tokenize(body)
+        body_counts = _count(body_tokens)
+        terms = {}
+        for t, c in title_counts.items():
+            terms[t] = (c, 0)
+        for t, c in body_counts.items():
+            terms[t] = (terms.get(t, (0, 0))[0], c)
+        title_len = sum(title_counts.values())
+        body_len = len(body_tokens)
+        self._docs[path] = (title_len, body_len, terms)
+        self._len_totals[0] += title_len
+        self._len_totals[1] += body_len
+        for t, tfs in terms.items():
+            plist = self._postings.get(t)
+            if plist is None:
+                plist = self._postings[t] = {}
+                self._vocab_dirty = True
+            plist[path] = tfs
+        if len(path) > 1:
+            self._children.setdefault(path[:-1], set()).add(path)
+
+    def _unindex_node(self, path):
+        doc = self._docs.pop(path, None)
+        if doc is None:
+            return
+        title_len, body_len, terms = doc
+        self._len_totals[0] -= title_len
+        self._len_totals[1] -= body_len
+        for t in terms:
+            plist = self._postings.get(t)
+            if plist is None:
+                continue
+            plist.pop(path, None)
+            if not plist:
+                del self._postings[t]
+                self._vocab_dirty = True
+
+    # ------------------ Query ------------------
+    def __len__(self):
+        return len(self._docs)
+
+    def _expand(self, token):
+        """Exact term (weight 1) plus vocabulary terms starting with token (reduced weight)."""
+        out = []
+        if token in self._postings:
+            out.append((token, 1.0))
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        i = bisect_left(self._vocab, token)
+        while i < len(self._vocab) and len(out) < self.MAX_PREFIX_EXPANSION:
+            term = self._vocab[i]
+            if not term.startswith(token):
+                break
+            if term != token:
+                out.append((term, self.PREFIX_WEIGHT))
+            i += 1
+        return out
+
+    def search(self, query, k=20):
+        """Return up to k node paths (lists) ranked by score; every query token must match."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            n_docs = len(self._docs) or 1
+            avg = [max(total / n_docs, 1e-9) for total in self._len_totals]
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term, weight in self._expand(token):
+                    plist = self._postings[term]
+                    idf = math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+                    for path, tfs in plist.items():
+                        doc = self._docs[path]
+                        s = 0.0
+                        for f in (0, 1):
+                            tf = tfs[f]
+                            if tf:
+                                norm = 1 - self.b + self.b * doc[f] / avg[f]
+                                s += self.weights[f] * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+                        s *= idf * weight
+                        if s > token_scores.get(path, 0.0):
+                            token_scores[path] = s
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {p: scores[p] + s for p, s in token_scores.items() if p in scores}
+                if not scores:
+                    return []
+            ranked = sorted(scores.items(), key=lambda kv: (-kv[1], len(kv[0]), kv[0]))
+            return [list(p) for p, _ in ranked[:k]]
@@ -0,0 +1,277 @@
+# semantic.py - vector search over node titles and content chunks, with an on-disk embedding cache
+#
+#   embeddings/<provider>/vectors.npy   float32 matrix, one L2-normalized row per chunk
+#   embeddings/<provider>/rows.json     per row: [path, chunk number, node hash]
+#
+# Providers turn texts into vectors: HashingEmbedder works offline (hashed words, word trigrams and
+# shared telecom concept features, so "net not working" reaches "Data Connectivity"); OpenAIEmbedder
+# is used when PORTAL_EMBEDDINGS=openai and the openai package and key are available.
+# sync(tree) re-embeds only nodes whose hash (title path + content ref) changed since the cache was
+# written; refresh(tree, generation) does that once per generation of the tree (refresh_later in a
+# background thread, after a save); search(query, k) is a single matrix-vector product and a partial sort.
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import tempfile
+import threading
+import zlib
+
+import numpy as np
+
+from portal.coordination import FileLock
+from portal.search_index import strip_tags, tokenize
+from portal.storage import read_json
+
+CHUNK_CHARS = 1200
+MAX_CHUNKS = 4              # per node: long circulars are represented by their first sections
+EMBED_BATCH = 256
+STOPWORDS = frozenset("a an and are as at be by for from how in is it of on or the to what with".split())
+
+# words agents use interchangeably; each group adds one shared feature
+CONCEPTS = (
+    ("net", "internet", "data", "connectivity", "network", "signal", "4g", "5g", "3g", "apn", "browsing", "speed"),
+    ("recharge", "topup", "top", "voucher", "stv", "plan", "plans", "pack"),
+    ("balance", "enquiry", "inquiry", "check", "remaining", "validity"),
+    ("bill", "billing", "invoice", "payment", "pay", "due", "postpaid"),
+    ("sim", "card", "swap", "replacement", "lost", "duplicate", "kyc"),
+    ("call", "calls", "calling", "voice", "outgoing", "incoming", "dial"),
+    ("port", "mnp", "portability", "upc"),
+    ("complaint", "complaints", "issue", "problem", "fault", "working", "down", "error", "failed", "failure"),
+    ("landline", "wireline", "broadband", "ftth", "fiber", "fibre", "dsl"),
+    ("helpline", "help", "customer", "care", "support", "contact"),
+)
+_CONCEPT_OF = {w: i for i, group in enumerate(CONCEPTS) for w in group}
+
+
+def _replace(path, write):
+    """write(binary file) into a temp file next to path, then rename it over path."""
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _bucket(feature, dim):
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+def _normalize(m):
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32)
+
+
+# ------------------ Providers ------------------
+class HashingEmbedder:
+    """Signed feature hashing of words, in-word trigrams and concept groups; no model, no network."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        feats = {}
+        for w in tokenize(text):
+            if w in STOPWORDS:
+                continue
+            feats["w:" + w] = feats.get("w:" + w, 0) + 1.0
+            if len(w) > 3:
+                padded = f"<{w}>"
+                for i in range(len(padded) - 2):
+                    g = "g:" + padded[i:i + 3]
+                    feats[g] = feats.get(g, 0) + 0.3
+            c = _CONCEPT_OF.get(w)
+            if c is not None:
+                feats[f"c:{c}"] = feats.get(f"c:{c}", 0) + 1.5
+        return feats
+
+    def embed(self, texts):
+        m = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat, tf in self._features(text).items():
+                col, sign = _bucket(feat, self.dim)
+                m[row, col] += sign * (1.0 + math.log(tf)) if tf >= 1 else sign * tf
+        return _normalize(m)
+
+
+class OpenAIEmbedder:
+    """Remote embeddings (openai package, OPENAI_API_KEY); only texts of changed nodes are sent."""
+
+    def __init__(self, model="text-embedding-3-small"):
+        from openai import OpenAI
+        self.client = OpenAI()
+        self.model = model
+        self.name = f"openai-{model}"
+
+    def embed(self, texts):
+        out = []
+        for i in range(0, len(texts), EMBED_BATCH):
+            resp = self.client.embeddings.create(model=self.model, input=[t or " " for t in texts[i:i + EMBED_BATCH]])
+            out.extend(d.embedding for d in resp.data)
+        return _normalize(np.asarray(out, dtype=np.float32).reshape(len(texts), -1))
+
+
+def make_embedder(name=None):
+    """The provider named by `name` / PORTAL_EMBEDDINGS ("hashing" by default; "openai" if usable)."""
+    name = name or os.environ.get("PORTAL_EMBEDDINGS", "hashing")
+    if name == "openai" and importlib.util.find_spec("openai") is not None and os.environ.get("OPENAI_API_KEY"):
+        return OpenAIEmbedder(os.environ.get("PORTAL_EMBEDDING_MODEL", "text-embedding-3-small"))
+    return HashingEmbedder()
+
+
+# ------------------ Chunking ------------------
+def chunks(path, html_text):
+    """Texts embedded for one node: the title path leads every chunk of the tag-stripped content."""
+    title = " / ".join(path)
+    text = " ".join(strip_tags(html_text).split())
+    if not text:
+        return [title]
+    out = []
+    while text and len(out) < MAX_CHUNKS:
+        if len(text) <= CHUNK_CHARS:
+            piece, text = text, ""
+        else:
+            cut = text.rfind(". ", 0, CHUNK_CHARS)
+            cut = cut + 1 if cut > CHUNK_CHARS // 2 else CHUNK_CHARS
+            piece, text = text[:cut], text[cut:].lstrip()
+        out.append(f"{title}. {piece}")
+    return out
+
+
+def node_hash(path, node, content_of):
+    ref = node.get("content_ref") if isinstance(node, dict) else None
+    body = ref or hashlib.sha1(content_of(node).encode("utf-8")).hexdigest()
+    return hashlib.sha1("\x1f".join((*path, body)).encode("utf-8")).hexdigest()[:16]
+
+
+def _walk(tree, prefix=()):
+    stack = [(tuple(prefix), tree)]
+    while stack:
+        prefix, children = stack.pop()
+        if not isinstance(children, dict):
+            continue
+        for name, node in children.items():
+            path = prefix + (name,)
+            yield path, node
+            if isinstance(node, dict) and isinstance(node.get("subtopics"), dict):
+                stack.append((path, node["subtopics"]))
+
+
+# ------------------ Index ------------------
+class SemanticIndex:
+    """
+    sync(tree) brings the vectors in line with the tree (embedding only changed nodes) and saves
+    them; search(query, k) -> [(path list, score)] best first, one entry per node.
+    content_of(node) returns a node's HTML (ContentStore.content_of in the app).
+    refresh(tree, generation) syncs unless the vectors already reflect that generation (or a newer
+    one) of the tree; the check and the sync run under one lock, so concurrent callers sync once.
+    """
+
+    def __init__(self, root, embedder=None, content_of=None):
+        self.embedder = embedder or make_embedder()
+        self.folder = os.path.join(root, self.embedder.name)
+        self.content_of = content_of or (lambda node: node.get("content", "") if isinstance(node, dict) else "")
+        self._lock = threading.RLock()
+        self._file_lock = None
+        self.generation = None  # of the tree the vectors were last synced with
+        self.vectors = None     # (rows, dim) float32
+        self.rows = []          # [(path tuple, chunk no, node hash)]
+        self._view = (None, [])     # (vectors, rows) swapped as one, so a search never mixes two syncs
+        self._load()
+
+    def _load(self):
+        meta = read_json(os.path.join(self.folder, "rows.json"), None)
+        vec_file = os.path.join(self.folder, "vectors.npy")
+        if not meta or not os.path.exists(vec_file):
+            return
+        try:
+            vectors = np.load(vec_file)
+        except (OSError, ValueError):
+            return
+        if len(vectors) == len(meta["rows"]):
+            self.vectors = vectors
+            self.rows = [(tuple(p), c, h) for p, c, h in meta["rows"]]
+            self._view = (self.vectors, self.rows)
+
+    def _save(self):
+        os.makedirs(self.folder, exist_ok=True)
+        if self._file_lock is None:
+            self._file_lock = FileLock(os.path.join(self.folder, ".lock"))
+        # rows.json is compact (no indent): it is rewritten whole on every sync
+        meta = {"provider": self.embedder.name, "rows": [[list(p), c, h] for p, c, h in self.rows]}
+        with self._file_lock:
+            _replace(os.path.join(self.folder, "vectors.npy"), lambda f: np.save(f, self.vectors))
+            _replace(os.path.join(self.folder, "rows.json"),
+                     lambda f: f.write(json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")))
+
+    def sync(self, tree):
+        """Re-embed new and changed nodes, drop removed ones; returns (embedded nodes, removed nodes)."""
+        with self._lock:
+            current = {}
+            for path, node in _walk(tree):
+                current[path] = (node_hash(path, node, self.content_of), node)
+            have = {}
+            for p, _, h in self.rows:
+                have[p] = h
+            changed = [p for p, (h, _) in current.items() if have.get(p) != h]
+            gone = {p for p in have if p not in current}
+            if not changed and not gone:
+                return 0, 0
+            stale = set(changed) | gone
+            keep = [i for i, (p, _, _) in enumerate(self.rows) if p not in stale]
+            texts, new_rows = [], []
+            for p in changed:
+                h, node = current[p]
+                for n, text in enumerate(chunks(p, self.content_of(node))):
+                    texts.append(text)
+                    new_rows.append((p, n, h))
+            new_vectors = [self.embedder.embed(texts[i:i + EMBED_BATCH]) for i in range(0, len(texts), EMBED_BATCH)]
+            parts = []
+            if self.vectors is not None and keep:
+                parts.append(self.vectors[keep])
+            parts.extend(new_vectors)
+            dim = parts[0].shape[1] if parts else getattr(self.embedder, "dim", 1)
+            self.vectors = np.vstack(parts) if parts else np.zeros((0, dim), dtype=np.float32)
+            self.rows = [self.rows[i] for i in keep] + new_rows
+            self._view = (self.vectors, self.rows)
+            self._save()
+            return len(changed), len(gone)
+
+    def refresh(self, tree, generation):
+        with self._lock:
+            if self.generation is not None and generation <= self.generation:
+                return 0, 0
+            result = self.sync(tree)
+            self.generation = generation
+            return result
+
+    def refresh_later(self, tree, generation):
+        """refresh() in a daemon thread: a save does not wait for the embedding of what it changed."""
+        threading.Thread(target=self.refresh, args=(tree, generation), name="semantic-refresh", daemon=True).start()
+
+    def search(self, query, k=20):
+        vectors, rows = self._view
+        if vectors is None or not len(rows) or not query.strip():
+            return []
+        q = self.embedder.embed([query])[0]
+        scores = vectors @ q
+        depth = min(len(scores), k * MAX_CHUNKS)
+        top = np.argpartition(-scores, depth - 1)[:depth]
+        best = {}
+        for i in top[np.argsort(-scores[top])]:
+            p = rows[i][0]
+            if p not in best:
+                best[p] = float(scores[i])
+                if len(best) == k:
+                    break
+        return [(list(p), s) for p, s in best.items() if s > 0]
@@ -0,0 +1,321 @@
+# static_site.py - read-only HTML export of the portal for a plain web server (nginx) at peak
+#
+#   <out>/index.html               home: visible top-level topics in topic_order
+#   <out>/p/<page key>.html        one page per node: breadcrumb, child tiles, content, files
+#   <out>/assets/<ab>/<sha1>.<ext> uploaded files (and image thumbnails), hardlinked when possible
+#   <out>/search.html + search.json   client-side search over a prebuilt inverted index
+#   <out>/style.css                theme from settings (colors, font)
+#   <out>/.export.json             per page: fingerprint, assets, search entry (drives re-exports)
+#
+# Re-exporting rewrites only pages whose fingerprint changed: title path, icon, content, child
+# tiles, attached files, site title or TEMPLATE_VERSION. Every file is written to a temp name and
+# renamed, so the server never sees a half-written page.
+#
+#   python -m portal.static_site <out dir>
+import hashlib
+import html
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import Counter
+
+from portal.blob_store import page_key
+from portal.bulk import ordered_names
+from portal.content_store import inline_content
+from portal.search_index import strip_tags, tokenize
+from portal.storage import atomic_write_json, read_json
+
+TEMPLATE_VERSION = 2        # bump when the page markup or search entries change, to rewrite every page
+SNIPPET_CHARS = 160
+MAX_TERMS_PER_PAGE = 2000
+IMAGE_EXTS = ("png", "jpg", "jpeg")
+FONTS = {
+    "Sans": "Segoe UI, Tahoma, Geneva, Verdana, sans-serif",
+    "Serif": "Georgia, 'Times New Roman', Times, serif",
+    "Monospace": "Menlo, Monaco, Consolas, 'Courier New', monospace",
+}
+
+
+def _write_text(path, text):
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _place(src, dest):
+    """Put a copy of src at dest (hardlink if the filesystem allows); False if src is missing."""
+    if os.path.exists(dest):
+        return False
+    if not os.path.exists(src):
+        return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = dest + ".part"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+    return True
+
+
+def page_url(path):
+    return f"p/{page_key(path)}.html" if path else "index.html"
+
+
+def visible_pages(tree, settings):
+    """(path, node, ordered child names) for home and every page under a visible top-level topic."""
+    visible = settings.get("visible_sections", {})
+    sub_order = settings.get("subtopic_order", {})
+    top = [t for t in ordered_names(tree, settings.get("topic_order", [])) if visible.get(t, True) is not False]
+    yield [], {"subtopics": tree}, top
+    stack = [[t] for t in reversed(top)]
+    while stack:
+        path = stack.pop()
+        parent = tree
+        node = None
+        for step in path:
+            node = parent.get(step)
+            parent = node.get("subtopics", {}) if isinstance(node, dict) else {}
+        children = node.get("subtopics") if isinstance(node, dict) else None
+        names = ordered_names(children, sub_order.get(path[-1], [])) if isinstance(children, dict) else []
+        yield path, node if isinstance(node, dict) else {}, names
+        stack.extend(path + [n] for n in reversed(names))
+
+
+class SiteExporter:
+    """
+    export(tree, settings) writes or refreshes the site under out_dir and returns counts.
+    bodies: ContentStore; blobs: BlobStore (or None); render(html) -> html for page content;
+    thumbnail(path, digest) -> path of a small image variant (or None to use the original).
+    """
+
+    def __init__(self, out_dir, bodies, blobs=None, render=None, thumbnail=None, default_icon="📘"):
+        self.out_dir = out_dir
+        self.bodies = bodies
+        self.blobs = blobs
+        self.render = render or (lambda text: text)
+        self.thumbnail = thumbnail
+        self.default_icon = default_icon
+        self.manifest_file = os.path.join(out_dir, ".export.json")
+
+    # ------------------ Fingerprints ------------------
+    def _files(self, path):
+        return self.blobs.list_files(path) if (self.blobs is not None and path) else []
+
+    def _fingerprint(self, site, path, node, children, files):
+        content = node.get("content_ref") or hashlib.sha1(inline_content(node).encode("utf-8")).hexdigest()
+        tiles = [(n, (children.get(n) or {}).get("icon") if isinstance(children.get(n), dict) else None)
+                 for n in children]
+        listed = [(name, e["blob"]) for name, _, e in files]
+        raw = json.dumps([TEMPLATE_VERSION, site, path, node.get("icon"), content, tiles, listed], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    # ------------------ Markup ------------------
+    def _page(self, site_title, path, node, names, files, pre):
+        esc = html.escape
+        crumbs = [f'<a href="{pre}index.html">🏠 Home</a>']
+        for i in range(len(path)):
+            crumbs.append(f'<a href="{pre}{page_url(path[:i + 1])}">{esc(path[i])}</a>')
+        children = node.get("subtopics", {}) if isinstance(node.get("subtopics"), dict) else {}
+        tiles = []
+        for name in names:
+            child = children.get(name)
+            icon = child.get("icon", self.default_icon) if isinstance(child, dict) else self.default_icon
+            tiles.append(f'<a class="tile" href="{pre}{page_url(path + [name])}">{esc(icon)} {esc(name)}</a>')
+        content = self.bodies.content_of(node, cache=False) if path else ""
+        gallery, assets = [], []
+        for name, fp, entry in files:
+            ext = entry.get("ext", "bin")
+            asset = f"assets/{entry['blob'][:2]}/{entry['blob']}.{ext}"
+            _place(fp, os.path.join(self.out_dir, asset))
+            assets.append(asset)
+            if ext in IMAGE_EXTS:
+                thumb = self.thumbnail(fp, entry["blob"]) if self.thumbnail else None
+                shown = asset
+                if thumb and thumb != fp:
+                    shown = f"assets/thumbs/{os.path.basename(thumb)}"
+                    _place(thumb, os.path.join(self.out_dir, shown))
+                    assets.append(shown)
+                gallery.append(f'<a href="{pre}{asset}"><img src="{pre}{shown}" width="120" loading="lazy" '
+                               f'alt="{esc(name)}"></a>')
+            else:
+                gallery.append(f'<a class="file" href="{pre}{asset}" download="{esc(name)}">📄 {esc(name)}</a>')
+        label = " / ".join(path) if path else "🏠 Home"
+        parts = [
+            "<!doctype html>",
+            '<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">',
+            f"<title>{esc(label)} · {esc(site_title)}</title>",
+            f'<link rel="stylesheet" href="{pre}style.css"></head><body>',
+            f'<header><a class="site" href="{pre}index.html">{esc(site_title)}</a>'
+            f'<form action="{pre}search.html"><input name="q" placeholder="🔍 Search" aria-label="Search"></form></header>',
+            f'<nav class="crumbs">{" › ".join(crumbs)}</nav>',
+            f"<h2>{esc(label)}</h2>",
+        ]
+        if tiles:
+            parts.append(f'<div class="tiles">{"".join(tiles)}</div>')
+        if content:
+            parts.append(f'<hr><article>{self.render(content)}</article>')
+        if gallery:
+            parts.append(f'<hr><section class="files">{"".join(gallery)}</section>')
+        parts.append("</body></html>")
+        return "\n".join(parts), content, assets
+
+    def _search_entry(self, path, content, files):
+        text = strip_tags(content)
+        snippet = " ".join(text.split())[:SNIPPET_CHARS]
+        # title and file-name words always; on long pages the body's most frequent words fill the rest
+        terms = set(tokenize(" ".join(path))) | set(tokenize(" ".join(n for n, _, _ in files)))
+        body = Counter(t for t in tokenize(text) if t not in terms)
+        room = max(0, MAX_TERMS_PER_PAGE - len(terms))
+        terms.update(t for t, _ in sorted(body.items(), key=lambda kv: (-kv[1], kv[0]))[:room])
+        return {"l": " → ".join(path), "u": page_url(path), "s": snippet, "t": sorted(terms)}
+
+    # ------------------ Export ------------------
+    def export(self, tree, settings, progress=None):
+        old = read_json(self.manifest_file, {})
+        if old.get("version") != TEMPLATE_VERSION:
+            old = {}
+        pages_before = old.get("pages", {})
+        site_title = settings.get("header_title", "📘 BSNL KNOWLEDGE PORTAL MRM")
+        site = [site_title]
+        pages = {}
+        stats = {"pages": 0, "written": 0, "unchanged": 0, "removed": 0}
+        for path, node, names in visible_pages(tree, settings):
+            key = page_url(path)
+            files = self._files(path)
+            children = node.get("subtopics", {}) if isinstance(node.get("subtopics"), dict) else {}
+            fp = self._fingerprint(site, path, node, {n: children.get(n) for n in names}, files)
+            prev = pages_before.get(key)
+            stats["pages"] += 1
+            if prev and prev["fp"] == fp and os.path.exists(os.path.join(self.out_dir, key)):
+                pages[key] = prev
+                stats["unchanged"] += 1
+            else:
+                markup, content, assets = self._page(site_title, path, node, names, files, "../" if path else "")
+                _write_text(os.path.join(self.out_dir, key), markup)
+                pages[key] = {"fp": fp, "assets": assets,
+                              "search": self._search_entry(path, content, files) if path else None}
+                stats["written"] += 1
+            if progress and stats["pages"] % 200 == 0:
+                progress(stats["pages"])
+        for key in pages_before:
+            if key not in pages:
+                try:
+                    os.remove(os.path.join(self.out_dir, key))
+                except OSError:
+                    pass
+                stats["removed"] += 1
+        self._prune_assets(pages)
+        _write_text(os.path.join(self.out_dir, "style.css"), stylesheet(settings))
+        if stats["written"] or stats["removed"] or not os.path.exists(os.path.join(self.out_dir, "search.json")):
+            atomic_write_json(os.path.join(self.out_dir, "search.json"), search_index(pages))
+            _write_text(os.path.join(self.out_dir, "search.html"), SEARCH_PAGE.replace("{title}", html.escape(site_title)))
+        atomic_write_json(self.manifest_file, {"version": TEMPLATE_VERSION, "pages": pages})
+        if progress:
+            progress(stats["pages"])
+        return stats
+
+    def _prune_assets(self, pages):
+        keep = {a for p in pages.values() for a in p.get("assets", [])}
+        root = os.path.join(self.out_dir, "assets")
+        for dirpath, _, names in os.walk(root):
+            for fn in names:
+                rel = os.path.relpath(os.path.join(dirpath, fn), self.out_dir).replace(os.sep, "/")
+                if rel not in keep:
+                    os.remove(os.path.join(dirpath, fn))
+
+
+def search_index(pages):
+    """{"docs": [[label, url, snippet]], "terms": {term: [doc numbers]}} for search.html."""
+    docs, terms = [], {}
+    for entry in pages.values():
+        s = entry.get("search")
+        if not s:
+            continue
+        n = len(docs)
+        docs.append([s["l"], s["u"], s["s"]])
+        for t in s["t"]:
+            terms.setdefault(t, []).append(n)
+    return {"docs": docs, "terms": dict(sorted(terms.items()))}
+
+
+def stylesheet(settings):
+    font = FONTS.get(settings.get("font_family", "Sans"), FONTS["Sans"])
+    bg = settings.get("background_color", "#0f1720")
+    color = settings.get("font_color", "#e6eef6")
+    size = settings.get("font_size", 16)
+    return f"""body{{background:{bg};color:{color};font-family:{font};font-size:{size}px;margin:0 auto;max-width:1100px;padding:0 16px 40px}}
+h1,h2,h3,h4,h5,h6{{color:{color}}}
+a{{color:#4ea8ff}}
+header{{display:flex;justify-content:space-between;align-items:center;padding:16px 0;gap:16px;flex-wrap:wrap}}
+header .site{{font-size:1.4em;font-weight:700;text-decoration:none;color:{color}}}
+header input{{padding:6px 10px;border-radius:6px;border:1px solid #888;min-width:220px}}
+.crumbs{{opacity:.8;margin-bottom:8px}}
+.tiles{{display:grid;grid-template-columns:repeat(auto-fill,minmax(200px,1fr));gap:10px}}
+.tile{{display:block;padding:12px;border-radius:10px;border:1px solid rgba(128,128,128,.4);text-decoration:none;color:{color}}}
+.files{{display:flex;flex-wrap:wrap;gap:12px;align-items:center}}
+.files img{{border-radius:6px}}
+.hit{{margin:12px 0}} .hit small{{display:block;opacity:.75}}
+"""
+
+
+SEARCH_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Search · {title}</title><link rel="stylesheet" href="style.css"></head><body>
+<header><a class="site" href="index.html">{title}</a>
+<form action="search.html"><input id="q" name="q" placeholder="🔍 Search" aria-label="Search" autofocus></form></header>
+<div id="hits"></div>
+<script>
+let INDEX = null, KEYS = null;
+function tokens(s) { return (s.toLowerCase().match(/[\\p{L}\\p{N}_]+/gu) || []); }
+function docsFor(tok) {
+  // exact term, else every term it prefixes (binary search over the sorted vocabulary)
+  if (INDEX.terms[tok]) return new Set(INDEX.terms[tok]);
+  let lo = 0, hi = KEYS.length;
+  while (lo < hi) { const mid = (lo + hi) >> 1; if (KEYS[mid] < tok) lo = mid + 1; else hi = mid; }
+  const out = new Set();
+  for (let i = lo; i < KEYS.length && KEYS[i].startsWith(tok) && i < lo + 50; i++) INDEX.terms[KEYS[i]].forEach(d => out.add(d));
+  return out;
+}
+function run(q) {
+  const box = document.getElementById("hits"); box.innerHTML = "";
+  let hits = null;
+  for (const t of tokens(q)) { const d = docsFor(t); hits = hits === null ? d : new Set([...hits].filter(x => d.has(x))); }
+  if (!hits || hits.size === 0) { box.textContent = q ? "No matches." : ""; return; }
+  [...hits].slice(0, 50).forEach(n => {
+    const [label, url, snippet] = INDEX.docs[n];
+    const div = document.createElement("div"); div.className = "hit";
+    const a = document.createElement("a"); a.href = url; a.textContent = label;
+    const small = document.createElement("small"); small.textContent = snippet;
+    div.append(a, small); box.append(div);
+  });
+}
+const q = new URLSearchParams(location.search).get("q") || "";
+document.getElementById("q").value = q;
+fetch("search.json").then(r => r.json()).then(j => { INDEX = j; KEYS = Object.keys(j.terms); run(q); });
+document.getElementById("q").addEventListener("input", e => INDEX && run(e.target.value));
+</script>
+</body></html>
+"""
+
+
+if __name__ == "__main__":
+    from portal.blob_store import BlobStore
+    from portal.bulk import open_data
+    from portal.render_cache import RenderCache
+    if len(sys.argv) != 2:
+        print("usage: python -m portal.static_site <out dir>")
+        sys.exit(2)
+    store, bodies = open_data()
+    exporter = SiteExporter(sys.argv[1], bodies, BlobStore("uploads"), render=RenderCache().render)
+    print(json.dumps(exporter.export(store.get("sections", {}), store.get("settings", {}))))
@@ -0,0 +1,415 @@
+# storage.py - pluggable persistence for sections / settings / users / announcements
+#
+#   JsonStore   - one JSON file per collection (fallback backend, also the import/export format)
+#   SqliteStore - one SQLite database in WAL mode; nodes, settings keys, users and announcements
+#                 are rows, and an edit touches only the rows that changed, inside one transaction
+#
+# Both expose the same calls: load / save / stamp, plus per-node save_node / rename_node / delete_node,
+# and lock(name): a cross-process lock StoreCache holds around each read-modify-write.
+# Run `python -m portal.storage export|import` to move data between portal.db and the JSON files.
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+from portal.coordination import FileLock
+
+COLLECTIONS = ("sections", "users", "settings", "announcements")
+
+DEFAULT_FILES = {
+    "sections": "bsnl_data.json",
+    "users": "users.json",
+    "settings": "settings.json",
+    "announcements": "announcements.json",
+}
+
+
+def atomic_write_json(path, data):
+    """Write to a temp file in the same folder, fsync, then rename over the target."""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+# ------------------ JSON files ------------------
+class JsonStore:
+    """
+    Next to each file: <file>.lock (advisory lock for writers) and <file>.gen, a counter every
+    save bumps, so other processes see a change even when mtime and size happen to match.
+    """
+
+    backend = "json"
+
+    def __init__(self, files=None):
+        self.files = dict(DEFAULT_FILES, **(files or {}))
+        self._locks = {name: FileLock(path + ".lock") for name, path in self.files.items()}
+
+    def lock(self, name):
+        return self._locks[name]
+
+    def load(self, name, default):
+        return read_json(self.files[name], default)
+
+    def _generation(self, name):
+        try:
+            with open(self.files[name] + ".gen", "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def save(self, name, data):
+        atomic_write_json(self.files[name], data)
+        gen_file = self.files[name] + ".gen"
+        fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".gen", dir=os.path.dirname(os.path.abspath(gen_file)))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(str(self._generation(name) + 1))
+        os.replace(tmp, gen_file)
+
+    def stamp(self, name):
+        try:
+            st_ = os.stat(self.files[name])
+        except OSError:
+            return None
+        # the file's own mtime/size still catch hand edits that do not touch the counter
+        return (self._generation(name), st_.st_mtime_ns, st_.st_size)
+
+    # a JSON file can only be rewritten whole
+    def save_node(self, name, tree, path):
+        self.save(name, tree)
+
+    def rename_node(self, name, tree, old_path, new_path):
+        self.save(name, tree)
+
+    def delete_node(self, name, tree, path):
+        self.save(name, tree)
+
+
+# ------------------ SQLite ------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER NOT NULL,          -- 0 for top-level topics
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    has_subtopics INTEGER NOT NULL DEFAULT 1,
+    data TEXT NOT NULL,                  -- node dict without "subtopics" (JSON)
+    UNIQUE(parent_id, name)
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS announcements (
+    position INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _dumps(v):
+    return json.dumps(v, ensure_ascii=False, sort_keys=True)
+
+
+def _node_row(node):
+    """(has_subtopics, data JSON) for a node value from the sections tree."""
+    if isinstance(node, dict):
+        body = {k: v for k, v in node.items() if k != "subtopics"}
+        return (1 if "subtopics" in node else 0), _dumps(body)
+    return 0, _dumps({"__value__": node})
+
+
+def _node_value(has_subtopics, data):
+    body = json.loads(data)
+    if set(body) == {"__value__"}:
+        return body["__value__"]
+    if has_subtopics:
+        body["subtopics"] = {}
+    return body
+
+
+class SqliteStore:
+    backend = "sqlite"
+
+    def __init__(self, db_path, files=None):
+        self.db_path = db_path
+        self.files = dict(DEFAULT_FILES, **(files or {}))
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(db_path + ".lock")
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+        for name in COLLECTIONS:
+            self._conn.execute("INSERT OR IGNORE INTO meta(name, generation) VALUES (?, 0)", (name,))
+
+    def lock(self, name):
+        # the meta generations already tell processes apart; this only orders read-modify-write
+        return self._file_lock
+
+    # ---- transactions ----
+    def _tx(self, name):
+        return _Transaction(self, name)
+
+    def stamp(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT generation FROM meta WHERE name=?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def is_empty(self):
+        with self._lock:
+            return all(self.stamp(name) == 0 for name in COLLECTIONS)
+
+    # ---- whole collections ----
+    def load(self, name, default):
+        with self._lock:
+            if self.stamp(name) == 0:
+                return default
+            return getattr(self, f"_load_{name}")()
+
+    def save(self, name, data):
+        with self._lock, self._tx(name) as cur:
+            getattr(self, f"_save_{name}")(cur, data)
+
+    def _load_sections(self):
+        rows = self._conn.execute(
+            "SELECT id, parent_id, name, has_subtopics, data FROM nodes ORDER BY parent_id, position"
+        ).fetchall()
+        by_id = {0: {"subtopics": {}}}
+        pending = []
+        for nid, parent_id, name, has_subs, data in rows:
+            by_id[nid] = _node_value(has_subs, data)
+            pending.append((nid, parent_id, name))
+        for nid, parent_id, name in pending:
+            parent = by_id.get(parent_id)
+            if isinstance(parent, dict):
+                parent.setdefault("subtopics", {})[name] = by_id[nid]
+        return by_id[0]["subtopics"]
+
+    def _save_sections(self, cur, tree):
+        """Diff the tree against the stored rows; write only rows that changed."""
+        existing = {}
+        for nid, parent_id, name, position, has_subs, data in cur.execute(
+                "SELECT id, parent_id, name, position, has_subtopics, data FROM nodes"):
+            existing[(parent_id, name)] = (nid, position, has_subs, data)
+        seen = set()
+
+        def walk(children, parent_id):
+            for position, (name, node) in enumerate(children.items()):
+                has_subs, data = _node_row(node)
+                old = existing.get((parent_id, name))
+                if old is None:
+                    nid = cur.execute(
+                        "INSERT INTO nodes(parent_id, name, position, has_subtopics, data) VALUES (?,?,?,?,?)",
+                        (parent_id, name, position, has_subs, data)).lastrowid
+                else:
+                    nid = old[0]
+                    if old[1:] != (position, has_subs, data):
+                        cur.execute("UPDATE nodes SET position=?, has_subtopics=?, data=? WHERE id=?",
+                                    (position, has_subs, data, nid))
+                seen.add(nid)
+                if isinstance(node, dict) and isinstance(node.get("subtopics"), dict):
+                    walk(node["subtopics"], nid)
+
+        walk(tree if isinstance(tree, dict) else {}, 0)
+        stale = [(v[0],) for v in existing.values() if v[0] not in seen]
+        cur.executemany("DELETE FROM nodes WHERE id=?", stale)
+
+    def _load_settings(self):
+        return {k: json.loads(v) for k, v in self._conn.execute("SELECT key, value FROM settings")}
+
+    def _save_settings(self, cur, data):
+        existing = dict(cur.execute("SELECT key, value FROM settings").fetchall())
+        for k, v in data.items():
+            val = _dumps(v)
+            if existing.get(k) != val:
+                cur.execute("INSERT OR REPLACE INTO settings(key, value) VALUES (?, ?)", (k, val))
+        cur.executemany("DELETE FROM settings WHERE key=?", [(k,) for k in existing if k not in data])
+
+    def _load_users(self):
+        return {u: json.loads(d) for u, d in self._conn.execute("SELECT username, data FROM users ORDER BY position")}
+
+    def _save_users(self, cur, data):
+        existing = {u: (p, d) for u, p, d in cur.execute("SELECT username, position, data FROM users")}
+        for position, (u, info) in enumerate(data.items()):
+            row = (position, _dumps(info))
+            if existing.get(u) != row:
+                cur.execute("INSERT OR REPLACE INTO users(username, position, data) VALUES (?, ?, ?)", (u,) + row)
+        cur.executemany("DELETE FROM users WHERE username=?", [(u,) for u in existing if u not in data])
+
+    def _load_announcements(self):
+        return [json.loads(d) for (d,) in self._conn.execute("SELECT data FROM announcements ORDER BY position")]
+
+    def _save_announcements(self, cur, data):
+        existing = dict(cur.execute("SELECT position, data FROM announcements").fetchall())
+        for position, item in enumerate(data):
+            val = _dumps(item)
+            if existing.get(position) != val:
+                cur.execute("INSERT OR REPLACE INTO announcements(position, data) VALUES (?, ?)", (position, val))
+        cur.execute("DELETE FROM announcements WHERE position >= ?", (len(data),))
+
+    # ---- single nodes ----
+    def _node_id(self, cur, path):
+        nid = 0
+        for name in path:
+            row = cur.execute("SELECT id FROM nodes WHERE parent_id=? AND name=?", (nid, name)).fetchone()
+            if row is None:
+                return None
+            nid = row[0]
+        return nid
+
+    def save_node(self, name, tree, path):
+        """Insert or update the row for one node (its own fields, not its children)."""
+        path = list(path)
+        if not path:
+            return
+        siblings, node = tree, None
+        for i, step in enumerate(path):
+            if i:
+                siblings = node_children(node)
+            if step not in siblings:
+                return  # not part of the stored tree (e.g. the synthetic home node)
+            node = siblings[step]
+        with self._lock, self._tx(name) as cur:
+            parent_id = self._node_id(cur, path[:-1])
+            if parent_id is None:
+                # parent row missing (should not happen) - fall back to a full diff
+                self._save_sections(cur, tree)
+                return
+            has_subs, data = _node_row(node)
+            row = cur.execute("SELECT id FROM nodes WHERE parent_id=? AND name=?", (parent_id, path[-1])).fetchone()
+            if row:
+                cur.execute("UPDATE nodes SET has_subtopics=?, data=? WHERE id=?", (has_subs, data, row[0]))
+            else:
+                position = list(siblings).index(path[-1]) if path[-1] in siblings else 0
+                nid = cur.execute(
+                    "INSERT INTO nodes(parent_id, name, position, has_subtopics, data) VALUES (?,?,?,?,?)",
+                    (parent_id, path[-1], position, has_subs, data)).lastrowid
+                # a new node may arrive with children already attached
+                if isinstance(node, dict) and node.get("subtopics"):
+                    self._insert_subtree(cur, node["subtopics"], nid)
+
+    def _insert_subtree(self, cur, children, parent_id):
+        for position, (name, node) in enumerate(children.items()):
+            has_subs, data = _node_row(node)
+            nid = cur.execute(
+                "INSERT INTO nodes(parent_id, name, position, has_subtopics, data) VALUES (?,?,?,?,?)",
+                (parent_id, name, position, has_subs, data)).lastrowid
+            if isinstance(node, dict) and node.get("subtopics"):
+                self._insert_subtree(cur, node["subtopics"], nid)
+
+    def rename_node(self, name, tree, old_path, new_path):
+        with self._lock, self._tx(name) as cur:
+            nid = self._node_id(cur, old_path)
+            if nid is None:
+                self._save_sections(cur, tree)
+                return
+            try:
+                cur.execute("UPDATE nodes SET name=? WHERE id=?", (list(new_path)[-1], nid))
+            except sqlite3.IntegrityError:
+                # renamed onto an existing sibling: let the diff sort out which rows survive
+                self._save_sections(cur, tree)
+
+    def delete_node(self, name, tree, path):
+        with self._lock, self._tx(name) as cur:
+            nid = self._node_id(cur, path)
+            if nid is None:
+                return
+            cur.execute("""
+                WITH RECURSIVE sub(id) AS (
+                    SELECT ? UNION ALL SELECT nodes.id FROM nodes JOIN sub ON nodes.parent_id = sub.id
+                )
+                DELETE FROM nodes WHERE id IN (SELECT id FROM sub)""", (nid,))
+
+    # ---- JSON import / export ----
+    def import_json(self, files=None):
+        files = dict(self.files, **(files or {}))
+        defaults = {"sections": {}, "users": {}, "settings": {}, "announcements": []}
+        for name in COLLECTIONS:
+            if os.path.exists(files[name]):
+                self.save(name, read_json(files[name], defaults[name]))
+
+    def export_json(self, files=None):
+        files = dict(self.files, **(files or {}))
+        defaults = {"sections": {}, "users": {}, "settings": {}, "announcements": []}
+        for name in COLLECTIONS:
+            atomic_write_json(files[name], self.load(name, defaults[name]))
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, bumping the collection's generation in the same transaction."""
+
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def __enter__(self):
+        self.cur = self.store._conn.cursor()
+        self.cur.execute("BEGIN IMMEDIATE")
+        return self.cur
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.cur.execute("UPDATE meta SET generation = generation + 1 WHERE name=?", (self.name,))
+            self.cur.execute("COMMIT")
+        else:
+            self.cur.execute("ROLLBACK")
+        return False
+
+
+def node_children(node):
+    return node.get("subtopics", {}) if isinstance(node, dict) else {}
+
+
+def open_store(backend="sqlite", db_path="portal.db", files=None):
+    """Open the configured backend. A new SQLite database is seeded from the JSON files."""
+    if backend == "json":
+        return JsonStore(files)
+    try:
+        store = SqliteStore(db_path, files)
+    except sqlite3.Error:
+        return JsonStore(files)
+    if store.is_empty():
+        store.import_json()
+    return store
+
+
+if __name__ == "__main__":
+    # python -m portal.storage export [db]  -> write portal.db contents to the JSON files
+    # python -m portal.storage import [db]  -> replace portal.db contents with the JSON files
+    if len(sys.argv) < 2 or sys.argv[1] not in ("export", "import"):
+        print("usage: python -m portal.storage export|import [portal.db]")
+        sys.exit(2)
+    s = SqliteStore(sys.argv[2] if len(sys.argv) > 2 else "portal.db")
+    s.export_json() if sys.argv[1] == "export" else s.import_json()
+    print(f"{sys.argv[1]} done")
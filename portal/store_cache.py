@@ -0,0 +1,178 @@
+# store_cache.py - one loaded copy of each collection per process, revalidated by the store's change stamp
+import json
+import threading
+import time
+
+from portal.coordination import copy_path, drop_node, graft_node, merge3, move_node
+
+
+class StoreCache:
+    """
+    Holds the loaded collections (sections, users, settings, announcements) for every session of this process.
+
+    - get(name, default): cached object; the backend's stamp (mtime/size for JSON files, a generation
+      counter for SQLite) is checked at most once per `revalidate_every` seconds, process-wide, and the
+      collection is re-loaded only if the stamp changed.
+    - save(name, data) / save_node / rename_node / delete_node: write through the backend under the
+      store's cross-process lock and make `data` the cached copy (no re-read). If another process
+      wrote the collection since we loaded it, our edit is merged onto its copy instead of replacing
+      it (three-way merge for whole collections, the single-node edit replayed for node calls);
+      the write calls return whatever became the cached copy.
+      Pass base= (the object get() returned that the edited copy was made from): if another
+      session of this process saved the collection since, the edit is merged or replayed onto
+      that newer copy the same way instead of dropping it.
+    - replace(name, data): write `data` as is, whatever is stored; bumps version like a reload.
+    - version(name): bumps only when a collection was re-loaded because it changed underneath us,
+      so derived structures (search index ...) rebuild only then.
+    - generation(name): bumps on every change (reload or write), for "has anything changed" checks.
+    - stats(): how often the backend was asked for a stamp, re-loaded, written and found changed
+      under a write (merges), since startup.
+
+    Returned objects are shared between sessions and must not be edited in place: edit a copy
+    (copy.deepcopy, or coordination.copy_path for the path of a sections edit) and publish it
+    through the write calls, which make it the cached copy.
+    """
+
+    # collections too big to snapshot on every load; a stale whole-collection save of these wins as is
+    UNMERGED = ("sections",)
+
+    def __init__(self, store, revalidate_every=1.0):
+        self.store = store
+        self.revalidate_every = revalidate_every
+        self._lock = threading.RLock()
+        self._entries = {}   # name -> dict(data, base, stamp, checked, version, generation)
+        self.marks = {}      # free-form "already done for this version" markers used by the app
+        self.counts = {"stamp_checks": 0, "loads": 0, "writes": 0, "merges": 0}
+
+    def get(self, name, default=None):
+        now = time.monotonic()
+        with self._lock:
+            e = self._entries.get(name)
+            if e is not None and now - e["checked"] < self.revalidate_every:
+                return e["data"]
+            stamp = self.store.stamp(name)
+            self.counts["stamp_checks"] += 1
+            if e is not None:
+                e["checked"] = now
+                if stamp == e["stamp"]:
+                    return e["data"]
+            return self._load(name, default, stamp, now)
+
+    def _snapshot(self, name, data):
+        # what save() merges against later; callers save edited copies, never the cached object
+        return None if name in self.UNMERGED else json.loads(json.dumps(data))
+
+    def _load(self, name, default, stamp, now):
+        data = self.store.load(name, default)
+        self.counts["loads"] += 1
+        e = self._entries.get(name)
+        if e is None:
+            e = self._entries[name] = {"version": 0, "generation": 0}
+        e.update(data=data, base=self._snapshot(name, data), stamp=stamp, checked=now)
+        e["version"] += 1
+        e["generation"] += 1
+        return data
+
+    def _stale(self, name):
+        """The entry if another process wrote `name` since we loaded or wrote it, else None."""
+        e = self._entries.get(name)
+        if e is not None and self.store.stamp(name) != e["stamp"]:
+            self.counts["merges"] += 1
+            return e
+        return None
+
+    def _written(self, name, data, reloaded=False):
+        e = self._entries.setdefault(name, {"version": 1, "generation": 0})
+        e.update(data=data, base=self._snapshot(name, data), stamp=self.store.stamp(name), checked=time.monotonic())
+        if reloaded:
+            e["version"] += 1   # the tree now carries edits derived structures have not seen
+        e["generation"] += 1
+        self.counts["writes"] += 1
+        return data
+
+    def save(self, name, data, base=None):
+        with self._lock, self.store.lock(name):
+            e = self._stale(name)
+            if e is not None and e.get("base") is not None:
+                theirs = self.store.load(name, None)
+                if theirs is not None:
+                    data = merge3(base if base is not None else e["base"], data, theirs)
+            elif e is None and name not in self.UNMERGED:
+                current = self._moved_on(name, base)
+                if current is not None:
+                    data = merge3(base, data, current)
+            self.store.save(name, data)
+            return self._written(name, data, reloaded=e is not None)
+
+    def _moved_on(self, name, base):
+        """The cached copy if another session of this process saved `name` since `base` was handed out."""
+        e = self._entries.get(name)
+        if base is None or e is None or e["data"] is base:
+            return None
+        self.counts["merges"] += 1
+        return e["data"]
+
+    def _fresh_tree(self, name, tree):
+        fresh = self.store.load(name, None)
+        return fresh if isinstance(fresh, dict) else tree
+
+    def _replay_target(self, name, tree, base, parent):
+        """
+        (tree to apply a node edit to, reloaded) - ours as is when nothing else was saved since base;
+        else a fresh load (another process wrote) or a copy of the cached tree along `parent`.
+        """
+        if self._stale(name) is not None:
+            return self._fresh_tree(name, tree), True
+        current = self._moved_on(name, base)
+        if current is None:
+            return tree, False
+        return copy_path(current, parent), False
+
+    def save_node(self, name, tree, path, base=None):
+        with self._lock, self.store.lock(name):
+            fresh, reloaded = self._replay_target(name, tree, base, path[:-1])
+            if fresh is not tree:
+                graft_node(fresh, tree, path)
+            self.store.save_node(name, fresh, path)
+            return self._written(name, fresh, reloaded=reloaded)
+
+    def rename_node(self, name, tree, old_path, new_path, base=None):
+        with self._lock, self.store.lock(name):
+            fresh, reloaded = self._replay_target(name, tree, base, old_path[:-1])
+            if fresh is not tree and not move_node(fresh, old_path, new_path):
+                # renamed or deleted elsewhere meanwhile: keep their tree untouched
+                return self._written(name, fresh, reloaded=True)
+            self.store.rename_node(name, fresh, old_path, new_path)
+            return self._written(name, fresh, reloaded=reloaded)
+
+    def delete_node(self, name, tree, path, base=None):
+        with self._lock, self.store.lock(name):
+            fresh, reloaded = self._replay_target(name, tree, base, path[:-1])
+            if fresh is not tree:
+                drop_node(fresh, path)
+            self.store.delete_node(name, fresh, path)
+            return self._written(name, fresh, reloaded=reloaded)
+
+    def replace(self, name, data):
+        """Write `data` as is, without merging what another process stored (restoring a backup)."""
+        with self._lock, self.store.lock(name):
+            self.store.save(name, data)
+            return self._written(name, data, reloaded=True)
+
+    def touch(self, name):
+        """Bump version(name) after an edit too large to patch derived structures for (bulk import)."""
+        with self._lock:
+            e = self._entries.get(name)
+            if e is not None:
+                e["version"] += 1
+
+    def version(self, name):
+        e = self._entries.get(name)
+        return e["version"] if e else 0
+
+    def generation(self, name):
+        e = self._entries.get(name)
+        return e["generation"] if e else 0
+
+    def stats(self):
+        return dict(self.counts)
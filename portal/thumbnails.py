@@ -0,0 +1,127 @@
+# thumbnails.py - downscaled, content-hash-named image variants for tiles, galleries and logos
+import hashlib
+import os
+import tempfile
+import threading
+
+# Pillow ships with streamlit, but keep the portal working (full-size images) without it.
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except Exception:
+    PIL_AVAILABLE = False
+
+IMAGE_EXTS = ("png", "jpg", "jpeg")
+CHUNK = 1024 * 1024
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ThumbnailCache:
+    """
+    thumbnail(path, px) returns a file no larger than px x px, named <sha1-of-original>_<px>.<ext>
+    inside cache_dir. Variants are made on upload (make) or lazily on first view, so identical
+    images share them and an edited image never hits a stale one. evict(path) drops an original's
+    variants; prune(keep_hashes) drops every variant whose original is gone.
+    """
+
+    def __init__(self, cache_dir, sizes=(240,)):
+        self.cache_dir = cache_dir
+        self.sizes = tuple(sizes)
+        self._lock = threading.Lock()
+        self._hashes = {}   # path -> ((mtime_ns, size), sha1)
+
+    def _hash(self, path):
+        st_ = os.stat(path)
+        stamp = (st_.st_mtime_ns, st_.st_size)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = file_sha1(path)
+        with self._lock:
+            self._hashes[path] = (stamp, digest)
+        return digest
+
+    def _variant_path(self, digest, px, ext):
+        return os.path.join(self.cache_dir, f"{digest}_{px}.{ext}")
+
+    @staticmethod
+    def is_image(path):
+        return path.rsplit(".", 1)[-1].lower() in IMAGE_EXTS
+
+    def thumbnail(self, path, px=None, digest=None):
+        """Path of the px-bounded variant of image `path` (the original if it cannot be made)."""
+        px = px or self.sizes[0]
+        if not PIL_AVAILABLE or not self.is_image(path):
+            return path
+        try:
+            digest = digest or self._hash(path)
+            ext = "png" if path.lower().endswith(".png") else "jpg"
+            out = self._variant_path(digest, px, ext)
+            if not os.path.exists(out):
+                self._render(path, out, px)
+            return out
+        except Exception:
+            return path
+
+    def make(self, path, digest=None):
+        """Pre-generate every configured size (call right after an upload)."""
+        for px in self.sizes:
+            self.thumbnail(path, px, digest)
+
+    def _render(self, src, out, px):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with Image.open(src) as im:
+            im.thumbnail((px, px))
+            if out.endswith(".jpg") and im.mode not in ("RGB", "L"):
+                im = im.convert("RGB")
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            os.close(fd)
+            try:
+                im.save(tmp, format="PNG" if out.endswith(".png") else "JPEG", optimize=True)
+                os.replace(tmp, out)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+    def evict(self, path, digest=None):
+        """Remove all cached variants of an original (call before deleting it)."""
+        try:
+            digest = digest or self._hash(path)
+        except OSError:
+            cached = self._hashes.get(path)
+            if not cached:
+                return
+            digest = cached[1]
+        with self._lock:
+            self._hashes.pop(path, None)
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(digest + "_"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def prune(self, keep_hashes):
+        """Delete variants whose original hash is not in keep_hashes; returns how many were removed."""
+        removed = 0
+        if not os.path.isdir(self.cache_dir):
+            return removed
+        keep = set(keep_hashes)
+        for name in os.listdir(self.cache_dir):
+            if name.split("_", 1)[0] not in keep:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
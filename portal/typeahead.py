@@ -0,0 +1,260 @@
+# typeahead.py - fuzzy, typo-tolerant suggestions over node titles and key phrases (character trigrams)
+#
+# "stv 1o7" -> "STV 107", "bal enq" -> "Balance Enquiry": every query word is matched against the
+# vocabulary of title / heading / bold words by shared trigrams, prefix or a one-letter slip, and a
+# node must match every query word. Recent queries are kept, so typing one more letter only
+# re-scores the nodes the shorter query already matched - as long as that shorter query had no
+# typo: a fuzzy match does not carry over ("stv 1o" finds "STV 10", "stv 1o7" finds "STV 107").
+import heapq
+import re
+import threading
+from collections import OrderedDict
+
+from portal.content_store import inline_content
+from portal.search_index import strip_tags, tokenize
+
+# headings and bold runs in content are the phrases agents remember a page by
+KEY_PHRASE_RE = re.compile(r"<(h[1-6]|strong|b)\b[^>]*>(.*?)</\1\s*>", re.IGNORECASE | re.DOTALL)
+PHRASE_WEIGHT = 0.8         # a key-phrase word counts a little less than a title word
+MIN_SIMILARITY = 0.45
+QUERY_CACHE_SIZE = 256
+RANK_DEPTH = 50             # ranked suggestions kept per cached query
+REFINE_LIMIT = 5000         # above this many candidates, scan the word postings instead
+
+
+def trigrams(word):
+    """Trigrams of word padded as '  word ', so short words and prefixes still share grams."""
+    w = f"  {word} "
+    return {w[i:i + 3] for i in range(len(w) - 2)}
+
+
+def _edit_distance_le1(a, b):
+    """True when a and b differ by at most one insert, delete, substitution or adjacent swap."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+    return a[i:] == b[i + 1:] if la < lb else a[i + 1:] == b[i:]
+
+
+def similarity(token, word, token_grams=None):
+    """0..1: exact 1, prefix ~0.8-1, one-letter slip (whole word or prefix) 0.6, else trigram Dice."""
+    if word == token:
+        return 1.0
+    if word.startswith(token):
+        return 0.75 + 0.25 * len(token) / len(word)
+    if len(token) > 1 and _edit_distance_le1(token, word):
+        return 0.6
+    # a slip inside a prefix ("rechr" for "recharge"); the first letter is trusted
+    if len(token) > 2 and token[0] == word[0] and _edit_distance_le1(token, word[:len(token)]):
+        return 0.6
+    tg = token_grams if token_grams is not None else trigrams(token)
+    wg = trigrams(word)
+    return 2 * len(tg & wg) / (len(tg) + len(wg))
+
+
+def key_phrases(html_text):
+    return [strip_tags(m.group(2)) for m in KEY_PHRASE_RE.finditer(html_text or "")]
+
+
+class TypeaheadIndex:
+    """
+    Trigram index keyed by node path (tuple of names), patched like SearchIndex.
+    suggest(query, k) -> up to k paths (lists), best first. `content(node)` as for SearchIndex.
+    """
+
+    def __init__(self, content=None):
+        self._content = content or inline_content
+        self._lock = threading.RLock()
+        self._grams = {}        # trigram -> set(words)
+        self._postings = {}     # word -> {path: weight}
+        self._docs = {}         # path -> {word: weight}
+        self._children = {}     # path -> set(child paths)
+        self._queries = OrderedDict()   # normalized query -> (matched paths, best RANK_DEPTH paths, typed exactly)
+        self.hits = 0
+        self.refined = 0
+
+    # ------------------ Build / patch ------------------
+    @classmethod
+    def build(cls, data, **kwargs):
+        idx = cls(**kwargs)
+        idx.add_tree(data)
+        return idx
+
+    def add_tree(self, data, prefix=()):
+        if not isinstance(data, dict):
+            return
+        with self._lock:
+            for key, value in data.items():
+                path = tuple(prefix) + (key,)
+                self._index_node(path, value)
+                if isinstance(value, dict) and isinstance(value.get("subtopics"), dict):
+                    self.add_tree(value["subtopics"], path)
+
+    def update(self, path, node):
+        with self._lock:
+            self._index_node(tuple(path), node)
+
+    def remove(self, path):
+        path = tuple(path)
+        with self._lock:
+            for child in list(self._children.get(path, ())):
+                self.remove(child)
+            self._children.pop(path, None)
+            self._unindex_node(path)
+            if len(path) > 1:
+                siblings = self._children.get(path[:-1])
+                if siblings is not None:
+                    siblings.discard(path)
+
+    def rename(self, old_path, new_path, node):
+        with self._lock:
+            self.remove(old_path)
+            new_path = tuple(new_path)
+            self._index_node(new_path, node)
+            if isinstance(node, dict) and isinstance(node.get("subtopics"), dict):
+                self.add_tree(node["subtopics"], new_path)
+
+    def _index_node(self, path, node):
+        self._unindex_node(path)
+        words = {w: 1.0 for w in tokenize(path[-1])}
+        for phrase in key_phrases(self._content(node)):
+            for w in tokenize(phrase):
+                words.setdefault(w, PHRASE_WEIGHT)
+        self._docs[path] = words
+        for w, weight in words.items():
+            plist = self._postings.get(w)
+            if plist is None:
+                plist = self._postings[w] = {}
+                for g in trigrams(w):
+                    self._grams.setdefault(g, set()).add(w)
+            plist[path] = weight
+        if len(path) > 1:
+            self._children.setdefault(path[:-1], set()).add(path)
+        self._queries.clear()
+
+    def _unindex_node(self, path):
+        words = self._docs.pop(path, None)
+        if words is None:
+            return
+        for w in words:
+            plist = self._postings.get(w)
+            if plist is None:
+                continue
+            plist.pop(path, None)
+            if not plist:
+                del self._postings[w]
+                for g in trigrams(w):
+                    bucket = self._grams.get(g)
+                    if bucket is not None:
+                        bucket.discard(w)
+                        if not bucket:
+                            del self._grams[g]
+        self._queries.clear()
+
+    # ------------------ Query ------------------
+    def __len__(self):
+        return len(self._docs)
+
+    def _word_matches(self, token):
+        """{word: similarity} for vocabulary words close enough to token."""
+        tg = trigrams(token)
+        candidates = set()
+        for g in tg:
+            candidates |= self._grams.get(g, set())
+        out = {}
+        for w in candidates:
+            s = similarity(token, w, tg)
+            if s >= MIN_SIMILARITY:
+                out[w] = s
+        return out
+
+    def _score_all(self, tokens):
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for w, s in self._word_matches(token).items():
+                for path, weight in self._postings[w].items():
+                    if s * weight > token_scores.get(path, 0.0):
+                        token_scores[path] = s * weight
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {p: scores[p] + s for p, s in token_scores.items() if p in scores}
+            if not scores:
+                return {}
+        return scores
+
+    def _score_within(self, tokens, paths):
+        """Score only `paths` (the matches of a shorter query), word by word from each node's own words."""
+        memo = {}
+        scores = {}
+        for path in paths:
+            words = self._docs.get(path)
+            if not words:
+                continue
+            total = 0.0
+            for token in tokens:
+                best = 0.0
+                for w, weight in words.items():
+                    key = (token, w)
+                    s = memo.get(key)
+                    if s is None:
+                        s = memo[key] = similarity(token, w)
+                    if s >= MIN_SIMILARITY and s * weight > best:
+                        best = s * weight
+                if not best:
+                    break
+                total += best
+            else:
+                scores[path] = total
+        return scores
+
+    def _typed_exactly(self, tokens):
+        """True when every token is a vocabulary word or the start of one (no typo so far)."""
+        for token in tokens:
+            padded = f"  {token}"
+            buckets = [self._grams.get(padded[i:i + 3], ()) for i in range(len(padded) - 2)]
+            if not any(w.startswith(token) for w in min(buckets, key=len)):
+                return False
+        return True
+
+    def _cached_prefix(self, q):
+        for end in range(len(q) - 1, 0, -1):
+            hit = self._queries.get(q[:end])
+            if hit is not None:
+                return hit
+        return None
+
+    def suggest(self, query, k=10):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        q = " ".join(tokens)
+        with self._lock:
+            hit = self._queries.get(q)
+            if hit is not None:
+                self._queries.move_to_end(q)
+                self.hits += 1
+                return [list(p) for p in hit[1][:k]]
+            # a longer query (one more letter or word) narrows the matches of its cached prefix.
+            # Not reused: a prefix that matched nothing (a typo being fixed), and one whose words
+            # were only fuzzy matches - the longer query may fit other nodes better ("1o" -> "1o7")
+            prev = self._cached_prefix(q)
+            if prev is not None and prev[0] and prev[2] and len(prev[0]) <= REFINE_LIMIT:
+                scores = self._score_within(tokens, prev[0])
+                self.refined += 1
+            else:
+                scores = self._score_all(tokens)
+            best = heapq.nsmallest(max(k, RANK_DEPTH), scores.items(), key=lambda kv: (-kv[1], len(kv[0]), kv[0]))
+            ranked = [p for p, _ in best]
+            self._queries[q] = (scores.keys(), ranked, self._typed_exactly(tokens))
+            while len(self._queries) > QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
+            return [list(p) for p in ranked[:k]]
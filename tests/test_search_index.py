@@ -0,0 +1,18 @@
+# test_search_index.py - attached documents stay searchable when their page moves
+from portal.search_index import SearchIndex, split_hit
+
+TREE = {"Prepaid": {"subtopics": {"Plans": {"subtopics": {"STV": {}}}}}}
+
+
+def test_rename_keeps_attached_files_of_the_subtree():
+    idx = SearchIndex.build(TREE)
+    idx.update_file(("Prepaid", "Plans"), "tariff.pdf", "voucher tariff circular")
+    idx.update_file(("Prepaid", "Plans", "STV"), "stv.xlsx", "special tariff voucher list")
+    attached = {("Prepaid", "Tariffs"): [("tariff.pdf", "voucher tariff circular")],
+                ("Prepaid", "Tariffs", "STV"): [("stv.xlsx", "special tariff voucher list")]}
+    idx.rename(("Prepaid", "Plans"), ("Prepaid", "Tariffs"), TREE["Prepaid"]["subtopics"]["Plans"],
+               files=lambda path: attached.get(path, []))
+    hits = [split_hit(p) for p in idx.search("voucher")]
+    assert (["Prepaid", "Tariffs"], "tariff.pdf") in hits
+    assert (["Prepaid", "Tariffs", "STV"], "stv.xlsx") in hits
+    assert not any(page[-1] == "Plans" for page, _ in hits)
@@ -0,0 +1,39 @@
+# test_store_cache.py - edits two sessions of one process make from the same cached copy both survive
+import json
+
+import pytest
+
+from portal.coordination import copy_path
+from portal.storage import open_store
+from portal.store_cache import StoreCache
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def cache(request, tmp_path):
+    files = {"sections": str(tmp_path / "bsnl_data.json"), "settings": str(tmp_path / "settings.json")}
+    with open(files["sections"], "w") as f:
+        json.dump({"A": {"subtopics": {}}, "B": {"subtopics": {"old": {}}}}, f)
+    with open(files["settings"], "w") as f:
+        json.dump({"x": 1, "y": 1}, f)
+    return StoreCache(open_store(request.param, db_path=str(tmp_path / "portal.db"), files=files))
+
+
+def test_node_edits_from_one_base_are_both_kept(cache):
+    base = cache.get("sections", {})
+    first = copy_path(base, ["A"])
+    first["A"]["subtopics"]["a1"] = {"icon": "1"}
+    second = copy_path(base, ["B"])
+    second["B"]["subtopics"]["new"] = second["B"]["subtopics"].pop("old")
+    cache.save_node("sections", first, ["A", "a1"], base=base)
+    saved = cache.rename_node("sections", second, ["B", "old"], ["B", "new"], base=base)
+    assert saved["A"]["subtopics"] == {"a1": {"icon": "1"}}
+    assert list(saved["B"]["subtopics"]) == ["new"]
+    assert cache.store.load("sections", {}) == saved
+    assert base == {"A": {"subtopics": {}}, "B": {"subtopics": {"old": {}}}}
+
+
+def test_collection_saves_from_one_base_are_merged(cache):
+    base = cache.get("settings", {})
+    cache.save("settings", {**base, "x": 2}, base=base)
+    assert cache.save("settings", {**base, "y": 3}, base=base) == {"x": 2, "y": 3}
+    assert cache.store.load("settings", {}) == {"x": 2, "y": 3}
@@ -0,0 +1,21 @@
+# test_typeahead.py - suggestions must not depend on how the query was typed
+from portal.typeahead import TypeaheadIndex
+
+TREE = {"Plans": {"subtopics": {"STV 10": {}, "STV 107": {}, "STV 199": {}}}}
+
+
+def test_typed_keystroke_by_keystroke_matches_fresh_query():
+    typed = TypeaheadIndex.build(TREE)
+    query = "stv 1o7"
+    for end in range(1, len(query) + 1):
+        got = typed.suggest(query[:end])
+        assert got == TypeaheadIndex.build(TREE).suggest(query[:end]), query[:end]
+    assert got == [["Plans", "STV 107"]]
+
+
+def test_exact_prefix_is_still_refined():
+    idx = TypeaheadIndex.build(TREE)
+    idx.suggest("stv 1")
+    assert idx.suggest("stv 19") == TypeaheadIndex.build(TREE).suggest("stv 19")
+    assert idx.suggest("stv 19")[0] == ["Plans", "STV 199"]
+    assert idx.refined == 1
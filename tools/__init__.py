@@ -0,0 +1 @@
+# tools - offline benchmarks and load tests for the portal (not imported by app.py)
@@ -0,0 +1,322 @@
+# bench.py - headless micro-benchmarks of the portal's hot paths on synthetic trees
+#
+#   python -m tools.bench                          # 1k / 10k / 100k nodes, JSON report on stdout
+#   python -m tools.bench --sizes 1000,10000 --out bench.json --only search,privileges
+#
+# Every benchmark reports ops/s and latency percentiles (ms) from a timed pass, and peak traced
+# memory (KiB) from a separate tracemalloc pass, so the tracing overhead does not skew the timings.
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from portal.blob_store import BlobStore
+from portal.content_store import ContentStore
+from portal.defaults import apply_defaults
+from portal.node_index import NodeIndex
+from portal.privileges import PrivilegeTable
+from portal.search_index import SearchIndex
+from portal.semantic import SemanticIndex
+from portal.storage import atomic_write_json, open_store, read_json
+from portal.store_cache import StoreCache
+from portal.typeahead import TypeaheadIndex
+from tools.synthetic import WORDS, all_paths, make_privileges, make_tree, make_uploads, make_users
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+# the settings shape app.py keeps (only what apply_defaults looks at matters here)
+DEFAULT_SETTINGS = {
+    "default_icon": "📘", "feature_toggles": {}, "visible_sections": {}, "user_privileges": {},
+    "topic_order": [], "subtopic_order": {},
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[i]
+
+
+def measure(fn, inputs):
+    """Call fn(x) for every x; returns per-call latencies in ms."""
+    out = []
+    clock = time.perf_counter_ns
+    for x in inputs:
+        t = clock()
+        fn(x)
+        out.append((clock() - t) / 1e6)
+    return out
+
+
+def peak_kib(fn, inputs):
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        for x in inputs:
+            fn(x)
+        return round((tracemalloc.get_traced_memory()[1] - base) / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(name, nodes, latencies, peak):
+    lat = sorted(latencies)
+    total = sum(lat)
+    return {
+        "name": name,
+        "nodes": nodes,
+        "calls": len(lat),
+        "ops_per_sec": round(len(lat) / (total / 1000.0), 1) if total else None,
+        "mean_ms": round(statistics.fmean(lat), 4) if lat else None,
+        "p50_ms": round(percentile(lat, 50), 4),
+        "p95_ms": round(percentile(lat, 95), 4),
+        "p99_ms": round(percentile(lat, 99), 4),
+        "max_ms": round(lat[-1], 4) if lat else None,
+        "peak_kib": peak,
+    }
+
+
+def run_case(results, name, nodes, fn, inputs, mem_inputs=None):
+    inputs = list(inputs)
+    latencies = measure(fn, inputs)
+    peak = peak_kib(fn, mem_inputs if mem_inputs is not None else inputs[: max(1, len(inputs) // 10)])
+    results.append(summarize(name, nodes, latencies, peak))
+    print(f"  {name:<28} p50 {results[-1]['p50_ms']:>10.4f} ms   p99 {results[-1]['p99_ms']:>10.4f} ms", file=sys.stderr)
+
+
+# ------------------ Benchmarks (each takes the prepared corpus and appends results) ------------------
+def bench_search(c, results):
+    rng = random.Random(2)
+    queries = [" ".join(rng.sample(WORDS, rng.randint(1, 2))) for _ in range(c["calls"])]
+    queries += [w[: rng.randint(3, 5)] for w in rng.sample(WORDS, 20)]    # prefix queries
+    run_case(results, "search.build", c["nodes"], lambda t: SearchIndex.build(t), [c["tree"]], [c["tree"]])
+    idx = SearchIndex.build(c["tree"])
+    run_case(results, "search.query", c["nodes"], lambda q: idx.search(q, k=25), queries)
+    paths = rng.sample(c["paths"], min(200, len(c["paths"])))
+    run_case(results, "search.update_node", c["nodes"], lambda p: idx.update(p, c["lookup"](p)), paths)
+
+
+def bench_typeahead(c, results):
+    rng = random.Random(3)
+    idx = TypeaheadIndex.build(c["tree"])
+    typed = []
+    for w in rng.sample(WORDS, 20):
+        typed += [w[:i] for i in range(2, len(w) + 1)]      # one query per keystroke
+    run_case(results, "typeahead.keystroke", c["nodes"], lambda q: idx.suggest(q, k=10), typed)
+
+
+def bench_topic_paths(c, results):
+    idx = NodeIndex.build(c["tree"])
+    run_case(results, "node_index.build", c["nodes"], lambda t: NodeIndex.build(t), [c["tree"]], [c["tree"]])
+
+    def cold(_):
+        idx._all_paths = None       # what any tree edit does
+        return idx.all_paths()
+
+    run_case(results, "all_topic_paths.cold", c["nodes"], cold, range(20), range(2))
+    run_case(results, "all_topic_paths.warm", c["nodes"], lambda _: idx.all_paths(), range(c["calls"]))
+    # the tile grid of the widest node: filter box and A–Z bar views over its ordered children
+    widest = max(c["paths"][:1000], key=lambda p: len(idx.children(p)))
+    order = list(reversed(idx.children(widest)))
+    rng = random.Random(8)
+    views = [(w[:2], None) for w in rng.sample(WORDS, 10)] + [("", b) for b in "ABCDEFGHIJ"]
+
+    def cold_view(v):
+        idx._views.clear()      # what an edit under the node does
+        return idx.filtered_children(widest, order, *v)
+
+    run_case(results, "tile_view.cold", c["nodes"], cold_view, views)
+    run_case(results, "tile_view.warm", c["nodes"], lambda v: idx.filtered_children(widest, order, *v), views * 10)
+
+
+def bench_privileges(c, results):
+    rng = random.Random(4)
+    users = [u for u in c["users"] if u != "admin"]
+    checks = [(rng.choice(users), " / ".join(rng.choice(c["paths"])[:2])) for _ in range(c["calls"] * 10)]
+    args = (c["grants"], ["admin"])
+    run_case(results, "privileges.compile", c["nodes"], lambda a: PrivilegeTable(*a), [args], [args])
+    table = PrivilegeTable(*args)
+    run_case(results, "has_privilege.cold", c["nodes"], lambda uc: table.allowed(uc[0], uc[1], "view"), checks)
+    run_case(results, "has_privilege.warm", c["nodes"], lambda uc: table.allowed(uc[0], uc[1], "view"), checks)
+    pages = [" / ".join(p) for p in c["paths"][:500]]
+    run_case(results, "filter_paths.500", c["nodes"], lambda u: table.filter_paths(u, pages, "view"),
+             rng.sample(users, min(50, len(users))))
+
+
+def bench_settings_defaults(c, results):
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    apply_defaults(settings, c["tree"], DEFAULT_SETTINGS)     # first call fills everything in
+    run_case(results, "ensure_settings_defaults", c["nodes"],
+             lambda _: apply_defaults(settings, c["tree"], DEFAULT_SETTINGS), range(50))
+
+
+def bench_saves(c, results):
+    rng = random.Random(5)
+    paths = rng.sample(c["paths"], min(50, len(c["paths"])))
+    for backend in ("json", "sqlite"):
+        folder = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+        try:
+            files = {"sections": os.path.join(folder, "bsnl_data.json"), "users": os.path.join(folder, "users.json"),
+                     "settings": os.path.join(folder, "settings.json"),
+                     "announcements": os.path.join(folder, "announcements.json")}
+            store = StoreCache(open_store(backend, os.path.join(folder, "portal.db"), files))
+            tree = copy.deepcopy(c["tree"])
+            store.save("sections", tree)
+            run_case(results, f"safe_save_json.{backend}", c["nodes"], lambda t: store.save("sections", t),
+                     [tree] * 3, [tree])
+
+            def edit(p):
+                node = c["lookup"](p, tree)
+                node["content"] = (node.get("content") or "") + "<p>edited</p>"
+                store.save_node("sections", tree, p)
+
+            run_case(results, f"save_node.{backend}", c["nodes"], edit, paths)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_content(c, results):
+    """Loading the tree with inline bodies vs the skeleton, and fetching one page's body (LRU of 4 MiB)."""
+    rng = random.Random(6)
+    paths = [rng.choice(c["paths"]) for _ in range(c["calls"])]
+    folder = tempfile.mkdtemp(prefix="bench_content_")
+    try:
+        bodies = ContentStore(os.path.join(folder, "content"), max_bytes=4 * 1024 * 1024)
+        skeleton = copy.deepcopy(c["tree"])
+        bodies.split_tree(skeleton)
+        for layout, tree in (("inline", c["tree"]), ("skeleton", skeleton)):
+            fp = os.path.join(folder, f"{layout}.json")
+            atomic_write_json(fp, tree)
+            run_case(results, f"load_tree.{layout}", c["nodes"], lambda f: read_json(f, {}), [fp] * 3, [fp])
+        run_case(results, "page_body", c["nodes"], lambda p: bodies.content_of(c["lookup"](p, skeleton)), paths)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_semantic(c, results):
+    """Full embed of the tree, a re-sync after one edit (only that node is embedded), and queries."""
+    rng = random.Random(7)
+    queries = [" ".join(rng.sample(WORDS, rng.randint(2, 4))) for _ in range(c["calls"])]
+    folder = tempfile.mkdtemp(prefix="bench_semantic_")
+    try:
+        tree = copy.deepcopy(c["tree"])
+        run_case(results, "semantic.build", c["nodes"], lambda t: SemanticIndex(folder).sync(t), [tree])
+        idx = SemanticIndex(folder)
+        paths = rng.sample(c["paths"], min(20, len(c["paths"])))
+
+        def edit(p):
+            c["lookup"](p, tree)["content"] = f"<p>{rng.choice(WORDS)} {rng.random()}</p>"
+            return idx.sync(tree)
+
+        run_case(results, "semantic.sync_one", c["nodes"], edit, paths)
+        run_case(results, "semantic.query", c["nodes"], lambda q: idx.search(q, k=25), queries)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def bench_router(c, results):
+    rng = random.Random(6)
+    targets = [rng.choice(c["paths"]) for _ in range(c["calls"] * 10)]
+    idx = NodeIndex.build(c["tree"])
+    run_case(results, "router.walk", c["nodes"], lambda p: c["lookup"](p), targets)
+    run_case(results, "router.node_index", c["nodes"], lambda p: idx.get(p), targets)
+
+
+def bench_uploads(c, results):
+    folder = tempfile.mkdtemp(prefix="bench_uploads_")
+    try:
+        blobs = BlobStore(folder)
+        pages = make_uploads(blobs, c["paths"], c["uploads"])
+        run_case(results, "upload_listing", c["nodes"], lambda p: blobs.list_files(p), pages * 3)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+BENCHMARKS = {
+    "search": bench_search,
+    "typeahead": bench_typeahead,
+    "topic_paths": bench_topic_paths,
+    "privileges": bench_privileges,
+    "settings_defaults": bench_settings_defaults,
+    "saves": bench_saves,
+    "content": bench_content,
+    "semantic": bench_semantic,
+    "router": bench_router,
+    "uploads": bench_uploads,
+}
+
+
+def corpus(nodes, args):
+    tree = make_tree(nodes, depth=args.depth, fanout=args.fanout, content_size=args.content_size, seed=args.seed)
+    paths = all_paths(tree)
+    users = make_users(args.users, seed=args.seed)
+
+    def lookup(path, root=tree):
+        cur = {"subtopics": root}
+        for step in path:
+            cur = cur["subtopics"][step]
+        return cur
+
+    return {
+        "nodes": len(paths), "tree": tree, "paths": paths, "users": users, "lookup": lookup,
+        "grants": make_privileges(users, paths, density=args.privilege_density, seed=args.seed),
+        "uploads": args.uploads, "calls": args.calls,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the portal's hot paths on synthetic trees.")
+    ap.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="node counts, comma separated")
+    ap.add_argument("--depth", type=int, default=3)
+    ap.add_argument("--fanout", type=int, default=None, help="children per node (default: fits the size)")
+    ap.add_argument("--content-size", type=int, default=600, help="approx. HTML characters per page")
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--privilege-density", type=float, default=0.01, help="share of paths granted per user")
+    ap.add_argument("--uploads", type=int, default=200)
+    ap.add_argument("--calls", type=int, default=200, help="timed calls per query benchmark")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--only", default="", help="comma separated subset of: " + ", ".join(BENCHMARKS))
+    ap.add_argument("--out", default="", help="write the JSON report here instead of stdout")
+    args = ap.parse_args(argv)
+
+    only = [b for b in args.only.split(",") if b] or list(BENCHMARKS)
+    unknown = [b for b in only if b not in BENCHMARKS]
+    if unknown:
+        ap.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",") if s):
+        print(f"{size} nodes", file=sys.stderr)
+        c = corpus(size, args)
+        for name in only:
+            BENCHMARKS[name](c, results)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": int(time.time()),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
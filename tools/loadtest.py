@@ -0,0 +1,352 @@
+# loadtest.py - many simulated agents driving app.py in one process through streamlit's AppTest
+#
+#   python -m tools.loadtest                                   # 1, 5, 10, 20 concurrent sessions
+#   python -m tools.loadtest --sessions 1,10,40 --journeys 5 --backend json --tree 10000 --out load.json
+#
+# The app runs in a scratch copy (its data files, portal.db and uploads are never the real ones),
+# and every session is its own AppTest, so sessions share st.cache_resource state exactly like
+# browser tabs on one `streamlit run` process. Each journey: open the app, log in, browse two
+# levels through the tile buttons, search, open a page with uploads and, for admins, save content.
+#
+# Per concurrency level the report has rerun latency percentiles (overall and per step), errors,
+# and every store write timed per collection (sections = bsnl_data.json, settings = settings.json
+# with --backend json; rows in portal.db with sqlite), including time spent waiting on the store.
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from unittest.mock import MagicMock
+from urllib import parse
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+
+from tools.bench import percentile
+from tools.synthetic import WORDS, all_paths, make_tree
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LEVELS = (1, 5, 10, 20)
+
+
+# ------------------ Scratch portal ------------------
+def prepare(workdir, args):
+    shutil.copy(os.path.join(REPO, "app.py"), workdir)
+    shutil.copytree(os.path.join(REPO, "portal"), os.path.join(workdir, "portal"),
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    if args.tree:
+        sections = make_tree(args.tree, seed=args.seed)
+    else:
+        with open(os.path.join(REPO, "bsnl_data.json"), "r", encoding="utf-8") as f:
+            sections = json.load(f)
+    users = {"admin": {"password": "admin123", "role": "Admin"}}
+    for i in range(args.agents):
+        users[f"agent{i:03d}"] = {"password": "agent", "role": "Viewer"}
+    for name, data in (("bsnl_data.json", sections), ("users.json", users), ("announcements.json", [])):
+        with open(os.path.join(workdir, name), "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+
+    # a few pages with files, so journeys also list uploads
+    from portal.blob_store import BlobStore
+    rng = random.Random(args.seed)
+    paths = [p for p in all_paths(sections) if len(p) > 1] or all_paths(sections)
+    upload_pages = rng.sample(paths, min(args.upload_pages, len(paths)))
+    blobs = BlobStore(os.path.join(workdir, "uploads"))
+    for i, p in enumerate(upload_pages):
+        for j in range(3):
+            blobs.add_file(p, f"circular_{i}_{j}.pdf", io.BytesIO(os.urandom(2048)))
+    return sections, upload_pages
+
+
+# ------------------ Concurrent AppTest ------------------
+class SharedRuntimeAppTest(AppTest):
+    """
+    AppTest installs a mock Runtime (and the appTest config flag) for each run and clears it when
+    the run ends, which breaks any other session running at that moment. Here one mock Runtime is
+    installed for the whole load test (see shared_runtime) and runs leave it alone.
+    """
+
+    def _run(self, widget_state=None, timeout=None):
+        runner = LocalScriptRunner(self._script_path, self.session_state,
+                                   PagesManager(self._script_path, setup_watcher=False),
+                                   args=self.args, kwargs=self.kwargs)
+        self._tree = runner.run(widget_state, self.query_params,
+                                timeout if timeout is not None else self.default_timeout, self._page_hash)
+        self._tree._runner = self
+        self.query_params = parse.parse_qs(runner.event_data[-1]["client_state"].query_string)
+        return self
+
+
+class shared_runtime:
+    def __enter__(self):
+        mock = MagicMock(spec=Runtime)
+        mock.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+        mock.cache_storage_manager = MemoryCacheStorageManager()
+        Runtime._instance = mock
+        self._config = patch_config_options({"global.appTest": True})
+        self._config.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._config.__exit__(*exc)
+        Runtime._instance = None
+
+
+# ------------------ Write instrumentation ------------------
+class WriteStats:
+    """Times every store write: total call (includes waiting for the store lock) and the backend write."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}     # (collection, op) -> [(total ms, write ms)]
+        self.errors = []
+        self._local = threading.local()
+
+    def install(self):
+        from portal import storage, store_cache
+        for cls in (storage.JsonStore, storage.SqliteStore):
+            for op in ("save", "save_node", "rename_node", "delete_node"):
+                setattr(cls, op, self._wrap_backend(getattr(cls, op)))
+        for op in ("save", "save_node", "rename_node", "delete_node"):
+            setattr(store_cache.StoreCache, op, self._wrap_cache(op, getattr(store_cache.StoreCache, op)))
+
+    def _wrap_backend(self, fn):
+        def timed(store, *args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return fn(store, *args, **kwargs)
+            finally:
+                self._local.write_ms = (time.perf_counter() - t) * 1000
+        return timed
+
+    def _wrap_cache(self, op, fn):
+        def timed(cache, name, *args, **kwargs):
+            self._local.write_ms = 0.0
+            t = time.perf_counter()
+            try:
+                return fn(cache, name, *args, **kwargs)
+            except Exception as e:
+                with self.lock:
+                    self.errors.append(f"{name}.{op}: {e!r}")
+                raise
+            finally:
+                total = (time.perf_counter() - t) * 1000
+                with self.lock:
+                    self.calls.setdefault((name, op), []).append((total, self._local.write_ms))
+        return timed
+
+    def snapshot(self):
+        with self.lock:
+            calls = {k: list(v) for k, v in self.calls.items()}
+            errors = list(self.errors)
+            self.calls.clear()
+            self.errors.clear()
+        out = {}
+        for (name, op), samples in sorted(calls.items()):
+            totals = sorted(s[0] for s in samples)
+            waits = sorted(max(0.0, s[0] - s[1]) for s in samples)
+            out[f"{name}.{op}"] = {
+                "writes": len(samples),
+                "p50_ms": round(percentile(totals, 50), 3),
+                "p95_ms": round(percentile(totals, 95), 3),
+                "max_ms": round(totals[-1], 3),
+                "lock_wait_mean_ms": round(statistics.fmean(waits), 3),
+                "lock_wait_max_ms": round(waits[-1], 3),
+            }
+        return out, errors
+
+
+# ------------------ Journeys ------------------
+class Session:
+    def __init__(self, sid, args, sections, upload_pages, samples, errors):
+        self.sid = sid
+        self.args = args
+        self.rng = random.Random(args.seed * 1000 + sid)
+        self.sections = sections
+        self.upload_pages = upload_pages
+        self.samples = samples      # shared list of (step, ms)
+        self.errors = errors        # shared list of str
+        self.at = None
+
+    def step(self, name, fn):
+        """Run one interaction (= one rerun) and record its latency; False if the app raised."""
+        t = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            self.errors.append(f"session {self.sid} {name}: {e!r}")
+            return False
+        ms = (time.perf_counter() - t) * 1000
+        self.samples.append((name, ms))
+        if self.at.exception:
+            self.errors.append(f"session {self.sid} {name}: {self.at.exception[0].value}")
+            return False
+        return True
+
+    def settle(self):
+        # a click in a fragment that navigates ends in a full rerun; AppTest keeps the elements of
+        # the earlier run in its tree until the next run, so refresh it (untimed) before looking
+        self.at.run()
+
+    def click_tile(self, names):
+        labels = {b.label: b for b in self.at.button}
+        choices = [b for label, b in labels.items() if any(label.endswith(" " + n) for n in names)]
+        if not choices:
+            return None
+        return self.rng.choice(choices)
+
+    def journey(self, admin):
+        self.at = SharedRuntimeAppTest(os.path.abspath("app.py"), default_timeout=self.args.timeout)
+        at = self.at
+        if not self.step("open", at.run):
+            return
+        user, pw = ("admin", "admin123") if admin else (f"agent{self.rng.randrange(self.args.agents):03d}", "agent")
+        if len(at.text_input) < 2:
+            self.errors.append(f"session {self.sid} open: no login form ({[e.type for e in at.main][:5]})")
+            return
+        at.text_input[0].input(user)
+        at.text_input[1].input(pw)
+        if not self.step("login", at.button[0].click().run):
+            return
+
+        children = self.sections
+        for depth in ("browse_top", "browse_sub"):
+            b = self.click_tile(list(children))
+            if b is None:
+                break
+            topic = next(n for n in children if b.label.endswith(" " + n))
+            if not self.step(depth, b.click().run):
+                return
+            self.settle()
+            children = (children.get(topic) or {}).get("subtopics") or {}
+
+        boxes = [t for t in at.text_input if t.label.startswith("🔍")]
+        if boxes:
+            q = " ".join(self.rng.sample(WORDS, 1)) if self.args.tree else self.rng.choice(["recharge", "plan", "sim", "bill"])
+            if not self.step("search", boxes[0].input(q).run):
+                return
+
+        if self.upload_pages:
+            at.session_state["path"] = list(self.rng.choice(self.upload_pages))
+            if not self.step("open_upload_page", at.run):
+                return
+
+        if admin:
+            save = [b for b in at.button if b.label == "💾 Save Content"]
+            if save:
+                # the Quill editor cannot be typed into headlessly: this saves the page's current content
+                self.step("save_content", save[0].click().run)
+
+    def run(self, journeys):
+        for j in range(journeys):
+            try:
+                self.journey(admin=self.rng.random() < self.args.admin_share)
+            except Exception:
+                self.errors.append(f"session {self.sid}: {traceback.format_exc(limit=3)}")
+
+
+def run_level(n, args, sections, upload_pages, writes):
+    samples, errors = [], []
+    sessions = [Session(i, args, sections, upload_pages, samples, errors) for i in range(n)]
+    threads = [threading.Thread(target=s.run, args=(args.journeys,), daemon=True) for s in sessions]
+    t = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - t
+
+    by_step = {}
+    for name, ms in samples:
+        by_step.setdefault(name, []).append(ms)
+    all_ms = sorted(ms for _, ms in samples)
+
+    def dist(values):
+        values = sorted(values)
+        return {
+            "reruns": len(values),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2) if values else None,
+        }
+
+    write_stats, write_errors = writes.snapshot()
+    return {
+        "sessions": n,
+        "wall_s": round(wall, 2),
+        "reruns_per_sec": round(len(samples) / wall, 2) if wall else None,
+        "errors": len(errors),
+        "error_samples": errors[:10],
+        "latency": dist(all_ms),
+        "steps": {k: dist(v) for k, v in sorted(by_step.items())},
+        "writes": write_stats,
+        "write_errors": write_errors[:10],
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Drive app.py with N concurrent AppTest sessions.")
+    ap.add_argument("--sessions", default=",".join(str(n) for n in DEFAULT_LEVELS), help="concurrency levels")
+    ap.add_argument("--journeys", type=int, default=3, help="journeys per session and level")
+    ap.add_argument("--backend", choices=("sqlite", "json"), default="sqlite")
+    ap.add_argument("--tree", type=int, default=0, help="synthetic tree of this many nodes (0: the repo's data)")
+    ap.add_argument("--agents", type=int, default=50, help="viewer accounts to log in as")
+    ap.add_argument("--admin-share", type=float, default=0.2, help="share of journeys that edit as Admin")
+    ap.add_argument("--upload-pages", type=int, default=10)
+    ap.add_argument("--timeout", type=float, default=120, help="seconds one rerun may take")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--keep", action="store_true", help="keep the scratch portal folder")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="portal_load_")
+    cwd = os.getcwd()
+    try:
+        os.environ["PORTAL_STORAGE"] = args.backend
+        sections, upload_pages = prepare(workdir, args)
+        os.chdir(workdir)
+        writes = WriteStats()
+        writes.install()
+        levels = []
+        with shared_runtime():
+            for n in (int(x) for x in args.sessions.split(",") if x):
+                print(f"{n} sessions ...", file=sys.stderr)
+                levels.append(run_level(n, args, sections, upload_pages, writes))
+                lat = levels[-1]["latency"]
+                print(f"  p50 {lat['p50_ms']} ms  p95 {lat['p95_ms']} ms  p99 {lat['p99_ms']} ms  "
+                      f"errors {levels[-1]['errors']}", file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "time": int(time.time()),
+                 "args": vars(args), "workdir": workdir if args.keep else None},
+        "levels": levels,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
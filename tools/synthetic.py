@@ -0,0 +1,126 @@
+# synthetic.py - realistic synthetic knowledge trees, users, privileges and uploads for benchmarks
+import io
+import random
+
+WORDS = (
+    "prepaid postpaid recharge balance enquiry plan voucher stv combo data validity tariff roaming "
+    "broadband fiber ftth landline wireline sim swap port kyc bill payment refund complaint retailer "
+    "commission activation barring unbarring offer bundle unlimited topup pack family vip number "
+    "upgrade migration outage fault booking installation router speed limit international isd"
+).split()
+ICONS = ("📘", "📱", "📶", "☎️", "🧾", "❓", "📜", "🆘")
+
+
+def _title(rng, taken):
+    while True:
+        words = rng.sample(WORDS, rng.randint(1, 3))
+        title = " ".join(w.title() for w in words)
+        if rng.random() < 0.4:
+            title += f" {rng.randint(1, 999)}"
+        if title not in taken:
+            return title
+
+
+def _content(rng, size):
+    """Quill-like HTML of roughly `size` characters: headings, bold runs, links and paragraphs."""
+    parts = [f"<h2>{' '.join(rng.sample(WORDS, 3)).title()}</h2>"]
+    n = 0
+    while n < size:
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 25)))
+        if rng.random() < 0.2:
+            words += f" <strong>{rng.choice(WORDS)} {rng.randint(1, 999)}</strong>"
+        if rng.random() < 0.1:
+            words += f' <a href="https://example.com/{rng.choice(WORDS)}">details</a>'
+        p = f"<p>{words}</p>"
+        parts.append(p)
+        n += len(p)
+    return "".join(parts)
+
+
+def make_tree(nodes, depth=3, fanout=None, content_size=600, seed=1):
+    """
+    `sections`-shaped dict with about `nodes` nodes spread over `depth` levels.
+    fanout defaults to the branching factor that reaches `nodes` at that depth.
+    """
+    rng = random.Random(seed)
+    if fanout is None:
+        fanout = max(2, round(nodes ** (1.0 / depth)))
+    tree = {}
+    count = 0
+    frontier = [(tree, 1)]
+    while frontier and count < nodes:
+        next_frontier = []
+        for children, level in frontier:
+            for _ in range(max(1, int(rng.gauss(fanout, fanout / 4)))):
+                if count >= nodes:
+                    break
+                title = _title(rng, children)
+                node = {"icon": rng.choice(ICONS), "content": _content(rng, content_size) if rng.random() < 0.8 else "",
+                        "subtopics": {}}
+                children[title] = node
+                count += 1
+                if level < depth:
+                    next_frontier.append((node["subtopics"], level + 1))
+        frontier = next_frontier
+        if not frontier and count < nodes:
+            # ran out of depth: keep widening the deepest level
+            frontier = [(n["subtopics"], depth) for n in _leaves(tree)][: max(1, nodes - count)]
+    return tree
+
+
+def _leaves(tree):
+    stack = list(tree.values())
+    while stack:
+        node = stack.pop()
+        subs = node.get("subtopics") or {}
+        if subs:
+            stack.extend(subs.values())
+        else:
+            yield node
+
+
+def all_paths(tree, prefix=()):
+    out = []
+    stack = [(prefix, tree)]
+    while stack:
+        pre, children = stack.pop()
+        for name, node in children.items():
+            p = pre + (name,)
+            out.append(list(p))
+            if isinstance(node, dict) and node.get("subtopics"):
+                stack.append((p, node["subtopics"]))
+    return out
+
+
+def make_users(count, seed=1):
+    rng = random.Random(seed)
+    users = {"admin": {"password": "admin123", "role": "Admin"}}
+    for i in range(count):
+        users[f"agent{i:05d}"] = {"password": "x", "role": "Editor" if rng.random() < 0.1 else "Viewer"}
+    return users
+
+
+def make_privileges(users, paths, density=0.01, seed=1):
+    """settings["user_privileges"]: each non-admin gets about density * len(paths) grants."""
+    rng = random.Random(seed)
+    grants = {}
+    per_user = max(1, int(len(paths) * density))
+    for u, info in users.items():
+        if info.get("role") == "Admin":
+            continue
+        g = grants[u] = {}
+        for p in rng.sample(paths, min(per_user, len(paths))):
+            g[" / ".join(p)] = ["view", "edit"] if rng.random() < 0.2 else ["view"]
+    return grants
+
+
+def make_uploads(blob_store, paths, count, size=4096, seed=1):
+    """Link `count` small files to random pages through blob_store; returns the pages used."""
+    rng = random.Random(seed)
+    pages = set()
+    for i in range(count):
+        path = rng.choice(paths)
+        data = bytes(rng.getrandbits(8) for _ in range(64)) * (size // 64)
+        blob_store.add_file(path, f"file{i}.pdf", io.BytesIO(data))
+        pages.add(tuple(path))
+    return [list(p) for p in pages]